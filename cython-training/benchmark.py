@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Benchmark driver of the binary tree implementations (replaces run.bash).
+#
+# Builds the compiled variants and runs every variant in a fresh process,
+# first 'warmup' times (discarded) and then 'repeat' times, for every tree
+# size. Each variant reports its create and search times separately; the
+# wall time of the whole process (including the interpreter startup and
+# the allocation of the tree) and its peak RSS are measured by the driver.
+# The median and the interquartile range of the repeats are reported as a
+# markdown table and optionally written to JSON and markdown files.
+#
+# Usage: python benchmark.py --sizes 1000000 10000000 --repeat 5 --json results.json --markdown results.md
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+PREALLOCATED = 99999999 # bst1-bst5 preallocate the tree for this size
+INT32_LIMIT = 1073741822 # the last key (2 * size + 1) must fit an int32
+
+# name -> (description, command, maximum tree size), '{size}' is replaced by the tree size
+VARIANTS = {
+    'bst1': ("Vanilla python", [sys.executable, 'bst1.py', '{size}'], PREALLOCATED),
+    'bst2': ("Compiled python", [sys.executable, '-c', 'import bst2; bst2.run({size})'], PREALLOCATED),
+    'bst3': ("Cython", [sys.executable, '-c', 'import bst3; bst3.run({size})'], PREALLOCATED),
+    'bst4': ("C++", ['./bst4', '{size}'], PREALLOCATED),
+    'bst5': ("C", ['./bst5', '{size}'], PREALLOCATED),
+    'bst6': ("NumPy", [sys.executable, 'bst6.py', '{size}'], INT32_LIMIT),
+    'bst7': ("Cython memoryview", [sys.executable, '-c', 'import bst7; bst7.run({size})'], INT32_LIMIT),
+}
+
+BUILD_COMMANDS = [
+    [sys.executable, 'setup.py', 'build_ext', '--inplace'],
+    ['g++', '-O3', '-o', 'bst4', 'bst4.cpp'],
+    ['gcc', '-O3', '-o', 'bst5', 'bst5.c'],
+]
+
+TIMES = re.compile(r'create: ([0-9.]+) s, search: ([0-9.]+) s')
+
+def build():
+    for command in BUILD_COMMANDS:
+        print(' '.join(command), file=sys.stderr)
+        subprocess.run(command, cwd=DIRECTORY, check=True, stdout=subprocess.DEVNULL)
+
+# Runs a variant once in a new process
+# @return: dict of create, search and process seconds and the peak RSS in bytes
+def run_once(name, size):
+    command = [part.replace('{size}', str(size)) for part in VARIANTS[name][1]]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=DIRECTORY, stdout=subprocess.PIPE, text=True)
+    output = process.stdout.read()
+    # wait4 gives the resource usage of this child only
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.stdout.close()
+    times = TIMES.search(output)
+    if process.returncode != 0 or times is None:
+        raise RuntimeError("{} failed (exit code {}): {}".format(name, process.returncode, output.strip()))
+    return {
+        'create': float(times.group(1)),
+        'search': float(times.group(2)),
+        'process': elapsed,
+        'peak_rss': usage.ru_maxrss * 1024, # kilobytes on Linux
+    }
+
+# @return: median, interquartile range and all the values
+def summarize(values):
+    if len(values) > 1:
+        q1, median, q3 = statistics.quantiles(values, n=4, method='inclusive')
+    else:
+        q1 = median = q3 = values[0]
+    return {'median': median, 'iqr': q3 - q1, 'runs': values}
+
+# Benchmarks one variant with one tree size
+# @return: dict of the results
+def benchmark(name, size, warmup, repeat):
+    for _ in range(warmup):
+        run_once(name, size)
+    runs = [run_once(name, size) for _ in range(repeat)]
+    result = {'variant': name, 'description': VARIANTS[name][0], 'size': size}
+    for key in ('create', 'search', 'process', 'peak_rss'):
+        result[key] = summarize([run[key] for run in runs])
+    return result
+
+# The peak RSS of a child includes the RSS of the driver when the child was
+# forked, so the peak RSS of a trivial process is stored with the results.
+# @return: peak RSS of 'true' in bytes
+def rss_floor():
+    process = subprocess.Popen(['true'])
+    _, _, usage = os.wait4(process.pid, 0)
+    process.returncode = 0
+    return usage.ru_maxrss * 1024
+
+# @return: description of the machine and the versions, stored with the results
+def environment():
+    try:
+        import Cython
+        cython_version = Cython.__version__
+    except ImportError:
+        cython_version = None
+    return {
+        'python': sys.version.split()[0],
+        'cython': cython_version,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'peak_rss_floor': rss_floor(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+# @return: the results as a markdown table (median ± IQR)
+def markdown_table(results):
+    lines = ["| Variant | Tree size | Create (s) | Search (s) | Process (s) | Peak RSS (MB) |",
+             "|---|---:|---:|---:|---:|---:|"]
+    for result in results:
+        cells = ["{} ({})".format(result['variant'].upper(), result['description']), str(result['size'])]
+        for key in ('create', 'search', 'process'):
+            cells.append("{:.6f} ± {:.6f}".format(result[key]['median'], result[key]['iqr']))
+        cells.append("{:.1f}".format(result['peak_rss']['median'] / 1e6))
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the binary tree implementations")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000000, 10000000],
+                        help="tree sizes, variants are skipped for sizes above their maximum")
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--warmup', type=int, default=1, help="discarded runs before the measured ones")
+    parser.add_argument('--repeat', type=int, default=5, help="measured runs per benchmark")
+    parser.add_argument('--no-build', action='store_true', help="use the already built variants")
+    parser.add_argument('--json', help="write the results to this JSON file")
+    parser.add_argument('--markdown', help="write the results table to this markdown file")
+    args = parser.parse_args(argv)
+    if not all(0 < size <= INT32_LIMIT for size in args.sizes):
+        parser.error("tree sizes must be between 1 and {}".format(INT32_LIMIT))
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    if not args.no_build:
+        build()
+    results = []
+    for size in args.sizes:
+        for name in args.variants:
+            if size > VARIANTS[name][2]:
+                print("{:<5} {:>10} skipped (maximum size {})".format(name, size, VARIANTS[name][2]),
+                      file=sys.stderr)
+                continue
+            result = benchmark(name, size, args.warmup, args.repeat)
+            print("{:<5} {:>10} create {:.6f} s, search {:.6f} s, process {:.3f} s, peak RSS {:.1f} MB".format(
+                name, size, result['create']['median'], result['search']['median'],
+                result['process']['median'], result['peak_rss']['median'] / 1e6), file=sys.stderr)
+            results.append(result)
+
+    table = markdown_table(results)
+    print(table)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'environment': environment(), 'arguments': vars(args), 'results': results},
+                      output, indent=2)
+    if args.markdown:
+        with open(args.markdown, 'w') as output:
+            output.write(table)
+
+if __name__ == "__main__":
+    main()
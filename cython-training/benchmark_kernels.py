@@ -0,0 +1,112 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zipfile
+import numpy as np
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(DIRECTORY, '..', 'ransac'), os.path.join(DIRECTORY, '..', 'zipmeta')]
+import ransac
+import zipmeta
+from ransac import line_hypotheses, numpy_count_inliers
+
+# Speedups of the compiled kernels of ransac and zipmeta (see setup.py) over
+# their pure Python (numpy) fallbacks. Every case is run 'repeat' times with
+# both implementations and the median times and the speedup are reported.
+#
+# Usage: python setup.py build_ext --inplace
+#        python benchmark_kernels.py --points 100000 1000000 --entries 100000 --json kernels.json
+
+# @return: median of the run times of the function in seconds
+def median_time(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+# Runs the pure Python version with the kernel module replaced by None
+# @param module: module with the attribute 'kernel_name'
+def without_kernel(module, kernel_name, function):
+    def run():
+        kernel = getattr(module, kernel_name)
+        setattr(module, kernel_name, None)
+        try:
+            function()
+        finally:
+            setattr(module, kernel_name, kernel)
+    return run
+
+# @return: (name, pure Python function, compiled function) of every case
+def ransac_cases(point_counts, hypotheses, distance_threshold):
+    cases = []
+    rng = np.random.default_rng(0)
+    for point_count in point_counts:
+        for dtype in (np.float64, np.float32):
+            x = rng.uniform(0, 100, point_count)
+            y = np.where(rng.random(point_count) < 0.5, 0.5 * x + 3, rng.uniform(0, 60, point_count))
+            pts = np.vstack((x, y)).astype(dtype)
+            normals, offsets = line_hypotheses(pts, rng.integers(0, point_count, (hypotheses, 2)))
+            cases.append(('count_inliers {} points {} x {}'.format(np.dtype(dtype).name, point_count, hypotheses),
+                          lambda pts=pts, normals=normals, offsets=offsets:
+                              numpy_count_inliers(normals, offsets, pts, distance_threshold),
+                          lambda pts=pts, normals=normals, offsets=offsets:
+                              ransac.ransac_kernels.count_inliers(normals, offsets, pts, distance_threshold)))
+    return cases
+
+# @return: (name, pure Python function, compiled function) of every case
+def zipmeta_cases(entry_counts, directory):
+    cases = []
+    for entries in entry_counts:
+        filename = os.path.join(directory, 'entries_{}.zip'.format(entries))
+        with zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED) as archive:
+            for i in range(entries):
+                archive.writestr('directory/file_{:08d}.txt'.format(i), b'x')
+        for name, kwargs in (('central directory', {}), ('full scan', {'full_scan': True})):
+            parse = lambda filename=filename, kwargs=kwargs: zipmeta.ZipInfo(filename, **kwargs)
+            cases.append(('{} {} entries'.format(name, entries),
+                          without_kernel(zipmeta, 'zipmeta_kernels', parse), parse))
+    # Signature search through data that has no headers (e.g. a damaged archive)
+    data = np.random.default_rng(0).integers(0, 256, 1 << 26, dtype=np.uint8).tobytes().replace(b'PK', b'pk')
+    search = lambda: list(zipmeta.find_headers(data))
+    cases.append(('find_headers 64 MB', without_kernel(zipmeta, 'zipmeta_kernels', search), search))
+    return cases
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compiled ransac and zipmeta kernels")
+    parser.add_argument('--points', type=int, nargs='+', default=[100000, 1000000], help="point counts")
+    parser.add_argument('--hypotheses', type=int, default=1000, help="lines per count_inliers call")
+    parser.add_argument('--threshold', type=float, default=0.05, help="inlier distance threshold")
+    parser.add_argument('--entries', type=int, nargs='+', default=[10000, 100000],
+                        help="entry counts of the test archives")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per case (median is reported)")
+    parser.add_argument('--json', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+    missing = [name for name, module in (('ransac_kernels', ransac.ransac_kernels),
+                                         ('zipmeta_kernels', zipmeta.zipmeta_kernels)) if module is None]
+    if missing:
+        parser.error("{} not built, run: python setup.py build_ext --inplace".format(', '.join(missing)))
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        cases = ransac_cases(args.points, args.hypotheses, args.threshold) + \
+                zipmeta_cases(args.entries, directory)
+        for name, pure, compiled in cases:
+            pure_seconds = median_time(pure, args.repeat)
+            compiled_seconds = median_time(compiled, args.repeat)
+            results.append({'case': name, 'python_seconds': pure_seconds,
+                            'compiled_seconds': compiled_seconds, 'speedup': pure_seconds / compiled_seconds})
+            print("{:<42} python {:>9.4f} s  compiled {:>9.4f} s  speedup {:>6.1f}x".format(
+                name, pure_seconds, compiled_seconds, pure_seconds / compiled_seconds))
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'arguments': vars(args), 'results': results}, output, indent=2)
+
+if __name__ == "__main__":
+    main()
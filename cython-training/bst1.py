@@ -1,3 +1,4 @@
+import sys
 import time
 
 TREE_SIZE = 99999999
@@ -32,12 +33,22 @@ def create():
 
 def search():
     for item in tree:
-        if item == 199999999:
+        if item == 2*TREE_SIZE + 1: # the last node
             return 1
 
-if __name__ == "__main__":
-    start = time.time()
+# Times creating and searching the tree separately
+# @param tree_size: number of parent nodes (at most 99999999, the tree is preallocated)
+# @return: (create time, search time) in seconds
+def run(tree_size=TREE_SIZE):
+    global TREE_SIZE
+    TREE_SIZE = tree_size
+    start = time.perf_counter()
     create()
+    created = time.perf_counter()
     search()
-    end = time.time()
-    print("BST1, time spent: %.6f s" % (end - start))
+    end = time.perf_counter()
+    print("BST1, create: %.6f s, search: %.6f s, time spent: %.6f s" % (created - start, end - created, end - start))
+    return created - start, end - created
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else TREE_SIZE)
@@ -1,6 +1,6 @@
 
 #include <bits/stdc++.h>
-#include <time.h>
+#include <chrono>
 
 int TREE_SIZE = 99999999;
 int tree[200000000] = { 0 };
@@ -57,9 +57,9 @@ int create()
 
 int search()
 {
-    for(int i = 0; i < TREE_SIZE+1; i++)
+    for(int i = 0; i < 2*TREE_SIZE + 2; i++) // the whole tree
     {
-        if(tree[i] == 199999999)
+        if(tree[i] == 2*TREE_SIZE + 1) // the last node
         {
             return 1;
         }
@@ -67,17 +67,26 @@ int search()
     return 0;
 }
 
-int main()
+double seconds()
 {
-    clock_t begin = clock();
+    return std::chrono::duration<double>(std::chrono::steady_clock::now().time_since_epoch()).count();
+}
 
+// Usage: ./bst4 [tree size], the size is at most 99999999 (the tree is preallocated)
+int main(int argc, char *argv[])
+{
+    if(argc > 1)
+    {
+        TREE_SIZE = std::atoi(argv[1]);
+    }
+    double begin = seconds();
     create();
-    search();
+    double created = seconds();
+    int found = search();
+    double end = seconds();
 
-    clock_t end = clock();
-    double time_spent = (double)(end - begin) / CLOCKS_PER_SEC;
-    std::cout << "BST4, time spent: " << time_spent << " s" << std::endl;
+    std::cout << std::fixed << std::setprecision(6) << "BST4, create: " << created - begin
+              << " s, search: " << end - created << " s, time spent: " << end - begin << " s, found: " << found << std::endl;
 
     return 0;
 }
- 
\ No newline at end of file
@@ -1,5 +1,6 @@
 #include <time.h>
 #include <stdio.h>
+#include <stdlib.h>
 
 int TREE_SIZE = 99999999;
 int tree[200000000] = { 0 };
@@ -56,26 +57,36 @@ int create()
 
 int search()
 {
-    for(int i = 0; i < TREE_SIZE+1; i++)
+    for(int i = 0; i < 2*TREE_SIZE + 2; i++) // the whole tree
     {
-        if(tree[i] == 199999999)
+        if(tree[i] == 2*TREE_SIZE + 1) // the last node
         {
             return 1;
         }
     }
-
+    return 0;
 }
 
-int main()
+double seconds()
 {
-    clock_t begin = clock();
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return now.tv_sec + now.tv_nsec * 1e-9;
+}
 
+// Usage: ./bst5 [tree size], the size is at most 99999999 (the tree is preallocated)
+int main(int argc, char *argv[])
+{
+    if(argc > 1)
+    {
+        TREE_SIZE = atoi(argv[1]);
+    }
+    double begin = seconds();
     create();
-    search();
+    double created = seconds();
+    int found = search();
+    double end = seconds();
 
-    clock_t end = clock();
-    double time_spent = (double)(end - begin) / CLOCKS_PER_SEC;
-    printf("BST5, time spent: %f s\n", time_spent);
+    printf("BST5, create: %f s, search: %f s, time spent: %f s, found: %d\n", created - begin, end - created, end - begin, found);
     return 0;
 }
- 
\ No newline at end of file
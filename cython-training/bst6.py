@@ -0,0 +1,72 @@
+import sys
+import time
+import numpy as np
+
+# The same array tree with a NumPy int32 array. The tree is allocated for
+# the size given at runtime (np.zeros maps the memory lazily) and it is
+# created level by level: the children of one level are set with vectorized
+# operations, so the parents always exist before their children.
+
+TREE_SIZE = 99999999
+tree = None # allocated by allocate()
+
+def allocate(tree_size):
+    global TREE_SIZE, tree
+    TREE_SIZE = tree_size
+    tree = np.zeros(2*tree_size + 2, dtype=np.int32)
+
+def root(key):
+    if tree[1] != 0:
+        return -1
+    else:
+        tree[1] = key
+    return 0
+
+# The key and the parent can be arrays (all the parents must exist)
+def set_left(key, parent):
+    if np.any(tree[parent] == 0):
+        return -1
+    else:
+        tree[(parent * 2)] = key
+    return 0
+
+def set_right(key, parent):
+    if np.any(tree[parent] == 0):
+        return -1
+    else:
+        tree[(parent * 2) + 1] = key
+    return 0
+
+# The levels (and the search) are done in blocks, so the temporary arrays stay small
+def create(block_size=1 << 20):
+    root(1)
+    first = 1
+    while first <= TREE_SIZE: # one level of the tree: parents first ... 2*first-1
+        last = min(2*first, TREE_SIZE+1)
+        for start in range(first, last, block_size):
+            parents = np.arange(start, min(start + block_size, last), dtype=np.int32)
+            set_left(2*parents, parents)
+            set_right(2*parents + 1, parents)
+        first *= 2
+
+def search(block_size=1 << 20):
+    for start in range(0, len(tree), block_size):
+        if np.any(tree[start:start + block_size] == 2*TREE_SIZE + 1): # the last node
+            return 1
+    return 0
+
+# Times creating and searching the tree separately
+# @param tree_size: number of parent nodes (at most 1073741822, the keys are int32)
+# @return: (create time, search time) in seconds
+def run(tree_size=TREE_SIZE):
+    allocate(tree_size)
+    start = time.perf_counter()
+    create()
+    created = time.perf_counter()
+    search()
+    end = time.perf_counter()
+    print("BST6, create: %.6f s, search: %.6f s, time spent: %.6f s" % (created - start, end - created, end - start))
+    return created - start, end - created
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else TREE_SIZE)
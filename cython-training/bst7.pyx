@@ -0,0 +1,83 @@
+# cython: boundscheck=False, wraparound=False
+# distutils: extra_compile_args = -fopenmp
+# distutils: extra_link_args = -fopenmp
+import time
+import numpy as np
+from cython.parallel import prange
+
+# The same array tree with a typed memoryview. The tree is allocated for
+# the size given at runtime (np.zeros maps the memory lazily), the tree
+# functions run without the GIL and the search is split to OpenMP threads.
+
+cdef int TREE_SIZE = 99999999
+cdef int[::1] tree # allocated by allocate()
+
+def allocate(int tree_size):
+    global TREE_SIZE, tree
+    TREE_SIZE = tree_size
+    tree = np.zeros(2*tree_size + 2, dtype=np.intc)
+
+cdef int root(int key) noexcept nogil:
+    if tree[1] != 0:
+        return -1
+    else:
+        tree[1] = key
+    return 0
+
+cdef int set_left(int key, int parent) noexcept nogil:
+    if tree[parent] == 0:
+        return -1
+    else:
+        tree[(parent * 2)] = key
+    return 0
+
+cdef int set_right(int key, int parent) noexcept nogil:
+    if tree[parent] == 0:
+        return -1
+    else:
+        tree[(parent * 2) + 1] = key
+    return 0
+
+cdef int create() noexcept nogil:
+    root(1)
+    cdef int i = 0
+    for i in range(1, TREE_SIZE+1):
+        set_left((2*i), i)
+        set_right((2*i + 1), i)
+    return 0
+
+# Scans the whole tree (no early exit, the threads count the matches)
+cdef int search() noexcept nogil:
+    cdef Py_ssize_t i
+    cdef int target = 2*TREE_SIZE + 1 # the last node
+    cdef int found = 0
+    cdef int *nodes = &tree[0] # the global memoryview would be reloaded in the loop
+    for i in prange(tree.shape[0], schedule='static'):
+        found += nodes[i] == target
+    return found > 0
+
+# The tree as a NumPy array and the result of the search, for checking
+# the tree against the other variants
+def nodes():
+    return np.asarray(tree)
+
+def find():
+    cdef int found
+    with nogil:
+        found = search()
+    return found
+
+# Times creating and searching the tree separately
+# @param tree_size: number of parent nodes (at most 1073741822, the keys are C ints)
+# @return: (create time, search time) in seconds
+def run(int tree_size=99999999):
+    allocate(tree_size)
+    start = time.perf_counter()
+    with nogil:
+        create()
+    created = time.perf_counter()
+    with nogil:
+        search()
+    end = time.perf_counter()
+    print("BST7, create: %.6f s, search: %.6f s, time spent: %.6f s" % (created - start, end - created, end - start))
+    return created - start, end - created
@@ -1,7 +0,0 @@
-# First compile (manually)
-
-python3 bst1.py
-python3 -c "import bst2; bst2.run()"
-python3 -c "import bst3; bst3.run()"
-./bst4
-./bst5
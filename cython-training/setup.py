@@ -1,12 +1,45 @@
-from setuptools import setup
+import os
+from setuptools import setup, Extension
+from setuptools.command.build_ext import build_ext
 from Cython.Build import cythonize
 
 import Cython.Compiler.Options
 Cython.Compiler.Options.annotate = True
 
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Optional compiled kernels of the other scripts. With --inplace they are
+# built next to their sources, where the scripts import them (the scripts
+# fall back to pure Python if they haven't been built).
+KERNELS = {
+    'ransac_kernels': os.path.join(DIRECTORY, '..', 'ransac'),
+    'zipmeta_kernels': os.path.join(DIRECTORY, '..', 'zipmeta'),
+}
+
+# The inlier counting must round like numpy, so the multiply and add are not
+# contracted to FMA. -march=native (e.g. AVX2) is faster, but the result runs
+# only on CPUs like the build machine, so it is opt-in:
+#   KERNELS_MARCH_NATIVE=1 python setup.py build_ext --inplace
+KERNEL_COMPILE_ARGS = ['-O3', '-ffp-contract=off']
+if os.environ.get('KERNELS_MARCH_NATIVE') == '1':
+    KERNEL_COMPILE_ARGS.append('-march=native')
+
+class BuildKernelsInPlace(build_ext):
+    def copy_extensions_to_source(self):
+        super().copy_extensions_to_source()
+        for name, directory in KERNELS.items():
+            filename = self.get_ext_filename(name)
+            if os.path.exists(filename):
+                os.replace(filename, os.path.join(directory, filename))
+
 setup(
+    cmdclass = {'build_ext': BuildKernelsInPlace},
     ext_modules = cythonize([
-        "bst2.py", 
-        "bst3.pyx"],
+        "bst2.py",
+        "bst3.pyx",
+        "bst7.pyx"] +
+        [Extension(name, [os.path.relpath(os.path.join(directory, name + '.pyx'))],
+                   extra_compile_args=KERNEL_COMPILE_ARGS)
+         for name, directory in KERNELS.items()],
         annotate=True)
 )
@@ -0,0 +1,89 @@
+import sys
+import numpy as np
+import pytest
+import benchmark
+
+# Usage: python -m pytest test_bst.py
+
+# bst1 preallocates the tree for the largest size when it is imported, so
+# it is imported once and the tree is replaced by one of the tested size.
+@pytest.fixture(scope='module')
+def bst1():
+    import bst1
+    bst1.tree = None
+    return bst1
+
+# Creates the tree of the given size with bst1
+# @return: the tree as an int array, 0 for the empty nodes
+def bst1_tree(bst1, size):
+    bst1.TREE_SIZE = size
+    bst1.tree = [None] * (2*size + 2)
+    bst1.create()
+    return np.array([0 if node is None else node for node in bst1.tree])
+
+def test_bst1_tree_and_output(bst1, capsys):
+    tree = bst1_tree(bst1, 6)
+    assert tree.tolist() == [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
+    assert bst1.search() == 1
+    bst1.tree[-1] = None
+    assert not bst1.search()
+
+    bst1.tree = [None] * 2002
+    create, search = bst1.run(1000)
+    times = benchmark.TIMES.search(capsys.readouterr().out)
+    assert times is not None
+    assert (float(times.group(1)), float(times.group(2))) == pytest.approx((create, search), abs=1e-6)
+
+def test_summarize():
+    assert benchmark.summarize([5.0, 1.0, 4.0, 2.0, 3.0]) == {'median': 3.0, 'iqr': 2.0,
+                                                              'runs': [5.0, 1.0, 4.0, 2.0, 3.0]}
+    assert benchmark.summarize([1.0, 2.0]) == {'median': 1.5, 'iqr': 0.5, 'runs': [1.0, 2.0]}
+    assert benchmark.summarize([7.0]) == {'median': 7.0, 'iqr': 0.0, 'runs': [7.0]}
+
+# A variant that prints the times of the size without building a tree
+def fake_variant(monkeypatch, code):
+    monkeypatch.setitem(benchmark.VARIANTS, 'fake', ("Fake", [sys.executable, '-c', code], 100))
+
+def test_run_once_parses_the_output(monkeypatch):
+    fake_variant(monkeypatch, 'import sys; n = {size}; '
+                              'print("BSTX, create: %.6f s, search: %.6f s, time spent: 0 s" % (n / 1e3, n / 1e4))')
+    run = benchmark.run_once('fake', 25)
+    assert (run['create'], run['search']) == (0.025, 0.0025)
+    assert run['process'] > 0 and run['peak_rss'] > 1e6
+
+    result = benchmark.benchmark('fake', 50, warmup=1, repeat=3)
+    assert (result['variant'], result['size']) == ('fake', 50)
+    assert result['create'] == {'median': 0.05, 'iqr': 0.0, 'runs': [0.05] * 3}
+    assert len(result['peak_rss']['runs']) == 3
+    table = benchmark.markdown_table([result])
+    assert "| FAKE (Fake) | 50 | 0.050000 ± 0.000000 | 0.005000 ± 0.000000 |" in table
+
+@pytest.mark.parametrize('code', ['print("no times")', 'import sys; sys.exit(3)'])
+def test_run_once_reports_failures(monkeypatch, code):
+    fake_variant(monkeypatch, code)
+    with pytest.raises(RuntimeError, match='fake failed'):
+        benchmark.run_once('fake', 10)
+
+# Sizes where the last level is full, partial, or has a single node, and
+# one that spans several blocks of bst6
+@pytest.mark.parametrize('size', [1, 2, 6, 7, 1000, 3 * 1024 + 5])
+def test_bst6_matches_bst1(bst1, size):
+    import bst6
+    expected = bst1_tree(bst1, size)
+    bst6.allocate(size)
+    bst6.create(block_size=256)
+    assert np.array_equal(bst6.tree, expected)
+    assert bst6.search(block_size=256) == 1 == bst1.search()
+    bst6.tree[-1] = 0
+    assert bst6.search(block_size=256) == 0
+
+@pytest.mark.parametrize('size', [1, 2, 6, 7, 1000, 100003])
+def test_bst7_matches_bst1(bst1, size, capsys):
+    bst7 = pytest.importorskip('bst7') # python setup.py build_ext --inplace
+    expected = bst1_tree(bst1, size)
+    bst7.run(size)
+    assert benchmark.TIMES.search(capsys.readouterr().out) is not None
+    assert np.array_equal(bst7.nodes(), expected)
+    assert bst7.find() == 1 == bst1.search()
+    bst7.nodes()[-1] = 0
+    assert bst7.find() == 0
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Incremental linear least squares for data that doesn't fit in memory.
+#
+# The data is added in chunks. For every chunk, X'X, X'y, y'y and the sum
+# of y are accumulated, and the R factor of the QR decomposition of all the
+# rows seen so far is updated from [R; X_chunk] (with Q'y). Accumulators of
+# different chunks (e.g. computed in different processes) can be merged.
+# Memory use depends only on the number of features, not on the rows.
+#
+# The coefficients are solved with one of:
+#   'cholesky': Cholesky factorization of X'X (columns scaled to unit diagonal)
+#   'qr':       the accumulated R factor; avoids squaring the condition number of X
+#   'lstsq':    SVD based least squares on R; also works for rank deficient X
+#
+# Ridge regularization adds ridge * ||b||^2 to the minimized sum of squares.
+# The first coefficient (the intercept) is not penalized.
+#
+# Example:
+#   fit = LeastSquares(6)
+#   for X, y in chunks:
+#       fit.add(X, y)
+#   b = fit.solve('qr', ridge=0.1)
+
+class LeastSquares:
+    def __init__(self, feature_count):
+        self.feature_count = feature_count
+        self.count = 0
+        self.xtx = np.zeros((feature_count, feature_count))
+        self.xty = np.zeros(feature_count)
+        self.yty = 0.0
+        self.y_sum = 0.0
+        self.r = np.zeros((0, feature_count)) # R factor of the rows so far
+        self.qty = np.zeros(0)                # Q'y of the rows so far
+
+    # Adds a chunk of rows
+    # @param X: n x feature_count matrix
+    # @param y: n targets
+    def add(self, X, y):
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if X.ndim != 2 or X.shape[1] != self.feature_count or len(y) != len(X):
+            raise ValueError("Expected an n x {} matrix and n targets".format(self.feature_count))
+        self.count += len(X)
+        self.xtx += X.T @ X
+        self.xty += X.T @ y
+        self.yty += y @ y
+        self.y_sum += y.sum()
+        self.update_qr(X, y)
+        return self
+
+    # Adds the accumulated sums of another accumulator
+    def merge(self, other):
+        self.count += other.count
+        self.xtx += other.xtx
+        self.xty += other.xty
+        self.yty += other.yty
+        self.y_sum += other.y_sum
+        self.update_qr(other.r, other.qty)
+        return self
+
+    # R and Q'y of [R; rows] from the ones of the earlier rows
+    def update_qr(self, rows, y):
+        q, self.r = np.linalg.qr(np.vstack((self.r, rows)))
+        self.qty = q.T @ np.concatenate((self.qty, y))
+
+    # @return: diagonal of the ridge penalty (the intercept is not penalized)
+    def penalty(self, ridge):
+        penalty = np.full(self.feature_count, float(ridge))
+        penalty[0] = 0
+        return penalty
+
+    # Solves the coefficients
+    # @param method: 'cholesky', 'qr' or 'lstsq'
+    # @param ridge: ridge regularization strength (0: ordinary least squares)
+    # @return: array of feature_count coefficients
+    def solve(self, method='qr', ridge=0.0):
+        if self.count == 0:
+            raise ValueError("No data")
+        penalty = self.penalty(ridge)
+        if method == 'cholesky':
+            # Scaling the columns to unit diagonal improves the conditioning
+            scale = np.sqrt(np.diag(self.xtx))
+            scale[scale == 0] = 1
+            A = (self.xtx + np.diag(penalty)) / np.outer(scale, scale)
+            L = np.linalg.cholesky(A)
+            z = np.linalg.solve(L, self.xty / scale)
+            return np.linalg.solve(L.T, z) / scale
+        # Ridge is least squares with the extra rows sqrt(ridge) * I
+        r = np.vstack((self.r, np.diag(np.sqrt(penalty))[penalty > 0]))
+        qty = np.concatenate((self.qty, np.zeros(np.count_nonzero(penalty))))
+        if method == 'qr':
+            if ridge:
+                q, r = np.linalg.qr(r)
+                qty = q.T @ qty
+            return np.linalg.solve(r, qty)
+        if method == 'lstsq':
+            return np.linalg.lstsq(r, qty, rcond=None)[0]
+        raise ValueError("Unknown method: {}".format(method))
+
+    @property
+    def y_mean(self):
+        return self.y_sum / self.count if self.count else 0.0
+
+# Statistics of the residuals y - X b, accumulated chunk by chunk in a
+# second pass over the data (the sums of the first pass would lose precision).
+class ResidualStatistics:
+    def __init__(self, coefficients, y_mean):
+        self.coefficients = np.asarray(coefficients, dtype=float)
+        self.y_mean = y_mean
+        self.count = 0
+        self.residual_sum = 0.0
+        self.squared_sum = 0.0     # residual sum of squares
+        self.absolute_sum = 0.0
+        self.total_squares = 0.0   # sum of (y - mean y)^2
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def add(self, X, y):
+        y = np.asarray(y, dtype=float)
+        residuals = y - np.asarray(X, dtype=float) @ self.coefficients
+        if len(residuals) == 0:
+            return self
+        self.count += len(residuals)
+        self.residual_sum += residuals.sum()
+        self.squared_sum += residuals @ residuals
+        self.absolute_sum += np.abs(residuals).sum()
+        centered = y - self.y_mean
+        self.total_squares += centered @ centered
+        self.minimum = min(self.minimum, residuals.min())
+        self.maximum = max(self.maximum, residuals.max())
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.residual_sum += other.residual_sum
+        self.squared_sum += other.squared_sum
+        self.absolute_sum += other.absolute_sum
+        self.total_squares += other.total_squares
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    # @return: dict of the fit diagnostics: R², adjusted R², RMSE, MAE and the residual statistics
+    def summary(self):
+        n = self.count
+        p = len(self.coefficients)
+        mean = self.residual_sum / n
+        r2 = 1 - self.squared_sum / self.total_squares if self.total_squares else float('nan')
+        return {
+            'rows': n,
+            'r2': r2,
+            'adjusted_r2': 1 - (1 - r2) * (n - 1) / (n - p) if n > p else float('nan'),
+            'rmse': np.sqrt(self.squared_sum / n),
+            'mae': self.absolute_sum / n,
+            'residual_mean': mean,
+            'residual_std': np.sqrt(max(self.squared_sum / n - mean ** 2, 0.0)),
+            'residual_min': self.minimum,
+            'residual_max': self.maximum,
+        }
@@ -1,38 +1,190 @@
+import hashlib
+import json
+import math
+import os
 import numpy as np
 import pandas as pd
+from least_squares import LeastSquares, ResidualStatistics
 
 # It is beforehandedly known that the downtown location is
 TOWN_CENTER = [1.43, 0.63] # x = 1.43 km and y = 0.63 km
 
-# Script estimates house prices by first creating a linear regression model
-# by using the data in input_data file and then it uses the learnt model to given params
-# @params: [ area, construction year, room number, floor amount, x-coord., y-coord. ]
-# @return: price estimate
-def estimate_price(params):
-    # Create model from the Excel data.
-    df = pd.read_excel("input_data.xlsx", sheet_name="Sheet1")
-    y  = df['Price']             # price (€)
-    x1 = df['Area']              # living space (m2)
-    x2 = df['Construction Year'] # construction year
-    x3 = df['Number of Rooms']   # room count (int)
-    x4 = df['Floor']             # floor number
-    x5 = df['X coordinate']      # x-location of the house
-    x6 = df['Y coordinate']      # y-location of the house
-    x7 = np.sqrt((x5-TOWN_CENTER[0])**2 + (x6-TOWN_CENTER[1])**2) # distance to downtown
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "input_data.xlsx")
+
+# Model columns of the Excel data, in the order of the params of a prediction
+COLUMNS = ['Area',              # living space (m2)
+           'Construction Year', # construction year
+           'Number of Rooms',   # room count (int)
+           'Floor',             # floor number
+           'X coordinate',      # x-location of the house
+           'Y coordinate']      # y-location of the house
+TARGET = 'Price'                # price (€)
+
+# Number of model features (and coefficients), see features()
+FEATURE_COUNT = 6
+
+# Creates the model features from the data: the x and y coordinates are
+# replaced by the distance to downtown and a constant column is added.
+# @param df: DataFrame with the COLUMNS
+# @return: n x FEATURE_COUNT matrix of [1, area, year, rooms, floor, distance]
+def features(df):
+    x = df[COLUMNS].to_numpy(dtype=float)
+    X = np.empty((len(x), FEATURE_COUNT))
+    X[:, 0] = 1
+    X[:, 1:5] = x[:, :4]
+    X[:, 5] = np.sqrt((x[:, 4]-TOWN_CENTER[0])**2 + (x[:, 5]-TOWN_CENTER[1])**2) # distance to downtown
+    return X
+
+# @return: SHA-256 of the file contents
+def file_hash(filename):
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as data:
+        for block in iter(lambda: data.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Linear regression model of the house prices. The model is fitted once from
+# the data file and the coefficients are stored in a small JSON file next to
+# it. The stored model is used as long as the data file is unchanged: if its
+# size or mtime differs, the file is hashed and refitted only if the contents
+# have really changed. The solver settings (see least_squares.py) are stored
+# too, and a model fitted with other settings is not reused.
+#
+# Example:
+#   model = PriceModel.load()
+#   price = model.predict([69, 2010, 4, 10, 1.387, 0.522])
+class PriceModel:
+    def __init__(self, coefficients, source=None, settings=None, diagnostics=None):
+        self.coefficients = tuple(float(c) for c in coefficients) # b0, b1, ..., b5
+        self.source = source or {} # path, size, mtime_ns and sha256 of the data file
+        self.settings = settings or {'method': 'qr', 'ridge': 0.0}
+        self.diagnostics = diagnostics or {} # R², residual statistics etc.
+
+    # Fits the model to the data by least squares (y = b0 + b1*x1 + b2*x2 ...)
+    # @param data_file: Excel file with the COLUMNS and the TARGET
+    # @param method: 'qr', 'cholesky' or 'lstsq' (see least_squares.py)
+    # @param ridge: ridge regularization strength
+    @staticmethod
+    def fit(data_file=DATA_FILE, method='qr', ridge=0.0):
+        df = pd.read_excel(data_file, sheet_name="Sheet1")
+        X = features(df)
+        y = df[TARGET].to_numpy(dtype=float)
+        fit = LeastSquares(X.shape[1]).add(X, y)
+        b = fit.solve(method, ridge)
+        diagnostics = ResidualStatistics(b, fit.y_mean).add(X, y).summary()
+        stat = os.stat(data_file)
+        return PriceModel(b, {'path': os.path.abspath(data_file), 'size': stat.st_size,
+                              'mtime_ns': stat.st_mtime_ns, 'sha256': file_hash(data_file)},
+                          {'method': method, 'ridge': float(ridge)}, diagnostics)
+
+    # Reads a stored model without checking its data (e.g. one from training.py)
+    @staticmethod
+    def read(cache_file):
+        with open(cache_file) as cache:
+            stored = json.load(cache)
+        return PriceModel(stored['coefficients'], stored.get('source'), stored.get('settings'),
+                          stored.get('diagnostics'))
 
-    ones = np.ones(len(x1))
-    X_T = np.matrix([ones, x1, x2, x3, x4, x7])
-    X = X_T.T # feature rows to columns like they should be...
-    b = np.linalg.inv(X_T @ X) @ X_T @ y # inv(X'*X)*X'*y;
+    # Returns the stored model of the data file, or fits and stores a new one
+    # if there's no stored model or the data has changed since it was fitted.
+    # @param cache_file: coefficient file (default: next to the data file)
+    # @param method, ridge: solver settings, see fit
+    @staticmethod
+    def load(data_file=DATA_FILE, cache_file=None, method='qr', ridge=0.0):
+        cache_file = cache_file or coefficient_file(data_file)
+        try:
+            model = PriceModel.read(cache_file)
+        except (OSError, ValueError, KeyError):
+            model = None
+        if model is not None and model.settings == {'method': method, 'ridge': float(ridge)}:
+            state = model.check_source(data_file)
+            if state == 'unchanged':
+                return model
+            if state == 'touched': # same contents, new mtime
+                model.save(cache_file)
+                return model
+        model = PriceModel.fit(data_file, method, ridge)
+        model.save(cache_file)
+        return model
 
-    distance_to_downtown = np.sqrt((params[4]-TOWN_CENTER[0])**2 + (params[5]-TOWN_CENTER[1])**2)
-    parameters = [1, params[0], params[1], params[2], params[3], distance_to_downtown]
-    estimate = parameters @ b # y = b0 + b1*x1 + b2*x2 ...
-    return estimate
+    # Compares the data file to the one the model was fitted to
+    # @return: 'unchanged', 'touched' (only the size/mtime check failed,
+    #          the contents are the same) or 'changed'
+    def check_source(self, data_file=DATA_FILE):
+        try:
+            stat = os.stat(data_file)
+        except OSError:
+            return 'changed'
+        if (stat.st_size, stat.st_mtime_ns) == (self.source.get('size'), self.source.get('mtime_ns')):
+            return 'unchanged'
+        if stat.st_size == self.source.get('size') and file_hash(data_file) == self.source.get('sha256'):
+            self.source.update(path=os.path.abspath(data_file), mtime_ns=stat.st_mtime_ns)
+            return 'touched'
+        return 'changed'
 
+    def save(self, cache_file):
+        temporary = cache_file + '.tmp'
+        with open(temporary, 'w') as cache:
+            json.dump({'coefficients': self.coefficients, 'source': self.source,
+                       'settings': self.settings,
+                       'diagnostics': {key: float(value) for key, value in self.diagnostics.items()}},
+                      cache, indent=2)
+        os.replace(temporary, cache_file)
+
+    # @params: [ area, construction year, room number, floor amount, x-coord., y-coord. ]
+    # @return: price estimate
+    def predict(self, params):
+        b0, b1, b2, b3, b4, b5 = self.coefficients
+        distance_to_downtown = math.hypot(params[4]-TOWN_CENTER[0], params[5]-TOWN_CENTER[1])
+        return b0 + b1*params[0] + b2*params[1] + b3*params[2] + b4*params[3] + b5*distance_to_downtown
+
+    # Predicts the prices of many houses at once
+    # @param data: n x 6 array of params (see predict) or a DataFrame with the COLUMNS
+    # @return: array of n price estimates
+    def predict_batch(self, data):
+        if isinstance(data, pd.DataFrame):
+            data = data[COLUMNS]
+        x = np.asarray(data, dtype=float)
+        if x.ndim != 2 or x.shape[1] != 6:
+            raise ValueError("Expected an n x 6 array of params, got shape {}".format(x.shape))
+        b = np.array(self.coefficients)
+        # the distance feature is b5 * distance, the rest is one matrix product
+        dx = x[:, 4] - TOWN_CENTER[0]
+        dy = x[:, 5] - TOWN_CENTER[1]
+        distance_to_downtown = np.sqrt(dx*dx + dy*dy)
+        estimates = x[:, :4] @ b[1:5]
+        estimates += b[0]
+        estimates += b[5] * distance_to_downtown
+        return estimates
+
+# @return: name of the coefficient file of the data file
+def coefficient_file(data_file):
+    return os.path.splitext(data_file)[0] + '.coefficients.json'
+
+# Models that have been loaded in this process, by data file
+models = {}
+
+# Returns the model of the data file. The loaded model is kept in memory and
+# only the mtime of the data file is checked on later calls.
+def get_model(data_file=DATA_FILE):
+    model = models.get(data_file)
+    if model is None or model.check_source(data_file) == 'changed':
+        model = models[data_file] = PriceModel.load(data_file)
+    return model
+
+# Script estimates house prices with a linear regression model created by
+# using the data in input_data file (see PriceModel)
+# @params: [ area, construction year, room number, floor amount, x-coord., y-coord. ]
+# @return: price estimate
+def estimate_price(params):
+    return get_model().predict(params)
 
-params = [69, 2010, 4, 10, 1.38727463782683, 0.522109940800501]
-estimate = estimate_price(params)
-print("price estimate: {:.2f}€".format(estimate))
+# Estimates the prices of many houses (see PriceModel.predict_batch)
+def predict_batch(data):
+    return get_model().predict_batch(data)
 
 
+if __name__ == "__main__":
+    params = [69, 2010, 4, 10, 1.38727463782683, 0.522109940800501]
+    estimate = estimate_price(params)
+    print("price estimate: {:.2f}€".format(estimate))
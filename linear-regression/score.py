@@ -0,0 +1,131 @@
+import argparse
+import sys
+import time
+import pandas as pd
+from linear_regression import COLUMNS, DATA_FILE, PriceModel
+
+# Bulk scoring of house listings with the price model.
+# The input is read in chunks, so files of any size can be scored with
+# bounded memory. Parquet (and faster CSV parsing) needs pyarrow, which is
+# imported only when it is used.
+#
+# Usage: python score.py listings.csv -o prices.csv [--keep id] [--chunk-size N]
+#        python score.py listings.parquet -o prices.parquet
+
+PREDICTION = 'predicted_price'
+
+# @return: the pyarrow module with the given submodule, or None if pyarrow isn't installed
+def import_pyarrow(submodule):
+    try:
+        import pyarrow
+        __import__('pyarrow.' + submodule)
+        return pyarrow
+    except ImportError:
+        return None
+
+# Yields the input as DataFrames of at most 'chunk_size' rows
+# @param columns: columns to read
+def read_chunks(filename, columns, chunk_size):
+    if filename.endswith('.parquet'):
+        pyarrow = import_pyarrow('parquet')
+        if pyarrow is None:
+            raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)")
+        for batch in pyarrow.parquet.ParquetFile(filename).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    pyarrow = import_pyarrow('csv')
+    if pyarrow is None:
+        yield from pd.read_csv(filename, usecols=columns, chunksize=chunk_size)
+        return
+    options = pyarrow.csv.ConvertOptions(include_columns=columns)
+    read_options = pyarrow.csv.ReadOptions(block_size=1 << 24)
+    with pyarrow.csv.open_csv(filename, read_options=read_options, convert_options=options) as reader:
+        for batch in reader:
+            for start in range(0, batch.num_rows, chunk_size):
+                yield batch.slice(start, chunk_size).to_pandas()
+
+# Writes the predictions rounded to cents. pyarrow's CSV writer is used if
+# it's installed, since it is several times faster than DataFrame.to_csv.
+class CsvWriter:
+    def __init__(self, filename):
+        self.to_stdout = filename in (None, '-')
+        self.pyarrow = import_pyarrow('csv')
+        if self.pyarrow is None:
+            self.output = sys.stdout if self.to_stdout else open(filename, 'w', newline='')
+        else:
+            self.output = sys.stdout.buffer if self.to_stdout else open(filename, 'wb')
+        self.writer = None
+        self.header = True
+
+    def write(self, df):
+        df[PREDICTION] = df[PREDICTION].round(2)
+        if self.pyarrow is None:
+            df.to_csv(self.output, index=False, header=self.header)
+            self.header = False
+            return
+        table = self.pyarrow.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pyarrow.csv.CSVWriter(self.output, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.to_stdout:
+            self.output.flush()
+        else:
+            self.output.close()
+
+class ParquetWriter:
+    def __init__(self, filename):
+        self.pyarrow = import_pyarrow('parquet')
+        if self.pyarrow is None:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.filename = filename
+        self.writer = None
+
+    def write(self, df):
+        table = self.pyarrow.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.filename, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+# Scores all the rows of the input and writes the predictions
+# @param keep: input columns copied to the output (e.g. listing ids)
+# @return: number of rows
+def score(model, filename, writer, keep=(), chunk_size=1 << 20):
+    rows = 0
+    columns = list(dict.fromkeys(list(COLUMNS) + list(keep)))
+    for chunk in read_chunks(filename, columns, chunk_size):
+        output = pd.DataFrame({column: chunk[column] for column in keep})
+        output[PREDICTION] = model.predict_batch(chunk)
+        writer.write(output)
+        rows += len(chunk)
+    writer.close()
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict house prices for a file of listings")
+    parser.add_argument('input', help="CSV or Parquet file with the columns: " + ', '.join(COLUMNS))
+    parser.add_argument('-o', '--output', help="CSV or Parquet (.parquet) output (default: CSV to stdout)")
+    parser.add_argument('--keep', nargs='+', default=[], help="input columns copied to the output")
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help="rows per chunk")
+    parser.add_argument('--data', default=DATA_FILE, help="training data of the model")
+    args = parser.parse_args(argv)
+
+    try:
+        writer = ParquetWriter(args.output) if (args.output or '').endswith('.parquet') \
+            else CsvWriter(args.output)
+        start = time.perf_counter()
+        rows = score(PriceModel.load(args.data), args.input, writer, args.keep, args.chunk_size)
+    except RuntimeError as error:
+        parser.error(str(error))
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print("{} rows in {:.2f} s ({:.0f} rows/s)".format(rows, elapsed, rows / elapsed), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
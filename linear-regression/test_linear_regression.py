@@ -0,0 +1,192 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+import linear_regression
+import score
+import training
+from least_squares import LeastSquares
+from linear_regression import COLUMNS, DATA_FILE, FEATURE_COUNT, PriceModel, coefficient_file, features
+
+# Usage: python -m pytest test_linear_regression.py
+
+# Copy of the training data in a temporary directory
+@pytest.fixture
+def data_file(tmp_path):
+    filename = str(tmp_path / 'data.xlsx')
+    shutil.copyfile(DATA_FILE, filename)
+    return filename
+
+# Counts the fits of PriceModel.load
+@pytest.fixture
+def fits(monkeypatch):
+    calls = []
+    fit = PriceModel.fit
+    def counted_fit(*args, **kwargs):
+        calls.append(args)
+        return fit(*args, **kwargs)
+    monkeypatch.setattr(PriceModel, 'fit', staticmethod(counted_fit))
+    return calls
+
+def test_stored_model_is_reused_until_the_data_changes(data_file, fits):
+    model = PriceModel.load(data_file)
+    assert len(fits) == 1 and os.path.exists(coefficient_file(data_file))
+    assert PriceModel.load(data_file).coefficients == model.coefficients
+    assert len(fits) == 1
+
+    # a new mtime with the same contents: the hash matches, no refit
+    stat = os.stat(data_file)
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert model.check_source(data_file) == 'touched'
+    assert PriceModel.load(data_file).coefficients == model.coefficients
+    assert len(fits) == 1
+    assert PriceModel.read(coefficient_file(data_file)).source['mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+
+    # changed contents: refit
+    df = pd.read_excel(data_file, sheet_name="Sheet1")
+    df['Price'] *= 2
+    df.to_excel(data_file, sheet_name="Sheet1", index=False)
+    refitted = PriceModel.load(data_file)
+    assert len(fits) == 2
+    assert refitted.coefficients == pytest.approx([2 * c for c in model.coefficients])
+    assert refitted.source['sha256'] != model.source['sha256']
+
+def test_other_settings_or_a_broken_cache_refit(data_file, fits):
+    PriceModel.load(data_file)
+    PriceModel.load(data_file, method='cholesky')
+    assert len(fits) == 2
+    PriceModel.load(data_file, method='cholesky')
+    assert len(fits) == 2
+    with open(coefficient_file(data_file), 'w') as cache:
+        cache.write('{not json')
+    PriceModel.load(data_file, method='cholesky')
+    assert len(fits) == 3
+
+def test_get_model_reloads_changed_data(data_file, fits, monkeypatch):
+    monkeypatch.setattr(linear_regression, 'models', {})
+    model = linear_regression.get_model(data_file)
+    assert linear_regression.get_model(data_file) is model
+    df = pd.read_excel(data_file, sheet_name="Sheet1")
+    df['Price'] += 1000
+    df.to_excel(data_file, sheet_name="Sheet1", index=False)
+    reloaded = linear_regression.get_model(data_file)
+    assert reloaded is not model and len(fits) == 2
+    assert reloaded.coefficients[0] == pytest.approx(model.coefficients[0] + 1000)
+
+# Listings with an id column, the same columns as the training data
+def listings(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'id': np.arange(count), 'Area': rng.integers(20, 200, count),
+                         'Construction Year': rng.integers(1900, 2024, count),
+                         'Number of Rooms': rng.integers(1, 7, count), 'Floor': rng.integers(1, 12, count),
+                         'X coordinate': rng.uniform(0, 3, count), 'Y coordinate': rng.uniform(0, 3, count)})
+
+def test_predict_batch_matches_predict():
+    model = PriceModel((1e5, 2500.0, 40.0, -3000.0, 700.0, -25000.0))
+    df = listings(100)
+    expected = [model.predict(row) for row in df[COLUMNS].to_numpy(dtype=float)]
+    assert model.predict_batch(df) == pytest.approx(expected, rel=1e-12)
+    assert model.predict_batch(df[COLUMNS].to_numpy()) == pytest.approx(expected, rel=1e-12)
+    assert len(model.predict_batch(np.empty((0, 6)))) == 0
+    with pytest.raises(ValueError):
+        model.predict_batch(np.ones((3, 5)))
+
+@pytest.mark.parametrize('pyarrow_csv', [True, False])
+def test_score_csv_in_chunks(tmp_path, monkeypatch, pyarrow_csv):
+    if not pyarrow_csv: # the pandas reader and writer
+        import_pyarrow = score.import_pyarrow
+        monkeypatch.setattr(score, 'import_pyarrow',
+                            lambda submodule: None if submodule == 'csv' else import_pyarrow(submodule))
+    model = PriceModel((1e5, 2500.0, 40.0, -3000.0, 700.0, -25000.0))
+    df = listings(50)
+    df.to_csv(tmp_path / 'listings.csv', index=False)
+    rows = score.score(model, str(tmp_path / 'listings.csv'), score.CsvWriter(str(tmp_path / 'prices.csv')),
+                       keep=['id'], chunk_size=7)
+    output = pd.read_csv(tmp_path / 'prices.csv')
+    assert rows == 50 and list(output.columns) == ['id', score.PREDICTION]
+    assert output['id'].tolist() == list(range(50))
+    assert output[score.PREDICTION].to_numpy() == pytest.approx(model.predict_batch(df).round(2), abs=1e-6)
+
+def test_score_parquet_in_chunks(tmp_path):
+    pytest.importorskip('pyarrow.parquet')
+    model = PriceModel((1e5, 2500.0, 40.0, -3000.0, 700.0, -25000.0))
+    df = listings(50)
+    df.to_parquet(tmp_path / 'listings.parquet', index=False)
+    rows = score.score(model, str(tmp_path / 'listings.parquet'),
+                       score.ParquetWriter(str(tmp_path / 'prices.parquet')), keep=['id', 'Area'], chunk_size=7)
+    output = pd.read_parquet(tmp_path / 'prices.parquet')
+    assert rows == 50 and list(output.columns) == ['id', 'Area', score.PREDICTION]
+    assert output['id'].tolist() == list(range(50))
+    assert output[score.PREDICTION].to_numpy() == pytest.approx(model.predict_batch(df), rel=1e-12)
+
+def test_score_main_uses_the_stored_model(data_file, tmp_path, capsys):
+    listings(20).to_csv(tmp_path / 'listings.csv', index=False)
+    score.main([str(tmp_path / 'listings.csv'), '-o', str(tmp_path / 'prices.csv'), '--keep', 'id',
+                '--chunk-size', '3', '--data', data_file])
+    assert '20 rows' in capsys.readouterr().err
+    output = pd.read_csv(tmp_path / 'prices.csv')
+    expected = PriceModel.load(data_file).predict_batch(listings(20)).round(2)
+    assert output[score.PREDICTION].to_numpy() == pytest.approx(expected, abs=1e-6)
+
+# Random regression data: an intercept column, badly scaled features and noise
+# @return: X, y and the true coefficients
+def regression_data(rows, feature_count=FEATURE_COUNT, seed=0):
+    rng = np.random.default_rng(seed)
+    X = np.column_stack((np.ones(rows), rng.normal(0, 1, (rows, feature_count - 1)) *
+                         np.logspace(0, 3, feature_count - 1) + np.arange(1, feature_count) * 100))
+    b = rng.normal(0, 10, feature_count)
+    return X, X @ b + rng.normal(0, 0.1, rows), b
+
+@pytest.mark.parametrize('ridge', [0.0, 5.0])
+def test_solvers_agree(ridge):
+    X, y, b = regression_data(2000)
+    fit = LeastSquares(FEATURE_COUNT).add(X, y)
+    coefficients = {method: fit.solve(method, ridge) for method in ('qr', 'cholesky', 'lstsq')}
+    for method in ('cholesky', 'lstsq'):
+        assert coefficients[method] == pytest.approx(coefficients['qr'], rel=1e-6, abs=1e-6)
+    # the normal equations with the penalty (the intercept is not penalized)
+    penalty = np.diag([0.0] + [ridge] * (FEATURE_COUNT - 1))
+    assert coefficients['qr'] == pytest.approx(np.linalg.solve(X.T @ X + penalty, X.T @ y), rel=1e-6)
+    if not ridge:
+        assert coefficients['qr'] == pytest.approx(np.linalg.lstsq(X, y, rcond=None)[0], rel=1e-8)
+        assert coefficients['qr'][1:] == pytest.approx(b[1:], abs=0.01)
+
+def test_merged_chunks_equal_a_single_pass():
+    X, y, _ = regression_data(1000, seed=1)
+    single = LeastSquares(FEATURE_COUNT).add(X, y)
+    merged = LeastSquares(FEATURE_COUNT)
+    for part in np.array_split(np.arange(1000), 4):
+        partial = LeastSquares(FEATURE_COUNT)
+        for chunk in np.array_split(part, 3):
+            partial.add(X[chunk], y[chunk])
+        merged.merge(partial)
+    merged.merge(LeastSquares(FEATURE_COUNT)) # an empty partial result
+    assert merged.count == single.count and merged.y_mean == pytest.approx(single.y_mean)
+    assert merged.xtx == pytest.approx(single.xtx) and merged.xty == pytest.approx(single.xty)
+    # R is unique up to the signs of its rows
+    assert np.abs(merged.r) == pytest.approx(np.abs(single.r))
+    for method in ('qr', 'cholesky', 'lstsq'):
+        assert merged.solve(method) == pytest.approx(single.solve(method), rel=1e-7)
+
+def test_ridge_shrinks_the_coefficients():
+    X, y, _ = regression_data(200, seed=2)
+    fit = LeastSquares(FEATURE_COUNT).add(X, y)
+    norms = [np.linalg.norm(fit.solve('qr', ridge)[1:]) for ridge in (0.0, 10.0, 1e3, 1e6, 1e10)]
+    assert all(a > b for a, b in zip(norms, norms[1:]))
+    assert norms[-1] < 0.1 * norms[0]
+    # the intercept is not penalized: a huge ridge leaves the mean
+    assert fit.solve('qr', 1e12)[0] == pytest.approx(y.mean(), rel=1e-3)
+
+def test_training_matches_the_model_fit(tmp_path):
+    df = pd.read_excel(DATA_FILE, sheet_name="Sheet1")
+    assert features(df).shape[1] == FEATURE_COUNT
+    df.iloc[:120].to_csv(tmp_path / 'a.csv', index=False)
+    df.iloc[120:].to_parquet(tmp_path / 'b.parquet', index=False, row_group_size=30)
+    files = [str(tmp_path / 'a.csv'), str(tmp_path / 'b.parquet')]
+    expected = PriceModel.fit(DATA_FILE)
+    for workers in (1, 2):
+        model = training.train(files, workers=workers, chunk_size=16)
+        assert model.coefficients == pytest.approx(expected.coefficients, rel=1e-9)
+        assert model.diagnostics['r2'] == pytest.approx(expected.diagnostics['r2'])
+        assert model.diagnostics['rows'] == len(df)
@@ -0,0 +1,116 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from least_squares import LeastSquares, ResidualStatistics
+from linear_regression import COLUMNS, FEATURE_COUNT, TARGET, PriceModel, features
+from score import import_pyarrow, read_chunks
+
+# Out-of-core training of the price model from any number of CSV, Parquet
+# and Excel files. The files are read in chunks and only the least squares
+# sums are kept (see least_squares.py), so the training data can be much
+# larger than the memory. The files (and the row groups of Parquet files)
+# are independent tasks, which can be accumulated in parallel processes.
+# The diagnostics need a second pass over the data.
+#
+# Usage: python training.py data/*.parquet --method qr --ridge 0.5 --workers 4 -o model.json
+# The model file can be used with PriceModel.read(filename).
+
+# Splits the files to tasks: (filename, row group), row group is None
+# for the files that are read as a whole
+def training_tasks(filenames):
+    tasks = []
+    for filename in filenames:
+        if filename.endswith('.parquet'):
+            pyarrow = import_pyarrow('parquet')
+            if pyarrow is None:
+                raise RuntimeError("Parquet input requires pyarrow (pip install pyarrow)")
+            row_groups = pyarrow.parquet.ParquetFile(filename).num_row_groups
+            tasks.extend((filename, row_group) for row_group in range(row_groups))
+        else:
+            tasks.append((filename, None))
+    return tasks
+
+# Yields the (X, y) chunks of one task
+def read_task(task, chunk_size):
+    filename, row_group = task
+    columns = COLUMNS + [TARGET]
+    if filename.endswith(('.xlsx', '.xls')):
+        chunks = [pd.read_excel(filename, sheet_name="Sheet1", usecols=columns)]
+    elif row_group is not None:
+        parquet_file = import_pyarrow('parquet').parquet.ParquetFile(filename)
+        chunks = (batch.to_pandas() for batch in parquet_file.iter_batches(
+            batch_size=chunk_size, row_groups=[row_group], columns=columns))
+    else:
+        chunks = read_chunks(filename, columns, chunk_size)
+    for chunk in chunks:
+        yield features(chunk), chunk[TARGET].to_numpy(dtype=float)
+
+# First pass: the least squares sums of one task
+def accumulate(task, chunk_size):
+    fit = LeastSquares(FEATURE_COUNT)
+    for X, y in read_task(task, chunk_size):
+        fit.add(X, y)
+    return fit
+
+# Second pass: the residual statistics of one task
+def residuals(task, chunk_size, coefficients, y_mean):
+    statistics = ResidualStatistics(coefficients, y_mean)
+    for X, y in read_task(task, chunk_size):
+        statistics.add(X, y)
+    return statistics
+
+# Runs the function for every task, in 'workers' processes if workers > 1
+# @return: results in the order of the tasks
+def map_tasks(function, tasks, workers, *args):
+    if workers <= 1 or len(tasks) <= 1:
+        return [function(task, *args) for task in tasks]
+    with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+        return list(pool.map(function, tasks, *([arg] * len(tasks) for arg in args)))
+
+# Trains the model
+# @param method, ridge: solver settings, see least_squares.py
+# @param workers: number of processes
+# @param diagnostics: compute R² and the residual statistics (second pass)
+# @return: PriceModel
+def train(filenames, method='qr', ridge=0.0, workers=1, chunk_size=1 << 20, diagnostics=True):
+    tasks = training_tasks(filenames)
+    fit = LeastSquares(FEATURE_COUNT)
+    for partial in map_tasks(accumulate, tasks, workers, chunk_size):
+        fit.merge(partial)
+    coefficients = fit.solve(method, ridge)
+
+    summary = {}
+    if diagnostics:
+        statistics = ResidualStatistics(coefficients, fit.y_mean)
+        for partial in map_tasks(residuals, tasks, workers, chunk_size, coefficients, fit.y_mean):
+            statistics.merge(partial)
+        summary = statistics.summary()
+    source = {'files': [os.path.abspath(filename) for filename in filenames]}
+    return PriceModel(coefficients, source, {'method': method, 'ridge': float(ridge)}, summary)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the price model from CSV, Parquet or Excel files")
+    parser.add_argument('files', nargs='+', help="training data with the columns: " +
+                        ', '.join(COLUMNS + [TARGET]))
+    parser.add_argument('--method', choices=('qr', 'cholesky', 'lstsq'), default='qr')
+    parser.add_argument('--ridge', type=float, default=0.0, help="ridge regularization strength")
+    parser.add_argument('--workers', type=int, default=1, help="worker processes")
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help="rows per chunk")
+    parser.add_argument('--no-diagnostics', action='store_true', help="skip the second pass")
+    parser.add_argument('-o', '--output', help="model file (JSON)")
+    args = parser.parse_args(argv)
+
+    try:
+        model = train(args.files, args.method, args.ridge, args.workers, args.chunk_size,
+                      not args.no_diagnostics)
+    except RuntimeError as error:
+        parser.error(str(error))
+    if args.output:
+        model.save(args.output)
+    print("coefficients: " + ', '.join('{:.6g}'.format(c) for c in model.coefficients))
+    for key, value in model.diagnostics.items():
+        print("{:<14} {:.6g}".format(key + ':', value))
+
+if __name__ == "__main__":
+    main()
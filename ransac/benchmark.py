@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import ransac
+from ransac import ransac2d, ransac2d_adaptive, line_hypotheses, count_inliers, \
+    normal_to_slope_intercept
+from ransacnd import ransacnd
+from models import Line2D, Plane3D
+from fitline import fitline, batched_fitline
+
+# Benchmarks of the line fitting implementations on seeded synthetic data.
+#
+# For every point count and outlier ratio a dataset is generated, every
+# implementation is run 'repeat' times and the fastest run is reported with
+# the throughput (hypotheses/s and point-hypothesis evaluations/s). Peak
+# memory is measured with tracemalloc in a separate run, so the tracing
+# doesn't slow down the timed runs. The 'stages' implementation times the
+# steps of ransac2d separately with the same functions ransac2d calls, so the
+# counting stage uses the compiled kernel when it has been built. With --json the results are written in a
+# machine readable form for tracking regressions between versions.
+#
+# Usage: python benchmark.py --sizes 10000 1000000 --outlier-ratios 0.5 0.9 --json results.json
+
+# Creates points of the line y = 0.5x + 3 and uniform outliers
+# @return: 2xn array of points
+def make_line(point_count, outlier_ratio, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 100, point_count)
+    y = 0.5 * x + 3 + rng.normal(0, noise, point_count)
+    outliers = rng.random(point_count) < outlier_ratio
+    y[outliers] = rng.uniform(0, 60, np.count_nonzero(outliers))
+    return np.vstack((x, y))
+
+# Creates points of the plane z = 0.3x - 0.2y + 5 and uniform outliers
+# @return: 3xn array of points
+def make_plane(point_count, outlier_ratio, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    x, y = rng.uniform(0, 100, (2, point_count))
+    z = 0.3 * x - 0.2 * y + 5 + rng.normal(0, noise, point_count)
+    outliers = rng.random(point_count) < outlier_ratio
+    z[outliers] = rng.uniform(-20, 40, np.count_nonzero(outliers))
+    return np.vstack((x, y, z))
+
+# ransac2d step by step, every step timed separately
+# @return: number of hypotheses, and dict of stage -> seconds
+def run_stages(pts, distance_threshold, N, seed):
+    times = {}
+    start = time.perf_counter()
+    pairs = np.random.default_rng(seed).integers(0, pts.shape[1], size=(N, 2))
+    times['sampling'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normals, offsets = line_hypotheses(pts, pairs)
+    times['hypotheses'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts = count_inliers(normals, offsets, pts, distance_threshold)
+    times['counting'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    best = np.argmax(counts)
+    inliers = pts[:, np.abs(normals[best] @ pts - offsets[best]) < distance_threshold].T
+    normal_to_slope_intercept(*fitline(inliers))
+    times['refit'] = time.perf_counter() - start
+    return N, times
+
+# The benchmarked implementations. Each takes (points, threshold, N, seed)
+# and returns the number of hypotheses it evaluated and the stage times
+# (None if the stages are not timed separately).
+def run_ransac2d(pts, distance_threshold, N, seed):
+    ransac2d(pts, distance_threshold, N, 0, rng=seed)
+    return N, None
+
+def run_grid(pts, distance_threshold, N, seed):
+    ransac2d(pts, distance_threshold, N, 0, rng=seed, spatial_index=True)
+    return N, None
+
+def run_adaptive(pts, distance_threshold, N, seed):
+    return ransac2d_adaptive(pts, distance_threshold, N, 0, rng=seed).iterations, None
+
+def run_msac(pts, distance_threshold, N, seed):
+    return ransac2d_adaptive(pts, distance_threshold, N, 0, scoring='msac',
+                             local_optimization=True, rng=seed).iterations, None
+
+def run_line2d(pts, distance_threshold, N, seed):
+    return ransacnd(pts, Line2D(), distance_threshold, N, confidence=None, rng=seed).iterations, None
+
+def run_plane3d(pts, distance_threshold, N, seed):
+    return ransacnd(pts, Plane3D(), distance_threshold, N, confidence=None, rng=seed).iterations, None
+
+def run_fitline(pts, distance_threshold, N, seed):
+    fitline(pts.T)
+    return 1, None
+
+def run_batched_fitline(pts, distance_threshold, N, seed):
+    subsets = np.random.default_rng(seed).random((16, pts.shape[1])) < 0.5
+    batched_fitline(pts.T, subsets)
+    return len(subsets), None
+
+# name -> (implementation, dataset generator)
+IMPLEMENTATIONS = {
+    'ransac2d': (run_ransac2d, make_line),
+    'grid': (run_grid, make_line),
+    'adaptive': (run_adaptive, make_line),
+    'msac': (run_msac, make_line),
+    'line2d': (run_line2d, make_line),
+    'fitline': (run_fitline, make_line),
+    'batched_fitline': (run_batched_fitline, make_line),
+    'stages': (run_stages, make_line),
+    'plane3d': (run_plane3d, make_plane),
+}
+
+# Runs one implementation once
+# @return: (seconds, hypotheses, stage times or None)
+def run_once(name, pts, distance_threshold, N, seed):
+    implementation, _ = IMPLEMENTATIONS[name]
+    start = time.perf_counter()
+    hypotheses, stages = implementation(pts, distance_threshold, N, seed)
+    return time.perf_counter() - start, hypotheses, stages
+
+# @return: peak bytes allocated during one run (tracemalloc)
+def peak_memory(name, pts, distance_threshold, N, seed):
+    tracemalloc.start()
+    try:
+        run_once(name, pts, distance_threshold, N, seed)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Benchmarks one implementation on one dataset
+# @return: dict of the results
+def benchmark(name, point_count, outlier_ratio, distance_threshold, N, seed, repeat):
+    _, make = IMPLEMENTATIONS[name]
+    pts = make(point_count, outlier_ratio, seed=seed)
+    runs = [run_once(name, pts, distance_threshold, N, seed) for _ in range(repeat)]
+    elapsed, hypotheses, stages = min(runs, key=lambda run: run[0])
+    return {
+        'implementation': name,
+        'points': point_count,
+        'outlier_ratio': outlier_ratio,
+        'distance_threshold': distance_threshold,
+        'max_hypotheses': N,
+        'hypotheses': hypotheses,
+        'seconds': elapsed,
+        'seconds_all': [run[0] for run in runs],
+        'hypotheses_per_second': hypotheses / elapsed,
+        'points_per_second': hypotheses * point_count / elapsed,
+        'peak_memory_bytes': peak_memory(name, pts, distance_threshold, N, seed),
+        'stages': stages,
+    }
+
+# @return: description of the machine and the versions, stored with the results
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'ransac_kernels': ransac.ransac_kernels is not None,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def print_result(result):
+    print("{:<16} {:>10} {:>6.2f} {:>8} {:>9.3f} s {:>12.0f} hyp/s {:>8.3g} pts/s {:>8.1f} MB".format(
+        result['implementation'], result['points'], result['outlier_ratio'], result['hypotheses'],
+        result['seconds'], result['hypotheses_per_second'], result['points_per_second'],
+        result['peak_memory_bytes'] / 1e6))
+    if result['stages']:
+        print("{:<16} ".format('') + ", ".join("{} {:.3f} s".format(stage, seconds)
+                                                 for stage, seconds in result['stages'].items()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RANSAC and line fitting implementations")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help="point counts")
+    parser.add_argument('--outlier-ratios', type=float, nargs='+', default=[0.5], help="outlier ratios")
+    parser.add_argument('--implementations', nargs='+', default=list(IMPLEMENTATIONS),
+                        choices=list(IMPLEMENTATIONS))
+    parser.add_argument('--hypotheses', type=int, default=1000, help="(maximum) hypotheses per run")
+    parser.add_argument('--threshold', type=float, default=0.05, help="inlier distance threshold")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the data and the sampling")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per benchmark (fastest is reported)")
+    parser.add_argument('--json', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = []
+    for point_count in args.sizes:
+        for outlier_ratio in args.outlier_ratios:
+            for name in args.implementations:
+                result = benchmark(name, point_count, outlier_ratio, args.threshold,
+                                   args.hypotheses, args.seed, args.repeat)
+                print_result(result)
+                results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump({'environment': environment(), 'arguments': vars(args), 'results': results},
+                      output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,76 @@
-from numpy import array
 import numpy as np
 
-# Finds eigenvectors and values by doing principal component analysis
-# @param data_array: data points (x,y) in column vector
-# @return: 2D array of eigenvalues and eigenvectors
-def sklearn_pca(data_array):
-    from sklearn.decomposition import PCA
-    pca = PCA(2)
-    pca.fit(data_array)
-    eigenvalues = pca.explained_variance_
-    eigenvectors = pca.components_.T # .T: to match w/ numpy
-    return eigenvalues, eigenvectors
+# Line fitting by total least squares (TLS). The best line goes through the
+# mean of the points and its normal is the eigenvector of the smallest
+# eigenvalue of the 2x2 covariance matrix [[cxx, cxy], [cxy, cyy]]. For a 2x2
+# matrix the eigenvectors are known in closed form: the direction of the line
+# is at angle 0.5*atan2(2*cxy, cxx - cyy), so no eigen solver (nor sklearn) is
+# needed. The covariance is computed from the sums (w, wx, wy, wxx, wxy, wyy),
+# which makes it cheap to fit many subsets at once or to keep running sums.
+#
+# Line is presented in normal form: p = x*nx + y*ny, where the unit normal
+# (nx, ny) = (-sin(theta), cos(theta)). See ransac.normal_to_slope_intercept.
 
-# Does the same as the above function, but without sklearn and PCA
-# @param data_array: data points (x,y) in column vector
-# @return: 2D array of eigenvalues and eigenvectors
-def get_eigenvector(data_array):
-    centered_matrix = data_array.T - data_array.T.mean(axis=1)[:, np.newaxis]
-    cov = np.dot(centered_matrix, centered_matrix.T)
-    eigenvalues, eigenvectors = np.linalg.eig(cov)
-    return eigenvalues, eigenvectors
+# Computes the sums needed for fitting
+# @param points: data points (x,y), one point per row
+# @param weights: optional weight of every point (weighted TLS)
+# @param origin: the sums are computed of points - origin, see fitline_from_sums
+# @return: array [sum w, sum wx, sum wy, sum wxx, sum wxy, sum wyy]
+def line_sums(points, weights=None, origin=(0.0, 0.0)):
+    points = np.asarray(points, dtype=float)
+    x = points[:, 0] - origin[0]
+    y = points[:, 1] - origin[1]
+    w = np.ones(len(x)) if weights is None else np.asarray(weights, dtype=float)
+    wx = w * x
+    wy = w * y
+    return np.array([w.sum(), wx.sum(), wy.sum(), wx @ x, wx @ y, wy @ y])
 
-# Often, the eigenvalues and vectors are not given in any particular order,
-# because only the magnitudes are intresting. If x is valid eigenvector, so is -x.
-# However, the 'sign randomnes' can cause problems with other calculations, so some
-# standard representation must be established. This function sorts the eigenvalues
-# from the greatest to smallest. The eigenvectors are ordered accordingly too.
-def eigen_sort(eigenvalues, eigenvectors):
-    idx = eigenvalues.argsort()[::-1]
-    eigenvalues = eigenvalues[idx]
-    eigenvectors = eigenvectors[:,idx]
-    return eigenvalues, eigenvectors
+# Fits lines from sums. Sums of many subsets can be fitted at once.
+# The covariance is computed as E[xx] - E[x]^2, which loses precision when
+# the points are far from the origin compared to their spread. Subtract a
+# point near the data (e.g. the first point) as the 'origin' of the sums.
+# @param sums: array of shape (..., 6) from line_sums (or their sum)
+# @param origin: origin that was used when computing the sums
+# @return theta: angle, p: length of perpendicular (arrays of shape (...))
+def fitline_from_sums(sums, origin=(0.0, 0.0)):
+    sums = np.asarray(sums, dtype=float)
+    w, sx, sy, sxx, sxy, syy = np.moveaxis(sums, -1, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_x = sx / w
+        mean_y = sy / w
+        cxx = sxx / w - mean_x ** 2
+        cxy = sxy / w - mean_x * mean_y
+        cyy = syy / w - mean_y ** 2
+    theta = 0.5 * np.arctan2(2 * cxy, cxx - cyy)
+    p = (origin[1] + mean_y) * np.cos(theta) - (origin[0] + mean_x) * np.sin(theta)
+    return theta, p
 
 # Finds a line that fits to given data
-# Line is presented in normal form: p = x*cos(theta) + y*sin(theta)
-# @param data_array: column vector of data points (x,y)
+# Line is presented in normal form: p = x*nx + y*ny (see above)
+# @param data_array: data points (x,y), one point per row
+# @param weights: optional weight of every point (weighted TLS)
 # @return theta: angle
 # @return p: length of perpendicular
-def fitline(data_array, pts):
-    try:
-        _, eigenvectors = eigen_sort(*sklearn_pca(pts))
-    except:
-        _, eigenvectors = eigen_sort(*get_eigenvector(pts))
-
-    ev1 = np.array(eigenvectors[:,1]) # pick one vector
-    theta = -np.arctan2(*ev1)
-    ev1_col = np.matrix([*ev1]).T # create column vector
-    mean = np.matrix([np.mean(data_array, axis=0)])
-    p = mean * ev1_col
-    return theta, p
-
-# Note: Instead of finding eigenvectors,
-# we could also do fitting by using total least squares (TLS)
+def fitline(data_array, weights=None):
+    data_array = np.asarray(data_array, dtype=float)
+    # The mean is used as the origin, so the sums are the centered covariance
+    if weights is None:
+        origin = data_array.mean(axis=0)
+    else:
+        origin = np.average(data_array, axis=0, weights=weights)
+    theta, p = fitline_from_sums(line_sums(data_array, weights, origin), origin)
+    return float(theta), float(p)
 
-# Note: Instead of PCA we could also do fitting by using Total least squares (TLS)
\ No newline at end of file
+# Fits a line to every subset of the points at once
+# @param points: data points (x,y), one point per row (n points)
+# @param subsets: K x n array of boolean masks or weights, one row per subset
+# @return theta, p: arrays of K angles and lengths of perpendicular.
+#         Empty subsets get nan.
+def batched_fitline(points, subsets):
+    points = np.asarray(points, dtype=float)
+    subsets = np.asarray(subsets, dtype=float)
+    origin = points.mean(axis=0)
+    x = points[:, 0] - origin[0]
+    y = points[:, 1] - origin[1]
+    terms = np.column_stack((np.ones(len(x)), x, y, x * x, x * y, y * y))
+    return fitline_from_sums(subsets @ terms, origin)
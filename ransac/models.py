@@ -0,0 +1,147 @@
+import numpy as np
+from ransac import BLOCK_ELEMENTS, count_inliers, line_hypotheses
+from fitline import fitline
+
+# Model plugins for the generic RANSAC core (ransacnd.py).
+#
+# A model has:
+#   sample_size:           number of points in a minimal sample
+#   dimension:             dimension of the points (None: any)
+#   hypotheses(samples):   K x sample_size x d array of samples -> K x p parameters.
+#                          Degenerate samples get nan parameters (they never have inliers).
+#   residuals(params, pts): K x p parameters, d x n points -> K x n distances
+#   refit(pts):            d x n inlier points -> least squares parameters (p)
+#   count_inliers(params, pts, distance_threshold): inliers of every hypothesis
+#
+# Hyperplanes (lines, planes, ...) have parameters [normal..., offset], where
+# normal . x = offset and the normal is an unit vector. Their distances are one
+# matrix product, so they use the in-place blocked ransac.count_inliers.
+
+class Model:
+    sample_size = None
+    dimension = None
+
+    def hypotheses(self, samples):
+        raise NotImplementedError
+
+    def residuals(self, params, pts):
+        raise NotImplementedError
+
+    def refit(self, pts):
+        raise NotImplementedError
+
+    # Counts the inliers of the hypotheses a block of hypotheses at a time,
+    # so the residual matrix of a block has at most 'block_elements' elements.
+    def count_inliers(self, params, pts, distance_threshold, block_elements=BLOCK_ELEMENTS):
+        block_size = max(1, block_elements // pts.shape[1])
+        counts = np.empty(len(params), dtype=np.int64)
+        for start in range(0, len(params), block_size):
+            residuals = self.residuals(params[start:start + block_size], pts)
+            counts[start:start + block_size] = np.count_nonzero(residuals < distance_threshold, axis=1)
+        return counts
+
+# Hyperplane of any dimension: a line in 2D, a plane in 3D etc.
+class Hyperplane(Model):
+    def __init__(self, dimension):
+        if dimension < 2:
+            raise ValueError("Bad function arguments")
+        self.dimension = dimension
+        self.sample_size = dimension
+
+    # The normal is the direction orthogonal to the differences of the sample
+    # points: the last right singular vector of the (d-1) x d difference matrix.
+    def hypotheses(self, samples):
+        differences = samples[:, 1:] - samples[:, :1]
+        _, singular_values, vh = np.linalg.svd(differences)
+        normals = vh[:, -1]
+        scale = np.maximum(singular_values[:, 0], np.finfo(float).tiny)
+        degenerate = singular_values[:, -1] <= 1e-12 * scale
+        return self.from_normals(normals, samples[:, 0], degenerate)
+
+    # @return: parameters of the hyperplanes through 'points' with the given normals
+    def from_normals(self, normals, points, degenerate):
+        params = np.empty((len(normals), self.dimension + 1))
+        params[:, :-1] = normals
+        params[:, -1] = np.einsum('ij,ij->i', normals, points)
+        params[degenerate] = np.nan
+        return params
+
+    def residuals(self, params, pts):
+        return np.abs(params[:, :-1] @ pts - params[:, -1:])
+
+    def count_inliers(self, params, pts, distance_threshold, block_elements=BLOCK_ELEMENTS):
+        # nan offsets of the degenerate samples would be slower than inf in the comparisons
+        offsets = np.where(np.isnan(params[:, -1]), np.inf, params[:, -1])
+        normals = np.nan_to_num(params[:, :-1])
+        return count_inliers(normals, offsets, pts, distance_threshold, block_elements)
+
+    # Total least squares: the normal is the eigenvector of the smallest
+    # eigenvalue of the covariance matrix and the plane goes through the mean.
+    def refit(self, pts):
+        mean = pts.mean(axis=1)
+        centered = pts - mean[:, np.newaxis]
+        _, eigenvectors = np.linalg.eigh(centered @ centered.T)
+        normal = eigenvectors[:, 0]
+        return np.append(normal, normal @ mean)
+
+class Line2D(Hyperplane):
+    def __init__(self):
+        super().__init__(2)
+
+    def hypotheses(self, samples):
+        pts = samples.reshape(-1, 2).T
+        pairs = np.arange(len(samples) * 2).reshape(-1, 2)
+        normals, offsets = line_hypotheses(pts, pairs)
+        params = np.column_stack((normals, offsets))
+        params[np.isinf(offsets)] = np.nan
+        return params
+
+    def refit(self, pts):
+        theta, p = fitline(pts.T)
+        return np.array([-np.sin(theta), np.cos(theta), p])
+
+class Plane3D(Hyperplane):
+    def __init__(self):
+        super().__init__(3)
+
+    # The normal is the cross product of the two edges of the sample triangle
+    def hypotheses(self, samples):
+        normals = np.cross(samples[:, 1] - samples[:, 0], samples[:, 2] - samples[:, 0])
+        norm = np.linalg.norm(normals, axis=1)
+        degenerate = norm == 0
+        normals[~degenerate] /= norm[~degenerate, np.newaxis]
+        return self.from_normals(normals, samples[:, 0], degenerate)
+
+# Circle in 2D, parameters [center x, center y, radius]
+class Circle(Model):
+    sample_size = 3
+    dimension = 2
+
+    # Circumcircles of the sample triangles
+    def hypotheses(self, samples):
+        a, b, c = samples[:, 0], samples[:, 1], samples[:, 2]
+        b = b - a
+        c = c - a
+        d = 2 * (b[:, 0] * c[:, 1] - b[:, 1] * c[:, 0])
+        b_squared = (b ** 2).sum(axis=1)
+        c_squared = (c ** 2).sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            center_x = (c[:, 1] * b_squared - b[:, 1] * c_squared) / d
+            center_y = (b[:, 0] * c_squared - c[:, 0] * b_squared) / d
+        params = np.column_stack((a[:, 0] + center_x, a[:, 1] + center_y, np.hypot(center_x, center_y)))
+        params[d == 0] = np.nan # collinear points
+        return params
+
+    def residuals(self, params, pts):
+        dx = pts[0] - params[:, 0:1]
+        dy = pts[1] - params[:, 1:2]
+        return np.abs(np.hypot(dx, dy) - params[:, 2:3])
+
+    # Algebraic (Kasa) fit: x^2 + y^2 = 2*cx*x + 2*cy*y + c is linear in cx, cy and c
+    def refit(self, pts):
+        mean = pts.mean(axis=1)
+        x, y = pts - mean[:, np.newaxis]
+        A = np.column_stack((2 * x, 2 * y, np.ones(len(x))))
+        (center_x, center_y, c), *_ = np.linalg.lstsq(A, x ** 2 + y ** 2, rcond=None)
+        return np.array([mean[0] + center_x, mean[1] + center_y,
+                         np.sqrt(c + center_x ** 2 + center_y ** 2)])
@@ -0,0 +1,267 @@
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from ransac import BLOCK_ELEMENTS, RansacResult, line_hypotheses, count_inliers, \
+    required_iterations, refit_to_inliers, slope_intercept, normal_to_slope_intercept
+from fitline import batched_fitline
+
+# Extraction of all the lines of a point set (e.g. a laser scan).
+#
+# extract_lines() runs sequential RANSAC: the best line is found, its inliers
+# are removed and the search is repeated on the remaining points. The
+# hypotheses of a round are split into chunks of CHUNK_SIZE, which can be
+# evaluated in a process pool. The points are kept in shared memory, so the
+# workers don't get a copy of them with every chunk.
+#
+# Every chunk has its own random generator seeded with (seed, round, chunk),
+# and the chunk results are combined in chunk order. The extracted lines
+# therefore depend only on the seed, not on the number of workers.
+#
+# jlinkage_lines() clusters the points by their preference sets instead
+# (J-linkage), which finds all the lines at once. It needs a points x hypotheses
+# matrix, so it's meant for smaller point sets (a few thousand points).
+
+CHUNK_SIZE = 256
+
+# Points of a worker process, see attach_points
+shared_points = {}
+
+# Initializer of the worker processes: maps the shared points array
+def attach_points(name, shape):
+    memory = shared_memory.SharedMemory(name=name)
+    shared_points['memory'] = memory
+    shared_points['points'] = np.ndarray(shape, dtype=float, buffer=memory.buf)
+
+# Evaluates one chunk of hypotheses drawn from the first 'count' points
+#@param seed: seed of the chunk's random generator
+#@param pts: points, or None in the worker processes (the shared points are used)
+#@return normal, offset, inlier count: the best line of the chunk
+def best_of_chunk(seed, size, count, distance_threshold, pts=None):
+    if pts is None:
+        pts = shared_points['points'][:, :count]
+    rng = np.random.default_rng(seed)
+    pairs = rng.integers(0, count, size=(size, 2))
+    normals, offsets = line_hypotheses(pts, pairs)
+    counts = count_inliers(normals, offsets, pts, distance_threshold)
+    best = np.argmax(counts)
+    return normals[best], offsets[best], counts[best]
+
+# Holds the points that haven't been assigned to a line yet and evaluates
+# hypotheses on them, either in this process or in a pool of 'workers'.
+class HypothesisPool:
+    def __init__(self, pts, workers=1):
+        self.workers = workers
+        self.count = pts.shape[1]
+        self.memory = None
+        self.executor = None
+        if workers > 1:
+            self.memory = shared_memory.SharedMemory(create=True, size=max(1, pts.nbytes))
+            self.points = np.ndarray(pts.shape, dtype=float, buffer=self.memory.buf)
+            self.executor = ProcessPoolExecutor(workers, initializer=attach_points,
+                                                initargs=(self.memory.name, pts.shape))
+        else:
+            self.points = np.empty(pts.shape)
+        self.points[:] = pts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.memory is not None:
+            del self.points
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    # The remaining points (a view, valid until the next keep)
+    def remaining(self):
+        return self.points[:, :self.count]
+
+    # Keeps only the points selected by the mask, moved to the front of the array
+    def keep(self, mask):
+        kept = self.remaining()[:, mask]
+        self.count = kept.shape[1]
+        self.points[:, :self.count] = kept
+
+    # Yields (chunk size, chunk result) in chunk order. At most two chunks
+    # per worker are queued, so the unneeded chunks are not evaluated when
+    # the caller stops early.
+    def evaluate(self, tasks, distance_threshold):
+        if self.executor is None:
+            for seed, size in tasks:
+                yield size, best_of_chunk(seed, size, self.count, distance_threshold, self.remaining())
+            return
+        pending = deque()
+        try:
+            for seed, size in tasks:
+                pending.append((size, self.executor.submit(
+                    best_of_chunk, seed, size, self.count, distance_threshold)))
+                if len(pending) >= 2 * self.workers:
+                    size, future = pending.popleft()
+                    yield size, future.result()
+            while pending:
+                size, future = pending.popleft()
+                yield size, future.result()
+        finally:
+            # the running chunks must finish before the points are changed
+            for _, future in pending:
+                if not future.cancel():
+                    future.exception()
+
+    # Finds the best line of one extraction round with adaptive termination
+    #@return normal, offset, inlier count, iterations
+    def best_line(self, seed, round_number, N, distance_threshold, confidence):
+        chunk_count = (N + CHUNK_SIZE - 1) // CHUNK_SIZE
+        tasks = (([seed, round_number, chunk], min(CHUNK_SIZE, N - chunk * CHUNK_SIZE))
+                 for chunk in range(chunk_count))
+        best_normal, best_offset, best_count = None, None, 0
+        iterations = 0
+        for size, (normal, offset, count) in self.evaluate(tasks, distance_threshold):
+            iterations += size
+            if count > best_count:
+                best_normal, best_offset, best_count = normal, offset, count
+            if iterations >= required_iterations(best_count / self.count, confidence):
+                break
+        return best_normal, best_offset, best_count, iterations
+
+# @return: non-negative integer seed from a seed, a Generator or None
+def integer_seed(rng):
+    if isinstance(rng, np.random.Generator):
+        return int(rng.integers(2 ** 63))
+    return int(np.random.SeedSequence(rng).generate_state(2, np.uint32).view(np.uint64)[0])
+
+#Sequential RANSAC: extracts lines one by one and removes their inliers.
+#@param points: 2xn array of data points (x,y)
+#@param distance_threshold: point must be within this threshold to be counted as a inlier
+#@param min_inliers: lines with fewer inliers are not extracted, which ends the search
+#@param max_models: maximum number of lines to extract
+#@param N: maximum number of iterations per line
+#@param confidence: stop a round when a line with this confidence has been found
+#@param workers: number of worker processes (1: no pool)
+#@param rng: seed or numpy Generator. The result is the same with any number of workers.
+#@return: list of RansacResults. The inliers are indices of the original points.
+def extract_lines(points, distance_threshold, min_inliers, max_models=10, N=10000,
+                  confidence=0.99, workers=1, rng=None):
+    pts = np.asarray(points, dtype=float)
+    if pts.ndim != 2 or pts.shape[0] != 2 or N < 1:
+        raise ValueError("Bad function arguments")
+    seed = integer_seed(rng)
+    remaining = np.arange(pts.shape[1])
+    models = []
+    with HypothesisPool(pts, workers) as pool:
+        for round_number in range(max_models):
+            if pool.count < max(2, min_inliers):
+                break
+            normal, offset, count, iterations = pool.best_line(
+                seed, round_number, N, distance_threshold, confidence)
+            if normal is None or count < min_inliers:
+                break
+            normal, offset, mask = refit_to_inliers(normal, offset, pool.remaining(), distance_threshold)
+            m, b = slope_intercept(normal, offset)
+            inliers = remaining[mask]
+            models.append(RansacResult(m, b, normal, offset, inliers, len(inliers), iterations))
+            remaining = remaining[~mask]
+            pool.keep(~mask)
+    return models
+
+# Draws N point pairs. The first point is uniform and the second one is
+# one of its 'neighbors' nearest points, as in the J-linkage paper: a random
+# pair of a multi-line scan is rarely on the same line, but neighbors often are.
+def local_pairs(pts, N, neighbors, rng):
+    point_count = pts.shape[1]
+    k = min(neighbors, point_count - 1)
+    first = rng.integers(0, point_count, N)
+    second = np.empty(N, dtype=np.int64)
+    block_size = max(1, BLOCK_ELEMENTS // point_count)
+    for start in range(0, N, block_size):
+        block = first[start:start + block_size]
+        rows = np.arange(len(block))
+        distances = (pts[0, block, np.newaxis] - pts[0]) ** 2 + (pts[1, block, np.newaxis] - pts[1]) ** 2
+        distances[rows, block] = np.inf
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        nearest.sort(axis=1) # argpartition's order is not specified
+        second[start:start + len(block)] = nearest[rows, rng.integers(0, k, len(block))]
+    return np.column_stack((first, second))
+
+#J-linkage: every point gets a preference set (the hypotheses it is an inlier of)
+#and clusters are merged while they have a common preference. Merged clusters
+#keep the intersection of the preference sets, so a cluster ends up being the
+#inliers of the hypotheses that are consistent with all its points.
+#@param N: number of hypotheses
+#@param neighbors: the hypotheses are drawn from the nearest points, see local_pairs
+#@return: list of RansacResults, largest first
+def jlinkage_lines(points, distance_threshold, min_inliers, N=5000, neighbors=10, rng=None):
+    pts = np.asarray(points, dtype=float)
+    if pts.ndim != 2 or pts.shape[0] != 2 or pts.shape[1] < 2 or N < 1:
+        raise ValueError("Bad function arguments")
+    rng = np.random.default_rng(rng)
+    point_count = pts.shape[1]
+    normals, offsets = line_hypotheses(pts, local_pairs(pts, N, neighbors, rng))
+    preferences = (np.abs(pts.T @ normals.T - offsets) < distance_threshold).astype(np.float32)
+
+    # Jaccard distances of the clusters, all at once for the initial clusters
+    # (the points) and one row at a time after a merge. Every row keeps its
+    # nearest cluster, so finding the next merge doesn't need the whole matrix.
+    def jaccard_distances(i):
+        intersection = preferences @ preferences[i]
+        union = sizes + sizes[i] - intersection
+        with np.errstate(divide='ignore', invalid='ignore'):
+            distances = np.where(union > 0, 1 - intersection / union, np.inf)
+        distances[~active] = np.inf
+        distances[i] = np.inf
+        return distances
+
+    sizes = preferences.sum(axis=1)
+    active = np.ones(point_count, dtype=bool)
+    members = [[i] for i in range(point_count)]
+    intersection = preferences @ preferences.T
+    union = sizes[:, np.newaxis] + sizes - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.where(union > 0, 1 - intersection / union, np.inf)
+    np.fill_diagonal(distance, np.inf)
+    nearest = np.argmin(distance, axis=1)
+    nearest_distance = distance[np.arange(point_count), nearest]
+    while True:
+        i = np.argmin(nearest_distance)
+        j = nearest[i]
+        if nearest_distance[i] >= 1: # no common preferences left
+            break
+        preferences[i] = np.minimum(preferences[i], preferences[j])
+        sizes[i] = preferences[i].sum()
+        members[i] += members[j]
+        active[j] = False
+        distance[j] = distance[:, j] = np.inf
+        nearest_distance[j] = np.inf
+        distance[i] = distance[:, i] = jaccard_distances(i)
+        nearest[i] = np.argmin(distance[i])
+        nearest_distance[i] = distance[i, nearest[i]]
+        # rows whose nearest cluster was merged, or that are now nearer to i
+        stale = active & ((nearest == i) | (nearest == j))
+        for row in np.flatnonzero(stale):
+            nearest[row] = np.argmin(distance[row])
+            nearest_distance[row] = distance[row, nearest[row]]
+        closer = active & (distance[:, i] < nearest_distance)
+        nearest[closer] = i
+        nearest_distance[closer] = distance[closer, i]
+
+    # All the clusters are fitted at once from their masks
+    clusters = [i for i in sorted(np.flatnonzero(active), key=lambda i: -len(members[i]))
+                if len(members[i]) >= max(2, min_inliers)]
+    masks = np.zeros((len(clusters), point_count), dtype=bool)
+    for row, i in enumerate(clusters):
+        masks[row, members[i]] = True
+    thetas, ps = batched_fitline(pts.T, masks)
+    models = []
+    for mask, theta, p in zip(masks, thetas, ps):
+        normal = np.array([-np.sin(theta), np.cos(theta)])
+        m, b = normal_to_slope_intercept(theta, p)
+        inliers = np.flatnonzero(mask)
+        models.append(RansacResult(m, b, normal, p, inliers, len(inliers), N))
+    return models
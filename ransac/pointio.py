@@ -0,0 +1,201 @@
+import os
+import warnings
+import numpy as np
+
+# Loading and saving of point sets. Points are 2xn arrays (x row, y row) as
+# ransac2d takes them.
+#
+# CSV files are parsed in chunks with numpy's C parsers. Two layouts are known:
+#   'rows':    one line of x values and one line of y values (points.csv)
+#   'columns': one point (x,y) per line, optionally with a header line
+# The layout is detected from the shape of the file (see detect_layout), or
+# it can be given with layout=.
+#
+# Binary files are memory-mapped, so loading takes no time and only the pages
+# that are used are read. ransac2d uses float32 and float64 arrays as they are,
+# without copying them. Formats:
+#   .npy:                numpy array of shape (2, n)
+#   .f32/.f64 (raw):     all x values followed by all y values (planar)
+#
+# Big CSV files should be converted once (csv_to_binary streams the points
+# through temporary files, so the whole CSV is never in memory) and the
+# binary file loaded afterwards:
+#   csv_to_binary('scan.csv', 'scan.npy')
+#   points = load_points('scan.npy')
+
+CHUNK_ROWS = 1 << 20     # lines per chunk of the 'columns' layout
+BLOCK_SIZE = 1 << 24     # bytes per block of the 'rows' layout
+RAW_TYPES = {'.f32': np.float32, '.f64': np.float64}
+
+# Detects the layout from the shape of the file: 'rows' has exactly two lines
+# and 'columns' has a header line, or one or more than two lines of two values.
+# Two lines of two values fit both layouts, so the layout must then be given.
+def detect_layout(filename):
+    lines = []
+    with open(filename, 'rb') as data:
+        while len(lines) < 3:
+            line = data.readline(BLOCK_SIZE) # the lines of 'rows' can be huge
+            if not line:
+                break
+            if not line.strip(b' \r\n'):
+                continue
+            if line.count(b',') != 1 or len(line) == BLOCK_SIZE:
+                return 'rows' # not a line of one point
+            lines.append(line.decode('ascii', 'replace'))
+    if lines and is_header(lines[0]):
+        return 'columns'
+    if len(lines) == 2:
+        raise ValueError("{}: two points or two rows of x and y values? "
+                         "Give the layout ('rows' or 'columns')".format(filename))
+    return 'columns' if lines else 'rows'
+
+# @return: True if the line is a header line (not numbers)
+def is_header(line):
+    try:
+        [float(field.strip(' "\'')) for field in line.split(',')]
+        return False
+    except ValueError:
+        return True
+
+# Reads the CSV file in chunks
+# @param layout: 'rows', 'columns' or 'auto'
+# @return: generator of (x, y) value arrays. With the 'rows' layout,
+#          all the x chunks come first (with empty y arrays), then the y chunks.
+def iter_csv_chunks(filename, layout='auto', dtype=np.float64):
+    if layout == 'auto':
+        layout = detect_layout(filename)
+    if layout == 'columns':
+        return iter_column_chunks(filename, dtype)
+    if layout == 'rows':
+        return iter_row_chunks(filename, dtype)
+    raise ValueError("Unknown layout: {}".format(layout))
+
+def iter_column_chunks(filename, dtype):
+    with open(filename) as data:
+        first = data.readline()
+        if not is_header(first):
+            data.seek(0)
+        while True:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning) # end of the file
+                chunk = np.loadtxt(data, delimiter=',', quotechar='"', dtype=dtype,
+                                   max_rows=CHUNK_ROWS, ndmin=2)
+            if len(chunk) == 0:
+                return
+            if chunk.shape[1] != 2:
+                raise ValueError("Expected two columns (x,y), got {}".format(chunk.shape[1]))
+            yield chunk[:, 0], chunk[:, 1]
+            if len(chunk) < CHUNK_ROWS:
+                return
+
+# The lines of the 'rows' layout can be longer than the memory, so they are
+# read in blocks. A block is parsed up to its last separator and the rest
+# (a partial number) is carried over to the next block.
+def iter_row_chunks(filename, dtype):
+    empty = np.empty(0, dtype=dtype)
+    row = 0
+    carry = b''
+    with open(filename, 'rb') as data:
+        while True:
+            block = data.read(BLOCK_SIZE)
+            text = carry + block
+            if block:
+                cut = max(text.rfind(b','), text.rfind(b'\n')) + 1
+                text, carry = text[:cut], text[cut:]
+            for i, line in enumerate(text.split(b'\n')):
+                if i > 0:
+                    row += 1
+                values = np.fromstring(line.replace(b'"', b'').decode('ascii'), dtype=dtype, sep=',') \
+                    if line.strip(b' \r,') else empty
+                if len(values) and row > 1:
+                    raise ValueError("Expected two lines (x and y), got more")
+                if len(values):
+                    yield (values, empty) if row == 0 else (empty, values)
+            if not block:
+                return
+
+# Loads the points of a CSV file into memory
+# @return: 2xn array
+def load_csv(filename, layout='auto', dtype=np.float64):
+    x, y = [], []
+    for x_chunk, y_chunk in iter_csv_chunks(filename, layout, dtype):
+        x.append(x_chunk)
+        y.append(y_chunk)
+    x = np.concatenate(x) if x else np.empty(0, dtype)
+    y = np.concatenate(y) if y else np.empty(0, dtype)
+    if len(x) != len(y):
+        raise ValueError("Different number of x ({}) and y ({}) values".format(len(x), len(y)))
+    return np.vstack((x, y))
+
+# Converts a CSV file to a binary point file (.npy or raw .f32/.f64)
+# without loading the whole file into memory.
+# @return: number of points
+def csv_to_binary(csv_filename, filename, layout='auto', dtype=np.float64):
+    dtype = RAW_TYPES.get(os.path.splitext(filename)[1], dtype)
+    temporary = [filename + '.x.tmp', filename + '.y.tmp']
+    try:
+        counts = [0, 0]
+        with open(temporary[0], 'wb') as x_file, open(temporary[1], 'wb') as y_file:
+            for x_chunk, y_chunk in iter_csv_chunks(csv_filename, layout, dtype):
+                x_chunk.tofile(x_file)
+                y_chunk.tofile(y_file)
+                counts[0] += len(x_chunk)
+                counts[1] += len(y_chunk)
+        if counts[0] != counts[1]:
+            raise ValueError("Different number of x ({}) and y ({}) values".format(*counts))
+        point_count = counts[0]
+
+        if filename.endswith('.npy'):
+            output = np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(2, point_count))
+        else:
+            output = np.memmap(filename, dtype=dtype, mode='w+', shape=(2, point_count)) \
+                if point_count else None
+        for row, name in enumerate(temporary):
+            if point_count:
+                values = np.memmap(name, dtype=dtype, mode='r')
+                for start in range(0, point_count, CHUNK_ROWS):
+                    output[row, start:start + CHUNK_ROWS] = values[start:start + CHUNK_ROWS]
+                del values
+        if output is not None:
+            output.flush()
+            del output
+        else:
+            open(filename, 'wb').close()
+        return point_count
+    finally:
+        for name in temporary:
+            if os.path.exists(name):
+                os.remove(name)
+
+# Saves points to a binary file (.npy or raw .f32/.f64)
+# @param points: 2xn array
+def save_points(filename, points, dtype=None):
+    points = np.asarray(points)
+    extension = os.path.splitext(filename)[1]
+    if extension in RAW_TYPES:
+        np.ascontiguousarray(points, dtype=RAW_TYPES[extension]).tofile(filename)
+    else:
+        np.save(filename, points if dtype is None else points.astype(dtype))
+
+# Loads points from a binary file (.npy or raw .f32/.f64) or a CSV file
+# @param mmap: map binary files to memory instead of reading them
+# @param dtype: type of the values of a raw file without a known extension
+# @param layout: layout of a CSV file, 'rows', 'columns' or 'auto'
+# @return: 2xn array (numpy.memmap if mmap)
+def load_points(filename, mmap=True, dtype=None, layout='auto'):
+    extension = os.path.splitext(filename)[1]
+    if extension == '.csv':
+        return load_csv(filename, layout)
+    if extension == '.npy':
+        points = np.load(filename, mmap_mode='r' if mmap else None)
+        if points.ndim != 2 or points.shape[0] != 2:
+            raise ValueError("Expected an array of shape (2, n), got {}".format(points.shape))
+        return points
+    dtype = RAW_TYPES.get(extension, dtype)
+    if dtype is None:
+        raise ValueError("Unknown point file type: {}".format(filename))
+    if os.path.getsize(filename) == 0:
+        return np.empty((2, 0), dtype=dtype)
+    if mmap:
+        return np.memmap(filename, dtype=dtype, mode='r').reshape(2, -1)
+    return np.fromfile(filename, dtype=dtype).reshape(2, -1)
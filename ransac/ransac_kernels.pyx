@@ -0,0 +1,64 @@
+# cython: boundscheck=False, wraparound=False, language_level=3
+import numpy as np
+from cython cimport floating
+from libc.math cimport fabs
+
+# Compiled inlier counting for 2D lines, used by ransac.count_inliers when
+# it has been built (python setup.py build_ext --inplace in cython-training).
+#
+# Instead of a distance matrix, the points are processed in tiles that fit
+# in the cache and every line is evaluated against a tile before moving on
+# to the next one. The distances are computed like ransac.dot_rows computes
+# them (nx*x + ny*y in the dtype of the points, the offset subtracted in double
+# precision), so the counts are the same. For the same reason setup.py turns
+# off the contraction of the multiply and add to FMA.
+
+cdef enum:
+    TILE_POINTS = 4096 # points per tile (64 KB of float64 coordinates)
+
+# @param x, y: the rows of the points, which don't need to be next to each other
+cdef void count_tiles(const floating[::1] x, const floating[::1] y, const floating[:, ::1] normals,
+                      const double[::1] offsets, floating threshold,
+                      long long[::1] counts) noexcept nogil:
+    cdef Py_ssize_t point_count = x.shape[0]
+    cdef Py_ssize_t tile, stop, line, i
+    cdef const floating *xs = &x[0]
+    cdef const floating *ys = &y[0]
+    cdef floating nx, ny, distance
+    cdef double offset
+    cdef floating count # exact, a tile has less than 2**24 points (vectorizes, unlike integers)
+    tile = 0
+    while tile < point_count:
+        stop = min(tile + TILE_POINTS, point_count)
+        for line in range(normals.shape[0]):
+            nx = normals[line, 0]
+            ny = normals[line, 1]
+            offset = offsets[line]
+            count = 0
+            for i in range(tile, stop):
+                if floating is float:
+                    distance = <float>(<double>(nx*xs[i] + ny*ys[i]) - offset)
+                else:
+                    distance = nx*xs[i] + ny*ys[i] - offset
+                count += 1 if fabs(distance) < threshold else 0
+            counts[line] += <long long>count
+        tile = stop
+
+# Same arguments and result as ransac.count_inliers, for 2 x n points
+def count_inliers(normals, offsets, pts, distance_threshold):
+    if pts.ndim != 2 or pts.shape[0] != 2:
+        raise ValueError("Expected a 2 x n array of points")
+    if pts.strides[1] != pts.itemsize: # rows may be strided, e.g. points[:, :count]
+        pts = np.ascontiguousarray(pts)
+    normals = np.ascontiguousarray(normals, dtype=pts.dtype).reshape(-1, 2)
+    offsets = np.ascontiguousarray(offsets, dtype=np.float64)
+    counts = np.zeros(len(normals), dtype=np.int64)
+    if pts.shape[1] == 0 or len(normals) == 0:
+        return counts
+    if pts.dtype == np.float32:
+        count_tiles[float](pts[0], pts[1], normals, offsets, distance_threshold, counts)
+    elif pts.dtype == np.float64:
+        count_tiles[double](pts[0], pts[1], normals, offsets, distance_threshold, counts)
+    else:
+        raise TypeError("Points must be float32 or float64, got {}".format(pts.dtype))
+    return counts
@@ -0,0 +1,59 @@
+import numpy as np
+from ransac import required_iterations, as_points
+
+# Generic RANSAC for any model plugin (see models.py), e.g.
+#   result = ransacnd(cloud.T, Plane3D(), distance_threshold=0.01, N=1000, rng=0)
+#   normal, offset = result.params[:3], result.params[3]
+# The hypotheses are evaluated in batches with the model's vectorized and
+# blocked inlier counting, and the run stops when the needed number of
+# iterations for the given confidence has been reached (as ransac2d_adaptive).
+
+# Result of a generic RANSAC run
+class ModelResult:
+    def __init__(self, params, inliers, iterations):
+        self.params = params         # model parameters (None if no model was found)
+        self.inliers = inliers       # indices of the inlier points
+        self.iterations = iterations # hypotheses actually evaluated
+
+#@param points: d x n array of points
+#@param model: model plugin, e.g. Line2D(), Plane3D(), Hyperplane(d) or Circle()
+#@param distance_threshold: point must be within this threshold to be counted as a inlier
+#@param N: maximum number of iterations
+#@param inlier_threshold: amount of inliers needed for the model to be refitted
+#@param confidence: probability of having drawn at least one all-inlier sample
+#       (None: always run N iterations)
+#@param batch_size: hypotheses evaluated between the termination checks
+#@param rng: seed or numpy Generator for the random sampling.
+#@return: ModelResult
+def ransacnd(points, model, distance_threshold, N, inlier_threshold=0, confidence=0.99,
+             batch_size=64, rng=None):
+    pts = as_points(points)
+    if pts.ndim != 2 or N < 1 or pts.shape[1] < model.sample_size or \
+       (model.dimension is not None and pts.shape[0] != model.dimension):
+        raise ValueError("Bad function arguments")
+    rng = np.random.default_rng(rng)
+    point_count = pts.shape[1]
+
+    best_params, best_count = None, 0
+    iterations = 0
+    needed = N
+    while iterations < min(N, needed):
+        count = min(batch_size, N - iterations)
+        samples = rng.integers(0, point_count, size=(count, model.sample_size))
+        params = model.hypotheses(np.moveaxis(pts[:, samples], 0, -1))
+        counts = model.count_inliers(params, pts, distance_threshold)
+        iterations += count
+        best = np.argmax(counts)
+        if counts[best] > best_count:
+            best_params, best_count = params[best], counts[best]
+            if confidence is not None:
+                needed = required_iterations(best_count / point_count, confidence, model.sample_size)
+
+    # Refit the best model to its inliers
+    inliers = np.empty(0, dtype=np.int64)
+    if best_params is not None:
+        inliers = np.flatnonzero(model.residuals(best_params[np.newaxis], pts)[0] < distance_threshold)
+        if len(inliers) > inlier_threshold and len(inliers) >= model.sample_size:
+            best_params = model.refit(pts[:, inliers])
+            inliers = np.flatnonzero(model.residuals(best_params[np.newaxis], pts)[0] < distance_threshold)
+    return ModelResult(best_params, inliers, iterations)
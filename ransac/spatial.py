@@ -0,0 +1,165 @@
+import numpy as np
+from ransac import BLOCK_ELEMENTS, count_inliers, as_points
+
+# Uniform grid of 2D points for counting line inliers without computing the
+# distance of every point.
+#
+# The points are sorted by their grid cell, column by column, so the cells of
+# one column that a line's inlier band (line +/- distance_threshold) crosses
+# hold one contiguous range of the sorted points. Only the points of those
+# ranges are checked. With the default cell size a line crosses about
+# sqrt(n / points_per_cell) columns, so counting costs O(sqrt(n) + points near
+# the line) instead of O(n). The counts are exactly the same as with
+# ransac.count_inliers, so RANSAC finds the same best model: the distances of
+# the candidates are rounded the same way (see ransac.dot_rows) and the bands
+# are widened by the rounding error of the distances.
+#
+# The ranges of many hypotheses are computed at once and their points are
+# gathered into one array, so there's no Python loop per hypothesis. Gathering
+# costs about ten times more per point than the dense matrix product, so lines
+# with more candidates than DENSE_FRACTION of the points are counted densely.
+#
+# The number of candidates is an upper bound of the inlier count. best_line()
+# counts the lines in decreasing order of their candidates and skips the lines
+# that can't beat the best count so far, which skips most of the bad hypotheses.
+
+DENSE_FRACTION = 0.1
+
+class GridIndex:
+    # @param pts: 2xn array of points
+    # @param points_per_cell: average number of points in a cell
+    def __init__(self, pts, points_per_cell=8):
+        self.pts = as_points(pts)
+        x, y = self.pts
+        self.x_min, self.y_min = x.min(), y.min()
+        # Bound of the rounding error of a distance in the points' dtype. The
+        # offset and the threshold add their own share (see band_ranges).
+        self.rounding = 4 * np.finfo(self.pts.dtype).eps * float(np.abs(self.pts).max(initial=0))
+        width = x.max() - self.x_min
+        height = y.max() - self.y_min
+        cells = max(1.0, len(x) / points_per_cell)
+        self.cell_size = max(np.sqrt(width * height / cells), max(width, height) / cells,
+                             np.finfo(float).tiny)
+        self.columns = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+
+        column = np.minimum((x - self.x_min) // self.cell_size, self.columns - 1).astype(np.int64)
+        row = np.minimum((y - self.y_min) // self.cell_size, self.rows - 1).astype(np.int64)
+        cell = column * self.rows + row
+        self.order = np.argsort(cell, kind='stable') # original index of every sorted point
+        self.x = x[self.order]
+        self.y = y[self.order]
+        # points of cell i are self.x[starts[i]:starts[i+1]]
+        self.starts = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cell, minlength=self.columns * self.rows), out=self.starts[1:])
+
+    # Finds the ranges of the sorted points that can be inliers of the lines
+    # @return begin, lengths: K x columns arrays of the ranges
+    def band_ranges(self, normals, offsets, distance_threshold):
+        nx, ny = normals[:, 0:1], normals[:, 1:2]
+        offsets = offsets[:, np.newaxis]
+        # Widened by the rounding error of the distances (see __init__)
+        eps = 4 * np.finfo(self.pts.dtype).eps
+        threshold = distance_threshold * (1 + eps) + self.rounding + eps * np.abs(offsets)
+        x0 = self.x_min + self.cell_size * np.arange(self.columns)
+        x1 = x0 + self.cell_size
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # y of the line at the column edges, widened by the threshold
+            y0 = (offsets - nx * x0) / ny
+            y1 = (offsets - nx * x1) / ny
+            margin = threshold / np.abs(ny)
+            low = np.minimum(y0, y1) - margin
+            high = np.maximum(y0, y1) + margin
+        # Vertical lines cross whole columns, if at all
+        vertical = (ny == 0) & (nx != 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            line_x = offsets / nx
+            crossed = (x1 >= line_x - threshold) & (x0 <= line_x + threshold)
+        low = np.where(vertical, np.where(crossed, -np.inf, np.inf), low)
+        high = np.where(vertical, np.where(crossed, np.inf, -np.inf), high)
+        # Degenerate lines (zero normal, infinite offset) have no inliers
+        invalid = ~np.isfinite(offsets) | ((nx == 0) & (ny == 0))
+        low = np.where(invalid, np.inf, low)
+        high = np.where(invalid, -np.inf, high)
+
+        first_row = np.clip(np.floor((low - self.y_min) / self.cell_size), 0, self.rows).astype(np.int64)
+        end_row = np.clip(np.floor((high - self.y_min) / self.cell_size) + 1, 0, self.rows).astype(np.int64)
+        end_row = np.maximum(end_row, first_row)
+        column_start = np.arange(self.columns) * self.rows
+        begin = self.starts[column_start + first_row]
+        return begin, self.starts[column_start + end_row] - begin
+
+    # Counts the points within 'distance_threshold' from every line
+    # (same arguments and result as ransac.count_inliers without pts)
+    def count_inliers(self, normals, offsets, distance_threshold, block_elements=BLOCK_ELEMENTS):
+        counts = np.empty(len(normals), dtype=np.int64)
+        block_size = max(1, block_elements // self.columns)
+        for start in range(0, len(normals), block_size):
+            stop = min(start + block_size, len(normals))
+            counts[start:stop] = self.count_candidates(normals[start:stop], offsets[start:stop],
+                                                       distance_threshold, block_elements)
+        return counts
+
+    # Finds the line with the most inliers. The result is the same as the
+    # argmax of count_inliers (the first line of equally good ones).
+    # @param chunk_size: lines counted between the checks of the bound
+    # @return: index of the best line and its inlier count
+    def best_line(self, normals, offsets, distance_threshold, chunk_size=64,
+                  block_elements=BLOCK_ELEMENTS):
+        block_size = max(1, block_elements // self.columns)
+        totals = np.concatenate([
+            self.band_ranges(normals[start:start + block_size], offsets[start:start + block_size],
+                             distance_threshold)[1].sum(axis=1)
+            for start in range(0, len(normals), block_size)])
+        order = np.argsort(-totals, kind='stable')
+        best, best_count = 0, -1
+        chunk_size = min(chunk_size, block_size)
+        for start in range(0, len(order), chunk_size):
+            lines = order[start:start + chunk_size]
+            lines = lines[totals[lines] >= best_count]
+            if len(lines) == 0: # the rest have even fewer candidates
+                break
+            counts = self.count_candidates(normals[lines], offsets[lines],
+                                           distance_threshold, block_elements)
+            count = counts.max()
+            line = lines[counts == count].min()
+            if count > best_count or (count == best_count and line < best):
+                best, best_count = line, count
+        return best, best_count
+
+    # Counts the inliers of a block of lines, densely or from the candidates
+    def count_candidates(self, normals, offsets, distance_threshold, block_elements):
+        begin, lengths = self.band_ranges(normals, offsets, distance_threshold)
+        totals = lengths.sum(axis=1)
+        counts = np.zeros(len(normals), dtype=np.int64)
+        dense = totals > DENSE_FRACTION * len(self.x)
+        if dense.any():
+            counts[dense] = count_inliers(normals[dense], offsets[dense], self.pts,
+                                          distance_threshold, block_elements)
+        sparse = np.flatnonzero(~dense & (totals > 0))
+        # Gather the candidates of as many lines at a time as fit in a block
+        first = 0
+        while first < len(sparse):
+            last = first + max(1, np.searchsorted(np.cumsum(totals[sparse[first:]]),
+                                                  block_elements, side='right'))
+            lines = sparse[first:last]
+            counts[lines] = self.count_ranges(normals[lines], offsets[lines], begin[lines],
+                                              lengths[lines], totals[lines], distance_threshold)
+            first = last
+        return counts
+
+    # Counts the inliers of the lines among the candidate points in the given ranges
+    def count_ranges(self, normals, offsets, begin, lengths, totals, distance_threshold):
+        lengths = lengths.ravel()
+        total = lengths.sum()
+        if total == 0:
+            return np.zeros(len(normals), dtype=np.int64)
+        # indices of the concatenated ranges: begin of the range + position in it
+        range_start = np.cumsum(lengths) - lengths
+        indices = np.repeat(begin.ravel() - range_start, lengths) + np.arange(total)
+        line = np.repeat(np.arange(len(normals)), totals)
+        normals = normals.astype(self.x.dtype, copy=False)
+        distances = normals[line, 0] * self.x[indices]
+        distances += normals[line, 1] * self.y[indices]
+        distances -= offsets[line]
+        return np.bincount(line[np.abs(distances) < distance_threshold], minlength=len(normals))
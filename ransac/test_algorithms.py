@@ -0,0 +1,372 @@
+import numpy as np
+import pytest
+from multiline import extract_lines, jlinkage_lines
+from tracker import RansacTracker
+from ransacnd import ransacnd
+from models import Line2D, Plane3D, Hyperplane, Circle
+from spatial import GridIndex
+from fitline import fitline, batched_fitline, line_sums, fitline_from_sums
+import pointio
+from ransac import (line_hypotheses, count_inliers, numpy_count_inliers, ransac2d,
+                    ransac2d_adaptive, required_iterations, prosac_pairs)
+
+# Usage: python -m pytest test_algorithms.py
+
+# Points on the line y = 0.5x + 3 (with a little noise) and uniform outliers
+# @return: 2 x n array of points
+def line_points(point_count, inlier_ratio=0.5, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 100, point_count)
+    y = np.where(rng.random(point_count) < inlier_ratio,
+                 0.5 * x + 3 + rng.normal(0, noise, point_count), rng.uniform(0, 60, point_count))
+    return np.vstack((x, y))
+
+def naive_counts(normals, offsets, pts, distance_threshold):
+    return np.count_nonzero(np.abs(normals @ pts - offsets[:, np.newaxis]) < distance_threshold, axis=1)
+
+# 1001 points and 3000 elements per block: blocks of 2 lines, the last one is partial
+@pytest.mark.parametrize('point_count, block_elements', [(1001, 3000), (1001, 10), (4097, 1 << 22)])
+def test_blocked_counts_match_naive_counts(point_count, block_elements):
+    pts = line_points(point_count)
+    pairs = np.random.default_rng(1).integers(0, point_count, (7, 2))
+    pairs[3] = [5, 5] # degenerate
+    normals, offsets = line_hypotheses(pts, pairs)
+    expected = naive_counts(normals, offsets, pts, 0.05)
+    assert expected[3] == 0
+    assert np.array_equal(numpy_count_inliers(normals, offsets, pts, 0.05, block_elements), expected)
+    assert np.array_equal(count_inliers(normals, offsets, pts, 0.05, block_elements), expected)
+
+def test_ransac2d_finds_the_line():
+    pts = line_points(5000)
+    m, b = ransac2d(pts, 0.05, 200, 100, rng=0)
+    assert m == pytest.approx(0.5, abs=1e-3) and b == pytest.approx(3, abs=0.05)
+
+def test_adaptive_stops_early_on_easy_data():
+    pts = line_points(5000, inlier_ratio=0.8)
+    result = ransac2d_adaptive(pts, 0.05, 10000, 100, confidence=0.99, batch_size=16, rng=0)
+    assert result.iterations < 100
+    assert result.m == pytest.approx(0.5, abs=1e-3) and result.b == pytest.approx(3, abs=0.05)
+    assert len(result.inliers) == result.score == np.count_nonzero(
+        np.abs(result.normal @ pts - result.offset) < 0.05)
+
+def test_required_iterations():
+    assert required_iterations(0.5, 0.99) == pytest.approx(np.log(0.01) / np.log(0.75))
+    assert required_iterations(0.0, 0.99) == np.inf
+    assert required_iterations(1.0, 0.99) == 0
+
+@pytest.mark.parametrize('options', [{'scoring': 'msac'}, {'local_optimization': True},
+                                     {'scoring': 'msac', 'local_optimization': True}])
+def test_msac_and_local_optimization_find_the_line(options):
+    pts = line_points(3000, inlier_ratio=0.3)
+    result = ransac2d_adaptive(pts, 0.05, 2000, 100, rng=1, **options)
+    assert result.m == pytest.approx(0.5, abs=1e-3) and result.b == pytest.approx(3, abs=0.05)
+    plain = ransac2d_adaptive(pts, 0.05, 2000, 100, rng=1)
+    assert len(result.inliers) >= 0.95 * len(plain.inliers)
+
+def test_prosac_samples_the_best_points_first():
+    rng = np.random.default_rng(0)
+    order = rng.permutation(1000)
+    pairs = prosac_pairs(order, 0, 50, rng)
+    best = set(order[:50])
+    assert all(i in best and j in best for i, j in pairs)
+    assert pairs[0, 0] != pairs[0, 1]
+
+def test_prosac_uses_the_quality():
+    pts = line_points(20000, inlier_ratio=0.05, seed=2)
+    quality = -np.abs(pts[1] - (0.5 * pts[0] + 3)) # the inliers are the best points
+    inlier_count = np.count_nonzero(quality > -0.05)
+    guided = ransac2d_adaptive(pts, 0.05, 16, 100, quality=quality, batch_size=16, rng=0)
+    assert guided.score >= 0.95 * inlier_count # one batch is enough
+    assert guided.m == pytest.approx(0.5, abs=1e-3)
+    uniform = ransac2d_adaptive(pts, 0.05, 16, 100, batch_size=16, rng=0)
+    assert uniform.score < 0.5 * inlier_count
+
+# Points on three lines, the line of every point in 'labels'
+def three_lines(point_count, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(0, 100, point_count)
+    labels = rng.integers(0, 3, point_count)
+    y = np.choose(labels, [0.5 * x + 3, -x + 80, 2 * x - 50]) + rng.normal(0, 0.01, point_count)
+    return np.vstack((x, y)), labels
+
+def line_summary(models):
+    return [(model.m, model.b, model.inliers.tolist(), model.iterations) for model in models]
+
+def test_extract_lines_is_the_same_with_workers():
+    pts, labels = three_lines(6000)
+    sequential = extract_lines(pts, 0.05, 100, N=2000, workers=1, rng=3)
+    parallel = extract_lines(pts, 0.05, 100, N=2000, workers=2, rng=3)
+    assert line_summary(parallel) == line_summary(sequential)
+    assert sorted((round(model.m, 2), round(model.b)) for model in sequential) == [(-1, 80), (0.5, 3), (2, -50)]
+    for model in sequential: # only points near the crossings can go to another line
+        assert np.bincount(labels[model.inliers]).max() >= 0.99 * len(model.inliers)
+    assert sum(len(model.inliers) for model in sequential) == pts.shape[1]
+
+def test_jlinkage_finds_all_the_lines():
+    pts, labels = three_lines(600, seed=1)
+    models = jlinkage_lines(pts, 0.05, 20, N=1000, rng=1)
+    assert np.allclose([model.score for model in models], sorted(np.bincount(labels), reverse=True), atol=3)
+    assert sorted((round(model.m, 2), round(model.b)) for model in models) == [(-1, 80), (0.5, 3), (2, -50)]
+
+# @return: 2 x count points near the line y = mx + b
+def feed_batch(rng, m, b, count=200):
+    x = rng.uniform(0, 100, count)
+    return np.vstack((x, m * x + b + rng.normal(0, 0.01, count)))
+
+def test_tracker_rehypothesizes_after_drift():
+    rng = np.random.default_rng(0)
+    tracker = RansacTracker(0.05, capacity=1000, rng=1)
+    assert tracker.update(feed_batch(rng, 0.5, 3)) # the first fit
+    for _ in range(10):
+        assert not tracker.update(feed_batch(rng, 0.5, 3))
+    assert (tracker.m, tracker.b) == pytest.approx((0.5, 3), abs=0.05)
+    assert tracker.inlier_ratio == 1.0 and tracker.size == 1000
+
+    rehypothesized = [tracker.update(feed_batch(rng, -1, 80)) for _ in range(10)]
+    assert rehypothesized.count(True) == 1 # when the new line becomes the majority
+    assert rehypothesized.index(True) == 2
+    assert (tracker.m, tracker.b) == pytest.approx((-1, 80), abs=0.05)
+    assert tracker.inlier_ratio == 1.0
+    metrics = tracker.metrics()
+    assert (metrics['updates'], metrics['rehypotheses'], metrics['points_seen']) == (21, 2, 4200)
+
+def test_tracker_running_count_matches_the_flags():
+    rng = np.random.default_rng(2)
+    tracker = RansacTracker(0.05, capacity=500, mode='reservoir', rng=3)
+    for i in range(30):
+        batch = feed_batch(rng, 0.5, 3, 97)
+        batch[1, ::3] += rng.uniform(1, 10, batch[:, ::3].shape[1]) # outliers
+        tracker.update(batch)
+        pts = tracker.points[:, :tracker.size]
+        assert tracker.inlier_count == np.count_nonzero(tracker.distances(pts) < 0.05)
+    assert tracker.size == 500 and tracker.seen == 30 * 97
+    assert tracker.inlier_ratio == pytest.approx(2 / 3, abs=0.08)
+
+# Points on the hyperplane normal . x = offset (with a little noise) and
+# uniform outliers in the same box
+# @return: d x n array of points
+def hyperplane_points(normal, offset, point_count, inlier_ratio=0.6, seed=0):
+    rng = np.random.default_rng(seed)
+    normal = np.asarray(normal, dtype=float) / np.linalg.norm(normal)
+    pts = rng.uniform(-10, 10, (len(normal), point_count))
+    pts -= np.outer(normal, normal @ pts - offset) # project to the hyperplane
+    pts += np.outer(normal, rng.normal(0, 0.002, point_count))
+    outliers = rng.random(point_count) >= inlier_ratio
+    pts[:, outliers] = rng.uniform(-10, 10, (len(normal), np.count_nonzero(outliers)))
+    return pts, normal
+
+# Normal and offset with the sign of the expected normal
+def oriented(params, normal):
+    sign = np.sign(params[:-1] @ normal)
+    return sign * params[:-1], sign * params[-1]
+
+@pytest.mark.parametrize('model, normal', [(Plane3D(), [1, 2, 2]), (Hyperplane(3), [1, 2, 2]),
+                                           (Hyperplane(4), [1, -1, 2, 0.5]), (Line2D(), [-0.5, 1])])
+def test_ransacnd_recovers_hyperplanes(model, normal):
+    pts, normal = hyperplane_points(normal, 3, 4000)
+    result = ransacnd(pts, model, 0.01, 2000, rng=0)
+    found_normal, found_offset = oriented(result.params, normal)
+    assert np.allclose(found_normal, normal, atol=1e-3) and found_offset == pytest.approx(3, abs=1e-3)
+    assert result.iterations < 2000 # stopped at the confidence
+    expected = np.count_nonzero(np.abs(normal @ pts - 3) < 0.01)
+    assert len(result.inliers) == pytest.approx(expected, rel=0.01)
+
+def test_ransacnd_recovers_a_circle():
+    rng = np.random.default_rng(0)
+    angles = rng.uniform(0, 2 * np.pi, 3000)
+    pts = np.vstack((4 + 7 * np.cos(angles), -2 + 7 * np.sin(angles))) + rng.normal(0, 0.002, (2, 3000))
+    pts[:, ::2] = rng.uniform(-10, 15, (2, 1500))
+    result = ransacnd(pts, Circle(), 0.01, 5000, rng=1)
+    assert result.params == pytest.approx([4, -2, 7], abs=1e-3)
+    assert len(result.inliers) >= 1500
+
+def test_model_inlier_counts_match_the_residuals():
+    pts, _ = hyperplane_points([1, 2, 2], 3, 1001)
+    rng = np.random.default_rng(1)
+    samples = np.moveaxis(pts[:, rng.integers(0, 1001, (9, 3))], 0, -1)
+    samples[4, 1] = samples[4, 0] # degenerate
+    for model in (Plane3D(), Hyperplane(3)):
+        params = model.hypotheses(samples)
+        assert np.isnan(params[4]).all()
+        expected = np.count_nonzero(model.residuals(params, pts) < 0.05, axis=1)
+        assert np.array_equal(model.count_inliers(params, pts, 0.05, block_elements=2500), expected)
+    circle_params = Circle().hypotheses(samples[:, :, :2])
+    expected = np.count_nonzero(Circle().residuals(circle_params, pts[:2]) < 0.05, axis=1)
+    assert np.array_equal(Circle().count_inliers(circle_params, pts[:2], 0.05, block_elements=2500), expected)
+
+@pytest.mark.parametrize('points_per_cell', [1, 8, 100])
+def test_grid_index_counts_match_dense_counts(points_per_cell):
+    pts = line_points(20000, inlier_ratio=0.3, seed=4)
+    rng = np.random.default_rng(5)
+    normals, offsets = line_hypotheses(pts, rng.integers(0, pts.shape[1], (500, 2)))
+    # vertical, horizontal, degenerate and outside the points
+    normals[:4] = [[1, 0], [0, 1], [0, 0], [0, 1]]
+    offsets[:4] = [50, 30, np.inf, 1000]
+    index = GridIndex(pts, points_per_cell)
+    for distance_threshold in (0.05, 1.0, 20.0):
+        dense = count_inliers(normals, offsets, pts, distance_threshold)
+        assert np.array_equal(index.count_inliers(normals, offsets, distance_threshold,
+                                                  block_elements=5000), dense)
+        best, best_count = index.best_line(normals, offsets, distance_threshold, chunk_size=16)
+        assert (best, best_count) == (np.argmax(dense), dense.max())
+
+# float32 points right at the threshold distance (and far from the origin, so
+# the rounding is coarse): the grid must round like the dense counting
+def test_grid_index_float32_counts_at_the_threshold():
+    rng = np.random.default_rng(9)
+    normals, offsets = line_hypotheses(line_points(1000, seed=9) + 1000, rng.integers(0, 1000, (40, 2)))
+    normals, offsets = normals[np.isfinite(offsets)], offsets[np.isfinite(offsets)]
+    t = rng.uniform(-100, 100, (len(normals), 500))
+    side = np.where(rng.random(t.shape) < 0.5, -0.05, 0.05)
+    pts = np.hstack([(offset + d) * normal[:, np.newaxis] + s * np.array([[-normal[1]], [normal[0]]])
+                     for normal, offset, d, s in zip(normals, offsets, side, t)]).astype(np.float32)
+    index = GridIndex(pts)
+    for distance_threshold in (0.05, np.float32(0.05), 0.0500001):
+        dense = numpy_count_inliers(normals, offsets, pts, distance_threshold)
+        assert np.array_equal(count_inliers(normals, offsets, pts, distance_threshold), dense)
+        assert np.array_equal(index.count_inliers(normals, offsets, distance_threshold), dense)
+        assert index.best_line(normals, offsets, distance_threshold) == (np.argmax(dense), dense.max())
+
+def test_grid_index_best_line_takes_the_first_of_equal_lines():
+    pts = line_points(1000, seed=6)
+    normals, offsets = line_hypotheses(pts, np.array([[0, 0], [1, 2], [3, 4], [1, 2], [2, 1]]))
+    dense = count_inliers(normals, offsets, pts, 0.05)
+    assert GridIndex(pts).best_line(normals, offsets, 0.05, chunk_size=1) == (np.argmax(dense), dense.max())
+
+def test_ransac2d_with_spatial_index():
+    pts = line_points(50000, inlier_ratio=0.2, seed=7)
+    assert ransac2d(pts, 0.05, 300, 100, rng=8, spatial_index=True) == ransac2d(pts, 0.05, 300, 100, rng=8)
+
+def write_columns(path, pts, header=True):
+    with open(path, 'w') as output:
+        if header:
+            output.write('x,y\n')
+        output.writelines('{!r},{!r}\n'.format(float(x), float(y)) for x, y in pts.T)
+    return str(path)
+
+def write_rows(path, pts):
+    with open(path, 'w') as output:
+        for row in pts:
+            output.write(','.join(repr(float(value)) for value in row) + '\n')
+    return str(path)
+
+@pytest.mark.parametrize('header', [True, False])
+def test_pointio_columns_round_trip_across_chunks(tmp_path, monkeypatch, header):
+    monkeypatch.setattr(pointio, 'CHUNK_ROWS', 7)
+    pts = np.random.default_rng(0).uniform(-100, 100, (2, 50)) # 7 full chunks and a partial one
+    filename = write_columns(tmp_path / 'columns.csv', pts, header)
+    assert pointio.detect_layout(filename) == 'columns'
+    assert np.array_equal(pointio.load_csv(filename), pts)
+    for name, dtype in (('points.npy', np.float64), ('points.f64', np.float64), ('points.f32', np.float32)):
+        binary = str(tmp_path / name)
+        assert pointio.csv_to_binary(filename, binary) == 50
+        assert np.array_equal(pointio.load_points(binary), pts.astype(dtype))
+        assert np.array_equal(pointio.load_points(binary, mmap=False), pts.astype(dtype))
+
+def test_pointio_rows_round_trip_across_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(pointio, 'BLOCK_SIZE', 16) # the numbers are split between the blocks
+    pts = np.random.default_rng(1).uniform(-100, 100, (2, 100))
+    filename = write_rows(tmp_path / 'rows.csv', pts)
+    assert pointio.detect_layout(filename) == 'rows'
+    assert np.array_equal(pointio.load_csv(filename), pts)
+    assert pointio.csv_to_binary(filename, str(tmp_path / 'points.npy')) == 100
+    assert np.array_equal(pointio.load_points(str(tmp_path / 'points.npy')), pts)
+
+def test_pointio_two_values_per_line_is_columns(tmp_path):
+    pts = np.random.default_rng(2).uniform(-100, 100, (2, 3))
+    filename = write_columns(tmp_path / 'three.csv', pts, header=False)
+    assert np.array_equal(pointio.load_points(filename), pts)
+    assert np.array_equal(pointio.load_csv(write_columns(tmp_path / 'one.csv', pts[:, :1], False)), pts[:, :1])
+
+    two_points = write_columns(tmp_path / 'two.csv', pts[:, :2], header=False)
+    with pytest.raises(ValueError, match='layout'):
+        pointio.load_csv(two_points)
+    assert np.array_equal(pointio.load_csv(two_points, layout='columns'), pts[:, :2])
+    assert np.array_equal(pointio.load_points(two_points, layout='rows'), pts[:, :2].T)
+    assert np.array_equal(pointio.load_csv(write_columns(tmp_path / 'header.csv', pts[:, :2])), pts[:, :2])
+
+def test_pointio_save_and_load_points(tmp_path):
+    pts = np.random.default_rng(3).uniform(-100, 100, (2, 1000)).astype(np.float32)
+    for name in ('points.npy', 'points.f32', 'points.f64'):
+        filename = str(tmp_path / name)
+        pointio.save_points(filename, pts)
+        loaded = pointio.load_points(filename)
+        assert loaded.shape == (2, 1000) and np.array_equal(loaded, pts)
+    assert isinstance(pointio.load_points(str(tmp_path / 'points.f32')), np.memmap)
+    pointio.save_points(str(tmp_path / 'empty.f32'), np.empty((2, 0)))
+    assert pointio.load_points(str(tmp_path / 'empty.f32')).shape == (2, 0)
+
+# Reference total least squares line: the normal is the eigenvector of the
+# smallest eigenvalue of the (weighted) covariance matrix
+# @return: unit normal and offset, normal @ point = offset on the line
+def tls_line(points, weights=None):
+    mean = np.average(points, axis=0, weights=weights)
+    covariance = np.cov(points.T, aweights=weights, bias=True)
+    normal = np.linalg.eigh(covariance)[1][:, 0]
+    return normal, normal @ mean
+
+# Checks that (theta, p) is the line 'normal @ point = offset' (the sign is free)
+def assert_same_line(theta, p, normal, offset, abs_tol=1e-9):
+    fitted = np.array([-np.sin(theta), np.cos(theta)])
+    sign = np.sign(fitted @ normal)
+    assert fitted == pytest.approx(sign * normal, abs=1e-9)
+    assert p == pytest.approx(sign * offset, abs=abs_tol)
+
+def noisy_line(point_count, direction, point, noise=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    t = rng.uniform(-50, 50, point_count)
+    normal = np.array([-direction[1], direction[0]])
+    return np.asarray(point) + np.outer(t, direction) + np.outer(rng.normal(0, noise, point_count), normal)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_fitline_matches_eigen_solution(seed):
+    angle = np.random.default_rng(seed).uniform(-np.pi, np.pi)
+    points = noisy_line(200, (np.cos(angle), np.sin(angle)), (30, -20), seed=seed)
+    assert_same_line(*fitline(points), *tls_line(points))
+
+@pytest.mark.parametrize('direction', [(0, 1), (1, 0)])
+def test_fitline_vertical_and_horizontal(direction):
+    points = noisy_line(50, direction, (5, 3), noise=0)
+    assert_same_line(*fitline(points), *tls_line(points))
+    theta, p = fitline(points)
+    assert np.allclose(-points[:, 0] * np.sin(theta) + points[:, 1] * np.cos(theta), p)
+
+def test_weighted_fitline_matches_repeated_points():
+    points = noisy_line(30, (0.6, 0.8), (1, 2), noise=1.0)
+    weights = np.random.default_rng(1).integers(1, 5, len(points))
+    repeated = np.repeat(points, weights, axis=0)
+    theta, p = fitline(points, weights)
+    assert_same_line(theta, p, *tls_line(repeated))
+    assert_same_line(theta, p, *tls_line(points, weights))
+
+def test_batched_fitline_matches_fitline():
+    rng = np.random.default_rng(2)
+    points = noisy_line(300, (0.8, -0.6), (10, 10), noise=2.0)
+    masks = rng.random((6, len(points))) < 0.3
+    weights = rng.uniform(0, 2, (3, len(points)))
+    thetas, ps = batched_fitline(points, np.vstack((masks, weights)))
+    for theta, p, mask in zip(thetas[:6], ps[:6], masks):
+        assert_same_line(theta, p, *tls_line(points[mask]))
+    for theta, p, weight in zip(thetas[6:], ps[6:], weights):
+        assert_same_line(theta, p, *tls_line(points, weight))
+
+def test_batched_fitline_empty_and_single_point_subsets():
+    points = noisy_line(20, (1, 0), (0, 0))
+    subsets = np.zeros((2, len(points)), dtype=bool)
+    subsets[1, 7] = True
+    thetas, ps = batched_fitline(points, subsets)
+    assert np.isnan(thetas[0]) and np.isnan(ps[0])
+    # Any line through the single point fits it
+    x, y = points[7]
+    assert -x * np.sin(thetas[1]) + y * np.cos(thetas[1]) == pytest.approx(ps[1])
+    theta, p = fitline(points[7:8])
+    assert -x * np.sin(theta) + y * np.cos(theta) == pytest.approx(p)
+
+def test_fitline_from_merged_chunk_sums():
+    # Far from the origin, so the sums need an origin near the data
+    points = noisy_line(1000, (0.28, 0.96), (1e5, -2e5), noise=0.5)
+    origin = points[0]
+    sums = line_sums(points[:400], origin=origin) + line_sums(points[400:], origin=origin)
+    theta, p = fitline_from_sums(sums, origin)
+    assert_same_line(float(theta), float(p), *tls_line(points), abs_tol=1e-6)
+    assert np.allclose(sums, line_sums(points, origin=origin))
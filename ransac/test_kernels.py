@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import ransac
+from ransac import line_hypotheses, numpy_count_inliers, ransac2d
+
+# The compiled inlier counting (ransac_kernels.pyx) must give exactly the
+# same counts as the numpy version. Skipped if the kernel hasn't been built.
+# Usage: python -m pytest test_kernels.py
+
+ransac_kernels = pytest.importorskip('ransac_kernels')
+
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+@pytest.mark.parametrize('point_count', [1, 2, 4095, 4097, 100000])
+def test_counts_match_numpy(dtype, point_count):
+    rng = np.random.default_rng(point_count)
+    x = rng.uniform(0, 100, point_count)
+    y = np.where(rng.random(point_count) < 0.5, 0.5 * x + 3, rng.uniform(0, 60, point_count))
+    pts = np.vstack((x, y)).astype(dtype)
+    normals, offsets = line_hypotheses(pts, rng.integers(0, point_count, (300, 2)))
+    for distance_threshold in (1e-5, 0.05, 2.0):
+        assert np.array_equal(ransac_kernels.count_inliers(normals, offsets, pts, distance_threshold),
+                              numpy_count_inliers(normals, offsets, pts, distance_threshold))
+
+def test_non_contiguous_points_and_no_lines():
+    pts = np.random.default_rng(0).uniform(0, 10, (4, 1000))[::2]
+    normals, offsets = line_hypotheses(pts, np.array([[0, 1], [2, 2], [3, 4]])) # [2, 2] is invalid
+    assert np.array_equal(ransac_kernels.count_inliers(normals, offsets, pts, 0.1),
+                          numpy_count_inliers(normals, offsets, pts, 0.1))
+    assert len(ransac_kernels.count_inliers(normals[:0], offsets[:0], pts, 0.1)) == 0
+
+# Points right at the threshold distance, where fused and unfused
+# multiply-adds would round to different sides of it
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_counts_match_numpy_at_the_threshold(dtype):
+    rng = np.random.default_rng(3)
+    normals, offsets = line_hypotheses(rng.uniform(0, 100, (2, 1000)), rng.integers(0, 1000, (50, 2)))
+    t = rng.uniform(-100, 100, 20000)
+    side = np.where(rng.random(len(t)) < 0.5, -0.05, 0.05)
+    for normal, offset in zip(normals, offsets):
+        # Points at distance 0.05 from the line
+        pts = ((offset + side) * normal[:, np.newaxis] +
+               t * np.array([-normal[1], normal[0]])[:, np.newaxis]).astype(dtype)
+        assert np.array_equal(ransac_kernels.count_inliers(normals, offsets, pts, 0.05),
+                              numpy_count_inliers(normals, offsets, pts, 0.05))
+
+def test_row_strided_points():
+    big = np.random.default_rng(4).uniform(0, 10, (2, 5000))
+    pts = big[:, :3001] # e.g. the first points of a pool
+    normals, offsets = line_hypotheses(pts, np.array([[0, 1], [2, 3]]))
+    assert np.array_equal(ransac_kernels.count_inliers(normals, offsets, pts, 0.1),
+                          numpy_count_inliers(normals, offsets, np.ascontiguousarray(pts), 0.1))
+
+def test_ransac2d_is_the_same_without_the_kernel(monkeypatch):
+    rng = np.random.default_rng(1)
+    x = rng.uniform(0, 100, 20000)
+    pts = np.vstack((x, 0.5 * x + 3 + rng.normal(0, 0.01, len(x))))
+    compiled = ransac2d(pts, 0.05, 500, 10, rng=2)
+    monkeypatch.setattr(ransac, 'ransac_kernels', None)
+    assert ransac2d(pts, 0.05, 500, 10, rng=2) == compiled
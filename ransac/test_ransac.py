@@ -1,17 +1,11 @@
 from ransac import ransac2d
+from pointio import load_csv
 import matplotlib.pyplot as plt
 import numpy as np
-import csv
 
 # Loads example xy-point data from the csv-file
 def load_data():
-    points = []
-    with open('points.csv') as csv_file:
-        input_data = csv.reader(csv_file, delimiter=',', quotechar='"')
-        x = next(input_data)
-        y = next(input_data)
-    points = np.array([x, y], np.float)
-    return points
+    return load_csv('points.csv')
 
 if __name__ == "__main__":
     points = load_data()
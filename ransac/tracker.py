@@ -0,0 +1,157 @@
+import time
+import numpy as np
+from collections import deque
+from ransac import ransac2d_adaptive, slope_intercept
+
+# Incremental line tracking for continuous point feeds.
+#
+# The tracker keeps a bounded sample of the latest points: either a sliding
+# window of the newest 'capacity' points or a uniform reservoir sample of all
+# the points seen so far. Every stored point has an inlier flag for the current
+# line and the tracker keeps a running inlier count, so an update only checks
+# the new points and subtracts the flags of the points they replace: O(batch).
+# RANSAC is run again on the stored points only when the inlier ratio drops
+# below 'min_inlier_ratio' (e.g. the line moved, or a different line appeared).
+# If even the new line has a low ratio (e.g. a reservoir holding two lines),
+# the next re-hypothesis waits until the ratio drops by 'ratio_tolerance' more.
+#
+# Example:
+#   tracker = RansacTracker(distance_threshold=0.1, capacity=5000, rng=0)
+#   for batch in feed:          # 2xk arrays of (x,y) points
+#       tracker.update(batch)
+#       print(tracker.m, tracker.b, tracker.inlier_ratio)
+
+class RansacTracker:
+    # @param distance_threshold: point must be within this threshold to be counted as a inlier
+    # @param capacity: number of points kept
+    # @param mode: 'window' (newest points) or 'reservoir' (uniform sample of all points)
+    # @param min_inlier_ratio: re-hypothesize when the inlier ratio falls below this
+    # @param ratio_tolerance: ...and below the ratio after the last fit minus this
+    # @param min_points: no line is fitted before this many points have been seen
+    # @param N, confidence: RANSAC iteration limit and confidence (see ransac2d_adaptive)
+    # @param history: number of update latencies kept for the metrics
+    # @param rng: seed or numpy Generator (reservoir sampling and RANSAC)
+    def __init__(self, distance_threshold, capacity=10000, mode='window', min_inlier_ratio=0.5,
+                 ratio_tolerance=0.05, min_points=10, N=1000, confidence=0.99, history=1000, rng=None):
+        if capacity < 2 or mode not in ('window', 'reservoir'):
+            raise ValueError("Bad function arguments")
+        self.distance_threshold = distance_threshold
+        self.capacity = capacity
+        self.mode = mode
+        self.min_inlier_ratio = min_inlier_ratio
+        self.ratio_tolerance = ratio_tolerance
+        self.min_points = max(2, min_points)
+        self.N = N
+        self.confidence = confidence
+        self.rng = np.random.default_rng(rng)
+
+        self.points = np.empty((2, capacity))
+        self.inlier_flags = np.zeros(capacity, dtype=bool)
+        self.size = 0          # stored points
+        self.next_slot = 0     # oldest slot of the window
+        self.seen = 0          # points seen in total
+        self.inlier_count = 0  # inliers among the stored points
+        self.normal = None     # current line: normal . (x,y) = offset
+        self.offset = None
+        self.fitted_ratio = 1.0 # inlier ratio right after the last re-hypothesis
+
+        self.updates = 0
+        self.rehypotheses = 0
+        self.latencies = deque(maxlen=history)
+
+    # Adds a batch of points and updates the line
+    # @param batch: 2xk array of points (x,y)
+    # @return: True if the line was re-hypothesized
+    def update(self, batch):
+        start = time.perf_counter()
+        batch = np.asarray(batch, dtype=float).reshape(2, -1)
+        if self.mode == 'window':
+            slots, batch = self.window_slots(batch)
+        else:
+            slots, batch = self.reservoir_slots(batch)
+
+        self.inlier_count -= np.count_nonzero(self.inlier_flags[slots])
+        self.points[:, slots] = batch
+        self.inlier_flags[slots] = self.distances(batch) < self.distance_threshold
+        self.inlier_count += np.count_nonzero(self.inlier_flags[slots])
+
+        rehypothesized = False
+        if self.size >= self.min_points and (self.normal is None or self.needs_rehypothesis()):
+            self.rehypothesize()
+            rehypothesized = True
+        self.updates += 1
+        self.latencies.append(time.perf_counter() - start)
+        return rehypothesized
+
+    # Slots of the sliding window, the new points overwrite the oldest ones
+    # @return: slots, and the points that are stored in them
+    def window_slots(self, batch):
+        self.seen += batch.shape[1]
+        batch = batch[:, -self.capacity:] # older points would be overwritten by the batch itself
+        slots = (self.next_slot + np.arange(batch.shape[1])) % self.capacity
+        self.next_slot = (self.next_slot + batch.shape[1]) % self.capacity
+        self.size = min(self.capacity, self.size + batch.shape[1])
+        return slots, batch
+
+    # Reservoir sampling (algorithm R): the t:th point (0-based) replaces a random
+    # slot with probability capacity/(t+1), so every point seen so far is stored
+    # with the same probability.
+    # @return: slots, and the points that are stored in them
+    def reservoir_slots(self, batch):
+        t = self.seen + np.arange(batch.shape[1])
+        self.seen += batch.shape[1]
+        targets = np.where(t < self.capacity, t, np.floor(self.rng.random(len(t)) * (t + 1)).astype(np.int64))
+        selected = targets < self.capacity
+        targets, batch = targets[selected], batch[:, selected]
+        # a slot replaced twice in the same batch keeps the later point
+        _, last = np.unique(targets[::-1], return_index=True)
+        last = len(targets) - 1 - last
+        self.size = min(self.capacity, self.seen)
+        return targets[last], batch[:, last]
+
+    # @return: distances of the points to the current line (inf if there's no line)
+    def distances(self, pts):
+        if self.normal is None:
+            return np.full(pts.shape[1], np.inf)
+        return np.abs(self.normal @ pts - self.offset)
+
+    def needs_rehypothesis(self):
+        ratio = self.inlier_ratio
+        return ratio < self.min_inlier_ratio and ratio < self.fitted_ratio - self.ratio_tolerance
+
+    # Runs RANSAC on the stored points and recomputes the inlier flags
+    def rehypothesize(self):
+        pts = self.points[:, :self.size]
+        result = ransac2d_adaptive(pts, self.distance_threshold, self.N, 0, self.confidence,
+                                   local_optimization=True, rng=self.rng)
+        self.rehypotheses += 1
+        if result.normal is not None:
+            self.normal, self.offset = result.normal, result.offset
+        self.inlier_flags[:self.size] = self.distances(pts) < self.distance_threshold
+        self.inlier_count = np.count_nonzero(self.inlier_flags[:self.size])
+        self.fitted_ratio = self.inlier_ratio
+
+    @property
+    def inlier_ratio(self):
+        return self.inlier_count / self.size if self.size else 0.0
+
+    # Current line in slope-intercept form (y = mx+b), None before the first fit
+    @property
+    def m(self):
+        return None if self.normal is None else slope_intercept(self.normal, self.offset)[0]
+
+    @property
+    def b(self):
+        return None if self.normal is None else slope_intercept(self.normal, self.offset)[1]
+
+    # @return: dict of the update counts and latencies (milliseconds) of the recent updates
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1e3
+        metrics = {'updates': self.updates, 'rehypotheses': self.rehypotheses,
+                   'points_seen': self.seen, 'points_stored': self.size,
+                   'inlier_ratio': self.inlier_ratio}
+        if len(latencies):
+            metrics.update(last_ms=latencies[-1], mean_ms=latencies.mean(),
+                           p50_ms=np.percentile(latencies, 50), p99_ms=np.percentile(latencies, 99),
+                           max_ms=latencies.max())
+        return metrics
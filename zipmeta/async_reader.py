@@ -0,0 +1,53 @@
+import asyncio
+from sources import PrefetchedSource, MissingRange
+from zipmeta import ZipInfo, TAIL_SIZE
+
+# asyncio API for reading the metadata of remote archives (see sources.py).
+#
+# The tail of the archive is fetched first with one request. ZipInfo then
+# parses the fetched bytes and asks for the central directory, which is
+# fetched with a second request (only the part that wasn't already in the
+# tail). Small archives are usually done with the first request. Nothing
+# else of the archive is ever fetched.
+#
+# Example:
+#   sources = [HttpRangeSource(url) for url in urls]
+#   for source, result in zip(sources, asyncio.run(read_zip_infos(sources))):
+#       ...
+
+# Reads the metadata of one archive
+# @param source: async byte source, e.g. HttpRangeSource or AsyncSourceAdapter
+# @param max_requests: give up if the archive needs more requests than this
+# @return: ZipInfo, whose source holds the fetched byte ranges
+async def read_zip_info(source, extra_fields=False, max_requests=8):
+    size, tail = await source.read_tail(TAIL_SIZE)
+    if len(tail) < min(size, TAIL_SIZE):
+        raise ValueError("{} is truncated".format(source.name))
+    prefetched = PrefetchedSource(source.name, size)
+    prefetched.add(size - len(tail), tail)
+    for _ in range(max_requests):
+        try:
+            return ZipInfo(prefetched, extra_fields=extra_fields)
+        except MissingRange as missing:
+            data = await source.read(missing.offset, missing.length)
+            # Asking again would give the same short answer
+            if len(data) < missing.length:
+                raise ValueError("{} is truncated".format(source.name))
+            prefetched.add(missing.offset, data)
+    raise ValueError("Too many range requests needed for {}".format(source.name))
+
+# Reads the metadata of many archives concurrently
+# @param concurrency: maximum number of archives read at the same time
+# @return: list of ZipInfos in the order of the sources. If reading
+#          an archive fails, the exception is in its place instead.
+async def read_zip_infos(sources, extra_fields=False, concurrency=32):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read(source):
+        async with semaphore:
+            try:
+                return await read_zip_info(source, extra_fields)
+            except Exception as error:
+                return error
+
+    return await asyncio.gather(*(read(source) for source in sources))
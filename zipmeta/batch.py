@@ -0,0 +1,262 @@
+import argparse
+import csv
+import fnmatch
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from zipmeta import ZipInfo
+
+# Batch metadata extraction for whole directory trees of zip files.
+# Archives are parsed in a process pool and the central directory entries
+# are streamed to the output as soon as each archive is done. A broken
+# archive doesn't stop the scan, it just produces a row with an error.
+#
+# Usage: python zipmeta.py scan DIR [--workers N] [--format jsonl|csv|parquet] [-o FILE]
+#        python zipmeta.py index DATABASE DIR    (see index.py)
+#        python zipmeta.py find DATABASE NAME [--glob]
+#        python zipmeta.py sizes DATABASE
+
+# Columns of the output rows. Every central directory entry becomes one row.
+FIELDS = ('archive', 'file_name', 'compression_method', 'compressed_size',
+          'uncompressed_size', 'crc', 'last_modification_date',
+          'last_modification_time', 'local_header_offset', 'error')
+
+# Walks the directory tree and yields the archives in it
+# @param root: directory to scan (or a single file)
+# @param pattern: file name pattern of the archives
+def find_archives(root, pattern='*.zip'):
+    if os.path.isfile(root):
+        yield root
+        return
+    for directory, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            if fnmatch.fnmatch(filename, pattern):
+                yield os.path.join(directory, filename)
+
+# Collects the central directory of one archive. Runs in the worker processes,
+# so any error is caught and returned instead of breaking the whole scan.
+# @return: (archive size in bytes, list of rows)
+def extract_metadata(filename):
+    try:
+        size = os.path.getsize(filename)
+        zip_metadata = ZipInfo(filename)
+        if (zip_metadata.end_of_central_directory is None
+                and not zip_metadata.central_directory_headers):
+            raise ValueError("no zip records found")
+        rows = []
+        for central in zip_metadata.central_directory_headers:
+            rows.append({
+                'archive': filename,
+                'file_name': central.file_name,
+                'compression_method': central.compression_method,
+                'compressed_size': central.compressed_size,
+                'uncompressed_size': central.uncompressed_size,
+                'crc': central.crc,
+                'last_modification_date': central.last_modification_date,
+                'last_modification_time': central.last_modification_time,
+                'local_header_offset': central.local_header_offset,
+                'error': None})
+        return size, rows
+    except Exception as error:
+        row = dict.fromkeys(FIELDS)
+        row['archive'] = filename
+        row['error'] = '{}: {}'.format(type(error).__name__, error)
+        return 0, [row]
+
+class JsonLinesWriter:
+    def __init__(self, output):
+        self.output = output
+
+    def write(self, rows):
+        for row in rows:
+            self.output.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def close(self):
+        self.output.flush()
+
+class CsvWriter:
+    def __init__(self, output):
+        self.output = output
+        self.writer = csv.DictWriter(output, fieldnames=FIELDS)
+        self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.output.flush()
+
+# Parquet needs pyarrow, which is imported only when this format is used.
+# Rows are buffered and written as row groups of 'batch_size' rows.
+class ParquetWriter:
+    def __init__(self, filename, batch_size=65536):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pyarrow = pyarrow
+        self.schema = pyarrow.schema([
+            ('archive', pyarrow.string()), ('file_name', pyarrow.string()),
+            ('compression_method', pyarrow.string()), ('compressed_size', pyarrow.uint64()),
+            ('uncompressed_size', pyarrow.uint64()), ('crc', pyarrow.uint32()),
+            ('last_modification_date', pyarrow.string()),
+            ('last_modification_time', pyarrow.string()),
+            ('local_header_offset', pyarrow.uint64()), ('error', pyarrow.string())])
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            table = self.pyarrow.Table.from_pylist(self.rows, schema=self.schema)
+            self.writer.write_table(table)
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+# Counters for the progress report
+class ScanStatistics:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.archives = 0
+        self.entries = 0
+        self.errors = 0
+        self.bytes = 0
+
+    def update(self, size, rows):
+        self.archives += 1
+        self.bytes += size
+        if rows and rows[0]['error'] is not None:
+            self.errors += 1
+        else:
+            self.entries += len(rows)
+
+    def __str__(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return("{} archives ({:.1f}/s), {} entries ({:.0f}/s), {:.1f} MB of archives, "
+               "{} errors, {:.1f} s".format(self.archives, self.archives / elapsed,
+                                            self.entries, self.entries / elapsed,
+                                            self.bytes / 1e6, self.errors, elapsed))
+
+# Yields (size, rows) pairs in completion order. At most 'max_pending' archives
+# are queued to the pool at a time, so huge trees don't fill the memory.
+def extract_all(filenames, workers):
+    if workers <= 1:
+        for filename in filenames:
+            yield extract_metadata(filename)
+        return
+    max_pending = workers * 4
+    with ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        for filename in filenames:
+            pending.add(pool.submit(extract_metadata, filename))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
+
+# Scans all the archives under 'root' and writes their entries with 'writer'
+# @param progress: file for the progress reports (None: no reports)
+# @param interval: seconds between the progress reports
+# @return: ScanStatistics
+def scan(root, writer, workers=os.cpu_count(), pattern='*.zip', progress=None, interval=5.0):
+    statistics = ScanStatistics()
+    last_report = statistics.start
+    for size, rows in extract_all(find_archives(root, pattern), workers):
+        writer.write(rows)
+        statistics.update(size, rows)
+        if progress is not None and time.perf_counter() - last_report >= interval:
+            last_report = time.perf_counter()
+            print(statistics, file=progress)
+    writer.close()
+    return statistics
+
+def run_scan(parser, args):
+    if args.format == 'parquet':
+        if args.output is None:
+            parser.error("parquet output needs --output")
+        try:
+            writer = ParquetWriter(args.output)
+        except RuntimeError as error:
+            parser.error(str(error))
+        output = None
+    else:
+        output = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+        writer = JsonLinesWriter(output) if args.format == 'jsonl' else CsvWriter(output)
+
+    progress = None if args.quiet else sys.stderr
+    try:
+        statistics = scan(args.root, writer, args.workers, args.pattern, progress)
+    finally:
+        if output is not None and output is not sys.stdout:
+            output.close()
+    if progress is not None:
+        print("done: {}".format(statistics), file=progress)
+
+def run_index(parser, args):
+    from index import MetadataIndex
+    with MetadataIndex(args.database) as metadata_index:
+        statistics = metadata_index.refresh(args.root, args.pattern)
+        for path, error in metadata_index.errors():
+            print("{}: {}".format(path, error), file=sys.stderr)
+    print(', '.join('{} {}'.format(count, outcome) for outcome, count in sorted(statistics.items())))
+
+def run_find(parser, args):
+    from index import MetadataIndex
+    with MetadataIndex(args.database) as metadata_index:
+        for path, file_name, uncompressed_size, _ in metadata_index.find(args.name, args.glob):
+            print("{}\t{}\t{}".format(path, file_name, uncompressed_size))
+
+def run_sizes(parser, args):
+    from index import MetadataIndex
+    with MetadataIndex(args.database) as metadata_index:
+        print("{:<20} {:>10} {:>16} {:>16}".format('method', 'entries', 'compressed', 'uncompressed'))
+        for name, (count, compressed, uncompressed) in metadata_index.size_by_compression().items():
+            print("{:<20} {:>10} {:>16} {:>16}".format(name, count, compressed, uncompressed))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='zipmeta', description="Collect zip file metadata")
+    commands = parser.add_subparsers(dest='command', required=True)
+    scan_parser = commands.add_parser('scan', help="scan a directory tree of archives")
+    scan_parser.add_argument('root', help="directory (or archive) to scan")
+    scan_parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                             help="worker processes (default: CPU count)")
+    scan_parser.add_argument('--format', choices=('jsonl', 'csv', 'parquet'), default='jsonl')
+    scan_parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    scan_parser.add_argument('--pattern', default='*.zip', help="archive file name pattern")
+    scan_parser.add_argument('--quiet', action='store_true', help="no progress reports")
+    scan_parser.set_defaults(run=run_scan)
+
+    index_parser = commands.add_parser('index', help="create or refresh a metadata index")
+    index_parser.add_argument('database', help="SQLite index file")
+    index_parser.add_argument('root', help="directory (or archive) to index")
+    index_parser.add_argument('--pattern', default='*.zip', help="archive file name pattern")
+    index_parser.set_defaults(run=run_index)
+
+    find_parser = commands.add_parser('find', help="find entries by name from an index")
+    find_parser.add_argument('database', help="SQLite index file")
+    find_parser.add_argument('name', help="file name inside the archives")
+    find_parser.add_argument('--glob', action='store_true', help="name is a glob pattern")
+    find_parser.set_defaults(run=run_find)
+
+    sizes_parser = commands.add_parser('sizes', help="total sizes by compression method")
+    sizes_parser.add_argument('database', help="SQLite index file")
+    sizes_parser.set_defaults(run=run_sizes)
+
+    args = parser.parse_args(argv)
+    args.run(parser, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from zipmeta import ZipInfo
+
+# Measures how much memory ZipInfo needs per central directory entry.
+# A test archive with the given number of (tiny) entries is generated
+# and parsed while tracemalloc keeps track of the allocations.
+
+# Creates an archive with 'entries' small stored files
+def create_archive(filename, entries):
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_STORED) as archive:
+        for i in range(entries):
+            archive.writestr('directory/file_{:08d}.txt'.format(i), b'x')
+
+# @return: (retained bytes, peak bytes, parse time in seconds)
+def measure(filename):
+    tracemalloc.start()
+    start = time.perf_counter()
+    zip_metadata = ZipInfo(filename)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert zip_metadata.central_directory_headers
+    return retained, peak, elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report ZipInfo memory use per entry")
+    parser.add_argument('--entries', type=int, default=100000, help="entries in the test archive")
+    parser.add_argument('--zip', help="measure an existing archive instead")
+    parser.add_argument('--max-bytes', type=float,
+                        help="fail if more memory than this is retained per entry")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = args.zip
+        if filename is None:
+            filename = os.path.join(directory, 'benchmark.zip')
+            create_archive(filename, args.entries)
+        entries = len(ZipInfo(filename).central_directory_headers)
+        retained, peak, elapsed = measure(filename)
+
+    print("entries:          {}".format(entries))
+    print("parse time:       {:.3f} s ({:.2f} us/entry)".format(elapsed, elapsed / entries * 1e6))
+    print("retained memory:  {:.1f} MB ({:.0f} B/entry)".format(retained / 1e6, retained / entries))
+    print("peak memory:      {:.1f} MB ({:.0f} B/entry)".format(peak / 1e6, peak / entries))
+    if args.max_bytes is not None and retained / entries > args.max_bytes:
+        parser.exit(1, "retained memory per entry exceeds {:.0f} B\n".format(args.max_bytes))
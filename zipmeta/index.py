@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import zlib
+from collections import Counter
+from zipmeta import ZipInfo, compression_name
+from batch import find_archives
+
+# Persistent SQLite index of zip file metadata.
+#
+# Every archive is keyed by its path, size, modification time and the offset
+# of its end of central directory record. A refresh doesn't open archives
+# whose size and mtime are unchanged. When an archive has changed, but it has
+# only been appended to (new files added with e.g. zipfile's 'a' mode), the
+# beginning of the new central directory is identical to the old directory.
+# This is verified with a CRC and then only the new entries are parsed.
+# Queries are answered from the database without touching the archives.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    id                       INTEGER PRIMARY KEY,
+    path                     TEXT UNIQUE NOT NULL,
+    size                     INTEGER NOT NULL,
+    mtime_ns                 INTEGER NOT NULL,
+    eocd_offset              INTEGER,
+    central_directory_size   INTEGER,
+    central_directory_crc    INTEGER,
+    entry_count              INTEGER,
+    error                    TEXT
+);
+CREATE TABLE IF NOT EXISTS entries (
+    archive_id               INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    position                 INTEGER NOT NULL,
+    file_name                TEXT NOT NULL,
+    compression              INTEGER NOT NULL,
+    compressed_size          INTEGER NOT NULL,
+    uncompressed_size        INTEGER NOT NULL,
+    crc                      INTEGER NOT NULL,
+    dos_date                 INTEGER NOT NULL,
+    dos_time                 INTEGER NOT NULL,
+    local_header_offset      INTEGER NOT NULL,
+    PRIMARY KEY (archive_id, position)
+);
+CREATE INDEX IF NOT EXISTS entries_file_name ON entries(file_name);
+"""
+
+class MetadataIndex:
+    def __init__(self, filename):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Brings the index up to date with the archives under 'root'. Archives that
+    # have disappeared from 'root' are removed from the index.
+    # @return: Counter of the archives per outcome: unchanged, appended,
+    #          parsed, error and removed
+    def refresh(self, root, pattern='*.zip'):
+        statistics = Counter()
+        seen = set()
+        for filename in find_archives(root, pattern):
+            path = os.path.abspath(filename)
+            seen.add(path)
+            statistics[self.refresh_archive(path)] += 1
+
+        prefix = os.path.join(os.path.abspath(root), '')
+        for archive_id, path in self.connection.execute("SELECT id, path FROM archives").fetchall():
+            if path not in seen and (path.startswith(prefix) or path == os.path.abspath(root)):
+                self.connection.execute("DELETE FROM archives WHERE id = ?", (archive_id,))
+                statistics['removed'] += 1
+        self.connection.commit()
+        return statistics
+
+    # Updates a single archive
+    # @return: what was done: 'unchanged', 'appended', 'parsed' or 'error'
+    def refresh_archive(self, path):
+        stat = os.stat(path)
+        row = self.connection.execute(
+            "SELECT id, size, mtime_ns, eocd_offset, central_directory_size, "
+            "central_directory_crc, entry_count, error FROM archives WHERE path = ?",
+            (path,)).fetchone()
+        if row is not None and (row[1], row[2]) == (stat.st_size, stat.st_mtime_ns):
+            return 'unchanged'
+
+        try:
+            zip_metadata = ZipInfo(path, central_directory=False)
+            if zip_metadata.end_of_central_directory is None:
+                raise ValueError("end of central directory record not found")
+            with open(path, 'rb') as data, ZipInfo.map_file(data) as buffer:
+                start = zip_metadata.central_directory_start
+                end = zip_metadata.central_directory_end
+                outcome, skip, first_position = 'parsed', 0, 0
+                if row is not None and row[7] is None:
+                    if row[3] == zip_metadata.end_of_central_directory_offset and \
+                       row[4] == end - start and \
+                       row[5] == zlib.crc32(buffer[start:end]):
+                        outcome, skip, first_position = 'unchanged', end - start, row[6]
+                    elif row[4] < end - start and \
+                         row[5] == zlib.crc32(buffer[start:start + row[4]]):
+                        outcome, skip, first_position = 'appended', row[4], row[6]
+                zip_metadata.collect_central_directory(buffer, skip)
+                directory_crc = zlib.crc32(buffer[start:end])
+        except Exception as error:
+            self.store_archive(path, stat, row, error='{}: {}'.format(type(error).__name__, error))
+            return 'error'
+
+        archive_id = self.store_archive(path, stat, row,
+                                        eocd_offset=zip_metadata.end_of_central_directory_offset,
+                                        directory_size=end - start, directory_crc=directory_crc,
+                                        entry_count=first_position + len(zip_metadata.central_directory_headers),
+                                        keep_entries=skip > 0)
+        self.connection.executemany(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ((archive_id, first_position + i, central.file_name, central.compression,
+              central.compressed_size, central.uncompressed_size, central.crc,
+              central.dos_date, central.dos_time, central.local_header_offset)
+             for i, central in enumerate(zip_metadata.central_directory_headers)))
+        return outcome
+
+    # Inserts or updates the archive row. Old entries are dropped unless 'keep_entries' is set.
+    # @return: id of the archive
+    def store_archive(self, path, stat, row, eocd_offset=None, directory_size=None,
+                      directory_crc=None, entry_count=0, error=None, keep_entries=False):
+        values = (stat.st_size, stat.st_mtime_ns, eocd_offset, directory_size,
+                  directory_crc, entry_count, error)
+        if row is None:
+            cursor = self.connection.execute(
+                "INSERT INTO archives (size, mtime_ns, eocd_offset, central_directory_size, "
+                "central_directory_crc, entry_count, error, path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                values + (path,))
+            return cursor.lastrowid
+        self.connection.execute(
+            "UPDATE archives SET size = ?, mtime_ns = ?, eocd_offset = ?, central_directory_size = ?, "
+            "central_directory_crc = ?, entry_count = ?, error = ? WHERE id = ?", values + (row[0],))
+        if not keep_entries:
+            self.connection.execute("DELETE FROM entries WHERE archive_id = ?", (row[0],))
+        return row[0]
+
+    # Finds entries by name from all the indexed archives
+    # @param name: exact file name, or a glob pattern (*, ?, [...]) if glob=True
+    # @return: list of (archive path, file name, uncompressed size, compressed size) tuples
+    def find(self, name, glob=False):
+        operator = 'GLOB' if glob else '='
+        return self.connection.execute(
+            "SELECT archives.path, file_name, uncompressed_size, compressed_size "
+            "FROM entries JOIN archives ON archives.id = entries.archive_id "
+            "WHERE file_name {} ? ORDER BY archives.path, position".format(operator),
+            (name,)).fetchall()
+
+    # @return: dict of compression method name -> (entry count, compressed bytes, uncompressed bytes)
+    def size_by_compression(self):
+        totals = {}
+        for compression, count, compressed, uncompressed in self.connection.execute(
+                "SELECT compression, COUNT(*), SUM(compressed_size), SUM(uncompressed_size) "
+                "FROM entries GROUP BY compression ORDER BY compression"):
+            totals[compression_name(compression)] = (count, compressed, uncompressed)
+        return totals
+
+    # @return: list of (archive path, error) tuples of the archives that couldn't be parsed
+    def errors(self):
+        return self.connection.execute(
+            "SELECT path, error FROM archives WHERE error IS NOT NULL ORDER BY path").fetchall()
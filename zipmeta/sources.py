@@ -0,0 +1,190 @@
+import asyncio
+import mmap
+import os
+import re
+import urllib.request
+
+# Byte sources give ZipInfo access to archives that are not (only) local files.
+# A source has a 'name', a 'size' and read(offset, length) that returns
+# the bytes of the given range. ZipInfo reads just the tail of the archive
+# and the central directory through it, so a remote archive can be parsed
+# with a couple of range requests.
+#
+# Async sources (for asyncio, see async_reader.py) have the same methods,
+# but size() and read() are coroutines. They also have read_tail(length),
+# which returns (size, tail bytes), since e.g. HTTP can answer both with
+# one suffix range request.
+
+# Raised by PrefetchedSource when the asked range hasn't been fetched
+class MissingRange(Exception):
+    def __init__(self, offset, length):
+        super().__init__("bytes {}-{} have not been fetched".format(offset, offset + length - 1))
+        self.offset = offset
+        self.length = length
+
+# Local file read with positional reads (one system call per read)
+class FileSource:
+    def __init__(self, filename):
+        self.name = filename
+        self.file = open(filename, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+
+    def read(self, offset, length):
+        return os.pread(self.file.fileno(), length, offset)
+
+    def close(self):
+        self.file.close()
+
+# Local file mapped to memory. Reads return memoryview slices of the mapping
+# without copying. The slices must be released before the source is closed.
+class MmapSource:
+    def __init__(self, filename):
+        self.name = filename
+        with open(filename, 'rb') as data:
+            self.size = os.fstat(data.fileno()).st_size
+            self.mapping = mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.view = memoryview(self.mapping)
+
+    def read(self, offset, length):
+        return self.view[offset:offset + length]
+
+    def close(self):
+        self.view.release()
+        if self.size:
+            self.mapping.close()
+
+# Archive that is already in memory
+class BytesSource:
+    def __init__(self, data, name='<bytes>'):
+        self.name = name
+        self.data = data
+        self.size = len(data)
+
+    def read(self, offset, length):
+        return self.data[offset:offset + length]
+
+    def close(self):
+        pass
+
+# Holds the byte ranges that have been fetched from a (remote) source. Reading
+# anything else raises MissingRange, which tells the caller what to fetch next.
+# Adjacent and overlapping ranges are merged, so a read can span them.
+class PrefetchedSource:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.ranges = [] # sorted list of (start, bytes)
+
+    def add(self, offset, data):
+        ranges = []
+        for start, chunk in self.ranges:
+            end = start + len(chunk)
+            if end < offset or start > offset + len(data):
+                ranges.append((start, chunk))
+                continue
+            # merge the overlapping or adjacent range to the new one
+            if start < offset:
+                data = chunk[:offset - start] + data
+                offset = start
+            if end > offset + len(data):
+                data = data + chunk[offset + len(data) - start:]
+        ranges.append((offset, bytes(data)))
+        self.ranges = sorted(ranges, key=lambda r: r[0])
+
+    def read(self, offset, length):
+        length = max(0, min(length, self.size - offset))
+        if length == 0:
+            return b'' # at or past the end, like reading a file
+        end = offset + length
+        for start, chunk in self.ranges:
+            if start <= offset and end <= start + len(chunk):
+                return chunk[offset - start:end - start]
+        # Ask only for the part before the next fetched range
+        for start, chunk in self.ranges:
+            if offset < start < end:
+                end = start
+                break
+        for start, chunk in self.ranges:
+            if start <= offset < start + len(chunk):
+                offset = start + len(chunk)
+        raise MissingRange(offset, end - offset)
+
+    def close(self):
+        pass
+
+# Any sync source can be used as an async source. Requests and fetched bytes
+# are counted, so this also works as an in-process stand-in for a remote
+# range server in tests. 'latency' (seconds) simulates the round trip time.
+class AsyncSourceAdapter:
+    def __init__(self, source, latency=0):
+        self.source = source
+        self.name = source.name
+        self.latency = latency
+        self.requests = 0
+        self.bytes_read = 0
+
+    async def size(self):
+        return self.source.size
+
+    async def read(self, offset, length):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = bytes(self.source.read(offset, length))
+        self.bytes_read += len(data)
+        return data
+
+    async def read_tail(self, length):
+        size = self.source.size
+        return size, await self.read(max(0, size - length), length)
+
+    def close(self):
+        self.source.close()
+
+# Archive behind HTTP(S) with range request support. The blocking urllib
+# requests are run in threads, so many archives can be read concurrently.
+class HttpRangeSource:
+    def __init__(self, url, headers=None, timeout=30):
+        self.name = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.total_size = None
+        self.requests = 0
+        self.bytes_read = 0
+
+    # @param byte_range: value of the Range header, e.g. 'bytes=0-99' or 'bytes=-100'
+    # @return: (file size, data)
+    def request(self, byte_range):
+        request = urllib.request.Request(self.name, headers=dict(self.headers, Range=byte_range))
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = response.read()
+            if response.status == 206:
+                match = re.match(r'bytes \d+-\d+/(\d+)', response.headers.get('Content-Range', ''))
+                size = int(match.group(1)) if match else None
+            else: # server ignored the range and sent the whole file
+                size = len(data)
+        self.requests += 1
+        self.bytes_read += len(data)
+        return size, data, response.status
+
+    async def size(self):
+        if self.total_size is None:
+            await self.read_tail(1)
+        return self.total_size
+
+    async def read(self, offset, length):
+        if length <= 0:
+            return b''
+        size, data, status = await asyncio.to_thread(
+            self.request, 'bytes={}-{}'.format(offset, offset + length - 1))
+        if self.total_size is None:
+            self.total_size = size
+        return data if status == 206 else data[offset:offset + length]
+
+    async def read_tail(self, length):
+        size, data, status = await asyncio.to_thread(self.request, 'bytes=-{}'.format(length))
+        self.total_size = size
+        return size, data if status == 206 else data[-length:]
+
+    def close(self):
+        pass
@@ -0,0 +1,365 @@
+import asyncio
+import io
+import json
+import os
+import struct
+import zipfile
+import zlib
+import pytest
+import batch
+from index import MetadataIndex
+from sources import FileSource, MmapSource, BytesSource, AsyncSourceAdapter, PrefetchedSource
+from async_reader import read_zip_infos
+from benchmark_memory import create_archive, measure
+import zipmeta
+from zipmeta import ZipInfo, find_headers
+
+# Creates a small example archive with the standard library zipfile
+# @param path: where to write the archive
+# @param files: dict of file names and contents
+# @param comment: optional archive comment
+def make_zip(path, files, comment=b'', compression=zipfile.ZIP_DEFLATED):
+    with zipfile.ZipFile(str(path), 'w', compression) as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+        archive.comment = comment
+    return str(path)
+
+FILES = {'a.txt': b'hello world' * 100, 'dir/b.bin': bytes(range(256)), 'c.txt': b''}
+
+def test_central_directory_from_end_record(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES, comment=b'PK\x05\x06 fake record in comment')
+    info = ZipInfo(path)
+    names = [central.file_name for central in info.central_directory_headers]
+    assert names == list(FILES)
+    assert info.end_of_central_directory.total_entries == len(FILES)
+    assert info.zip64_end_of_central_directory is None
+    assert info.central_directory_header.file_name == 'c.txt'
+
+def test_local_file_headers_are_lazy(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    info = ZipInfo(path)
+    assert info._local_file_headers is None
+    assert [local.file_name for local in info.local_file_headers] == list(FILES)
+
+def test_fast_path_matches_full_scan(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES, compression=zipfile.ZIP_STORED)
+    fast = ZipInfo(path)
+    slow = ZipInfo(path, full_scan=True)
+    assert [str(c) for c in fast.central_directory_headers] == \
+           [str(c) for c in slow.central_directory_headers]
+
+def test_prepended_data(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f:
+        f.write(b'#!stub\n' * 10 + content)
+    info = ZipInfo(path)
+    assert info.offset_shift == 70
+    assert [local.file_name for local in info.local_file_headers] == list(FILES)
+
+def test_zip64_end_of_central_directory(tmp_path, monkeypatch):
+    # zipfile writes the Zip64 records only when they are needed,
+    # so lower the entry count limit to force them.
+    monkeypatch.setattr(zipfile, 'ZIP_FILECOUNT_LIMIT', 1)
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    info = ZipInfo(path)
+    assert info.zip64_end_of_central_directory.total_entries == len(FILES)
+    assert info.zip64_end_of_central_directory_locator is not None
+    assert [c.file_name for c in info.central_directory_headers] == list(FILES)
+
+def test_file_names_are_decoded_by_language_flag(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', {'käärme.txt': b'utf-8', 'plain.txt': b'cp437'})
+    info = ZipInfo(path)
+    assert [c.file_name for c in info.central_directory_headers] == ['käärme.txt', 'plain.txt']
+    assert info.central_directory_headers[0].general_flag & 0x800
+
+def test_extra_fields_are_copied_only_when_asked(tmp_path):
+    path = str(tmp_path / 'a.zip')
+    entry = zipfile.ZipInfo('a.txt')
+    entry.extra = b'\xfe\xca\x02\x00hi'
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(entry, b'data')
+    info = ZipInfo(path)
+    central = info.central_directory_header
+    assert central.extra_field is None
+    assert info.read_extra_field(central) == entry.extra
+    assert ZipInfo(path, extra_fields=True).central_directory_header.extra_field == entry.extra
+
+def test_scan_finds_unaligned_headers_without_end_record(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    with open(path, 'rb') as f:
+        content = f.read()
+    with open(path, 'wb') as f: # odd sized stub, no end of central directory record
+        f.write(b'abc' + content[:content.rindex(b'PK\x05\x06')])
+    info = ZipInfo(path)
+    assert [local.file_name for local in info.local_file_headers] == list(FILES)
+    assert [central.file_name for central in info.central_directory_headers] == list(FILES)
+    assert info.central_directory_headers[0].extra_field_offset == \
+           content.index(b'PK\x01\x02') + 3 + 46 + len('a.txt')
+
+# Output of the eagerly formatted headers (before the __slots__ records)
+EAGER_CENTRAL_HEADER = '''header_signature: \\0x50\\0x4b\\0x1\\0x2
+version: 788
+minimum_version: 20
+general_flag: 2048
+compression_method: DEFLATE
+last_modification_time: 22:59:58
+last_modification_date: 12/31/1999
+crc_32: 0x5e0e5d8f
+compressed_size: 6
+uncompressed_size: 100
+file_name_length: 12
+extra_field_length: 6
+file_comment_length: 9
+disk_number: 0
+internal_attributes: 0
+external_attributes: 25165824
+local_header_offset: 40
+file_name: käärme.txt
+extra_field: None
+extra_field_offset: 203
+file_comment: kommentti
+'''
+EAGER_LOCAL_HEADER = '''header_signature: \\0x50\\0x4b\\0x3\\0x4
+minimum_version: 20
+general_flag: 0
+compression_method: STORE
+last_modification_time: 02:04:06
+last_modification_date: 01/02/2020
+crc_32: 0x3610a686
+compressed_size: 5
+uncompressed_size: 5
+file_name_length: 5
+extra_field_length: 0
+file_name: a.txt
+extra_field: -
+extra_field_offset: 35
+'''
+EAGER_END_RECORD = '''header_signature: \\0x50\\0x4b\\0x5\\0x6
+disk_number: 0
+central_directory_disk: 0
+disk_entries: 2
+total_entries: 2
+central_directory_size: 124
+central_directory_offset: 94
+comment_length: 7
+comment: b'archive'
+'''
+
+def test_lazy_formatting_matches_eager_output(tmp_path):
+    path = str(tmp_path / 'a.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(zipfile.ZipInfo('a.txt', date_time=(2020, 1, 2, 3, 4, 6)), b'hello')
+        entry = zipfile.ZipInfo('käärme.txt', date_time=(1999, 12, 31, 23, 59, 58))
+        entry.compress_type = zipfile.ZIP_DEFLATED
+        entry.extra = b'\xfe\xca\x02\x00hi'
+        entry.comment = b'kommentti'
+        archive.writestr(entry, b'x' * 100)
+        archive.comment = b'archive'
+    for info in (ZipInfo(path), ZipInfo(path, full_scan=True)):
+        assert str(info.central_directory_headers[1]) == EAGER_CENTRAL_HEADER
+        assert str(info.local_file_headers[0]) == EAGER_LOCAL_HEADER
+    assert str(ZipInfo(path).end_of_central_directory) == EAGER_END_RECORD
+
+def test_memory_per_entry(tmp_path):
+    path = str(tmp_path / 'a.zip')
+    create_archive(path, 5000)
+    retained, peak, elapsed = measure(path)
+    assert retained / 5000 < 1024
+    assert peak / 5000 < 1024
+
+def test_batch_scan_isolates_errors(tmp_path):
+    make_zip(tmp_path / 'a.zip', FILES)
+    (tmp_path / 'sub').mkdir()
+    make_zip(tmp_path / 'sub' / 'b.zip', {'b.txt': b'b'})
+    (tmp_path / 'sub' / 'broken.zip').write_bytes(b'not a zip')
+    output = io.StringIO()
+    statistics = batch.scan(str(tmp_path), batch.JsonLinesWriter(output), workers=2)
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted(row['file_name'] for row in rows if row['error'] is None) == \
+           sorted(list(FILES) + ['b.txt'])
+    assert [row['archive'] for row in rows if row['error']] == [str(tmp_path / 'sub' / 'broken.zip')]
+    assert (statistics.archives, statistics.entries, statistics.errors) == (3, 4, 1)
+    crcs = {row['file_name']: row['crc'] for row in rows if row['error'] is None}
+    assert crcs['b.txt'] == zlib.crc32(b'b') # the integer, like the index
+
+def test_index_refresh_parses_only_appended_entries(tmp_path):
+    archives = tmp_path / 'archives'
+    archives.mkdir()
+    path = make_zip(archives / 'a.zip', FILES)
+    with MetadataIndex(str(tmp_path / 'index.db')) as metadata_index:
+        assert metadata_index.refresh(str(archives)) == {'parsed': 1}
+        assert metadata_index.refresh(str(archives)) == {'unchanged': 1}
+        with zipfile.ZipFile(path, 'a', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('new.txt', b'appended')
+        assert metadata_index.refresh(str(archives)) == {'appended': 1}
+        assert metadata_index.find('*.txt', glob=True) == [
+            (path, 'a.txt', 1100, ZipInfo(path).central_directory_headers[0].compressed_size),
+            (path, 'c.txt', 0, 2),
+            (path, 'new.txt', 8, 10)]
+        totals = metadata_index.size_by_compression()
+        assert totals['DEFLATE'][0] == 4
+        assert totals['DEFLATE'][2] == sum(map(len, FILES.values())) + 8
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED,
+                                         zipfile.ZIP_BZIP2, zipfile.ZIP_LZMA])
+def test_open_entry_streams_and_verifies(tmp_path, compression):
+    content = bytes(range(256)) * 4000 + b'tail'
+    path = make_zip(tmp_path / 'a.zip', {'x.bin': b'x', 'big.bin': content}, compression=compression)
+    info = ZipInfo(path, central_directory=False)
+    assert [c.file_name for c in info.iter_entries()] == ['x.bin', 'big.bin']
+    assert info.central_directory_headers == []
+    with info.open_entry('big.bin') as entry:
+        chunks = iter(lambda: entry.read(1000), b'')
+        assert b''.join(chunks) == content
+
+def test_iter_entries_of_empty_archive(tmp_path, monkeypatch):
+    path = make_zip(tmp_path / 'a.zip', {})
+    info = ZipInfo(path)
+    # The directory has been parsed already, even though it has no headers
+    monkeypatch.setattr(info, 'iter_central_directory', None)
+    assert list(info.iter_entries()) == []
+    assert list(ZipInfo(path, central_directory=False).iter_entries()) == []
+
+def test_open_entry_detects_corruption(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', {'a.txt': b'hello world'}, compression=zipfile.ZIP_STORED)
+    with open(path, 'r+b') as f:
+        data = f.read()
+        f.seek(data.index(b'hello'))
+        f.write(b'J')
+    with pytest.raises(ValueError, match='CRC'):
+        ZipInfo(path).open_entry('a.txt').read()
+
+def test_byte_sources(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    expected = [str(c) for c in ZipInfo(path).central_directory_headers]
+    with open(path, 'rb') as f:
+        data = f.read()
+    for source in (FileSource(path), MmapSource(path), BytesSource(data, path)):
+        info = ZipInfo(source)
+        assert [str(c) for c in info.central_directory_headers] == expected
+        assert [l.file_name for l in info.local_file_headers] == list(FILES)
+        assert info.open_entry('a.txt').read() == FILES['a.txt']
+        source.close()
+
+def test_async_reader_fetches_only_tail_and_directory(tmp_path):
+    # Big enough central directory, so it doesn't fit to the first request
+    files = {'file_{:05d}.txt'.format(i): b'' for i in range(3000)}
+    files['payload.bin'] = os.urandom(1 << 20)
+    big = make_zip(tmp_path / 'big.zip', files, compression=zipfile.ZIP_STORED)
+    small = make_zip(tmp_path / 'small.zip', FILES)
+    sources = [AsyncSourceAdapter(FileSource(path), latency=0.01) for path in (big, small)]
+    sources.append(AsyncSourceAdapter(BytesSource(b'not a zip')))
+    big_info, small_info, error = asyncio.run(read_zip_infos(sources))
+
+    assert [c.file_name for c in big_info.central_directory_headers] == list(files)
+    assert sources[0].requests == 2
+    assert sources[0].bytes_read < os.path.getsize(big) - len(files['payload.bin'])
+    assert [c.file_name for c in small_info.central_directory_headers] == list(FILES)
+    assert sources[1].requests == 1
+    assert isinstance(error, ValueError)
+
+def test_async_reader_truncated_archive(tmp_path):
+    path = make_zip(tmp_path / 'a.zip', FILES)
+    with open(path, 'rb') as f:
+        content = f.read()
+    sources = []
+    for data in (content[:len(content) // 2], content[:10], b''):
+        source = BytesSource(data)
+        source.size = len(content) # e.g. an interrupted download
+        sources.append(AsyncSourceAdapter(source))
+    sources.append(AsyncSourceAdapter(BytesSource(content[:len(content) // 2])))
+    for source, error in zip(sources, asyncio.run(read_zip_infos(sources))):
+        assert isinstance(error, ValueError)
+        assert source.requests == 1
+    prefetched = PrefetchedSource('a.zip', len(content))
+    prefetched.add(0, content[:10])
+    assert prefetched.read(len(content), 4) == b''
+    assert prefetched.read(len(content) + 10, 4) == b''
+
+def test_data_descriptors(tmp_path):
+    # zipfile writes data descriptors when the output is not seekable
+    class Unseekable(io.RawIOBase):
+        def __init__(self, output):
+            self.output = output
+        def writable(self):
+            return True
+        def write(self, data):
+            return self.output.write(data)
+    path = tmp_path / 'a.zip'
+    with open(path, 'wb') as f:
+        with zipfile.ZipFile(Unseekable(f), 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in FILES.items():
+                archive.writestr(name, content)
+    info = ZipInfo(str(path))
+    for local, central in zip(info.local_file_headers, info.central_directory_headers):
+        assert local.general_flag & 0x8
+        assert local.data_descriptor is not None
+        assert (local.crc, local.compressed_size, local.uncompressed_size) == \
+               (central.crc, central.compressed_size, central.uncompressed_size)
+        assert local.uncompressed_size == len(FILES[local.file_name])
+
+def test_zip64_extra_fields(tmp_path, monkeypatch):
+    # Pretend that 4 GiB is only 5 bytes, so the sizes and offsets go to the Zip64 extra field
+    monkeypatch.setattr(zipfile, 'ZIP64_LIMIT', 5)
+    path = make_zip(tmp_path / 'a.zip', FILES, compression=zipfile.ZIP_STORED)
+    monkeypatch.undo()
+    info = ZipInfo(path)
+    for central in info.central_directory_headers:
+        assert central.uncompressed_size == len(FILES[central.file_name])
+    assert [l.file_name for l in info.local_file_headers] == list(FILES)
+    assert 'zip64' in info.read_extra_records(info.central_directory_headers[1])
+    assert info.open_entry('dir/b.bin').read() == FILES['dir/b.bin']
+
+def test_extra_records_and_unknown_compression(tmp_path):
+    entry = zipfile.ZipInfo('a.txt')
+    entry.extra = (struct.pack('<HHBl', 0x5455, 5, 1, 1234567890) +
+                   struct.pack('<HHBBLBL', 0x7875, 11, 1, 4, 1000, 4, 100) +
+                   struct.pack('<HH', 0xcafe, 1) + b'x')
+    path = str(tmp_path / 'a.zip')
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(entry, b'data')
+    with open(path, 'r+b') as f: # change the compression method in the central directory
+        data = f.read()
+        f.seek(data.index(b'PK\x01\x02') + 10)
+        f.write(struct.pack('<H', 99))
+    info = ZipInfo(path)
+    central = info.central_directory_header
+    assert central.compression_method == 'UNKNOWN_99'
+    records = info.read_extra_records(central)
+    assert records['extended_timestamp'].modification_time == 1234567890
+    assert (records['unix'].uid, records['unix'].gid) == (1000, 100)
+    assert records['0xcafe'] == b'x'
+
+# Every header field parsed from the archive, for comparing the parsers
+def parsed_fields(path, **kwargs):
+    info = ZipInfo(path, **kwargs)
+    headers = info.central_directory_headers + info.local_file_headers
+    return [[(name, str(getattr(header, name, None))) for name in dir(header)
+             if not name.startswith('__') and not callable(getattr(header, name, None))]
+            for header in headers]
+
+def test_compiled_kernels_match_pure_python(tmp_path, monkeypatch):
+    pytest.importorskip('zipmeta_kernels')
+    paths = [make_zip(tmp_path / 'a.zip', FILES, comment=b'PK\x01\x02 comment'),
+             make_zip(tmp_path / 'b.zip', {'käärme.txt': b'utf-8', 'plain.txt': b'cp437'})]
+    entry = zipfile.ZipInfo('extra.txt')
+    entry.extra = b'\xfe\xca\x02\x00hi'
+    entry.comment = 'kommentti'.encode()
+    with zipfile.ZipFile(str(tmp_path / 'c.zip'), 'w') as archive:
+        archive.writestr(entry, b'data')
+        archive.writestr('PK\x03\x04.txt', b'PK\x01\x02' * 100)
+    paths.append(str(tmp_path / 'c.zip'))
+    with monkeypatch.context() as patch:
+        patch.setattr(zipfile, 'ZIP64_LIMIT', 5)
+        paths.append(make_zip(tmp_path / 'd.zip', FILES, compression=zipfile.ZIP_STORED))
+    options = [{}, {'extra_fields': True}, {'full_scan': True}, {'full_scan': True, 'extra_fields': True}]
+
+    compiled = [parsed_fields(path, **kwargs) for path in paths for kwargs in options]
+    buffer = open(paths[2], 'rb').read() + b'PK\x03'
+    compiled_positions = [list(find_headers(buffer, start)) for start in range(len(buffer) + 2)]
+    monkeypatch.setattr(zipmeta, 'zipmeta_kernels', None)
+    assert [parsed_fields(path, **kwargs) for path in paths for kwargs in options] == compiled
+    assert [list(find_headers(buffer, start)) for start in range(len(buffer) + 2)] == compiled_positions
@@ -1,5 +1,21 @@
-from struct import unpack
+from struct import unpack_from, error as StructError
 from enum import Enum
+from contextlib import contextmanager
+from sources import FileSource
+import bz2
+import io
+import lzma
+import mmap
+import os
+import re
+import sys
+import zlib
+
+# Compiled header scanning and parsing (zipmeta_kernels.pyx), if it has been built
+try:
+    import zipmeta_kernels
+except ImportError:
+    zipmeta_kernels = None
 
 # This script collects zip file's metadata into easily accessable classes
 # Author: Otteri
@@ -11,6 +27,37 @@ from enum import Enum
 # Dos date time:
 # https://docs.microsoft.com/en-us/windows/desktop/api/Winbase/nf-winbase-dosdatetimetofiletime
 
+LOCAL_FILE_HEADER_SIGNATURE                      = b'PK\x03\x04'
+CENTRAL_DIRECTORY_HEADER_SIGNATURE               = b'PK\x01\x02'
+END_OF_CENTRAL_DIRECTORY_SIGNATURE               = b'PK\x05\x06'
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE         = b'PK\x06\x06'
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE = b'PK\x06\x07'
+DATA_DESCRIPTOR_SIGNATURE                        = b'PK\x07\x08'
+
+# Fixed sizes of the records (variable length parts excluded)
+LOCAL_FILE_HEADER_SIZE                      = 30
+CENTRAL_DIRECTORY_HEADER_SIZE               = 46
+END_OF_CENTRAL_DIRECTORY_SIZE               = 22
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE         = 56
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIZE = 20
+MAX_COMMENT_LENGTH                          = 0xFFFF
+# End records are always within this many bytes from the end of a file
+# (unless the Zip64 record has an extensible data sector)
+TAIL_SIZE = (END_OF_CENTRAL_DIRECTORY_SIZE + MAX_COMMENT_LENGTH +
+             ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIZE + ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE)
+
+HEADER_SIGNATURES = re.compile(re.escape(LOCAL_FILE_HEADER_SIGNATURE) + b'|' +
+                               re.escape(CENTRAL_DIRECTORY_HEADER_SIGNATURE))
+
+# @param buffer: bytes-like object, e.g. memoryview of a mapped file
+# @return: iterator of the positions of the local file header and central
+#          directory header signatures from 'start' on. The positions are
+#          found lazily, so the memory use doesn't depend on the file size.
+def find_headers(buffer, start=0):
+    if zipmeta_kernels is not None:
+        return zipmeta_kernels.find_headers(buffer, start)
+    return (match.start() for match in HEADER_SIGNATURES.finditer(buffer, start))
+
 class Compression(Enum):
     STORE               = 0
     SHRUNK              = 1
@@ -64,231 +111,926 @@ class Version():
         self.value = new_value
         self.high_byte = b1
         self.low_byte = b2
-        self.version_type = self.Versions(self.high_byte).name
+        self.version_type = VERSION_TYPES.get(self.high_byte, 'UNKNOWN_{}'.format(self.high_byte))
 
     def __str__(self):
         return(str(self.value))
 
+# Lookup tables for the names. Plain dict lookups are much cheaper than
+# constructing an Enum per entry and they don't raise on unknown values.
+COMPRESSION_NAMES = {method.value: method.name for method in Compression}
+VERSION_TYPES = {version.value: version.name for version in Version.Versions}
+
+# @return: name of the compression method, e.g. DEFLATE or UNKNOWN_99
+def compression_name(method):
+    return COMPRESSION_NAMES.get(method, 'UNKNOWN_{}'.format(method))
+
+# date: two bytes that represent date in MS-DOS format
+# return: date as a string (format: MM/dd/yyyy).
+def dos_date_to_str(date):
+    year_mask  = 0b1111111000000000
+    month_mask = 0b0000000111100000
+    day_mask   = 0b0000000000011111
+    year  = ((date & year_mask) >> 9) + 1980
+    month = (date & month_mask) >> 5
+    day   = (date & day_mask)
+    return("{:02d}/{:02d}/{:04d}".format(month, day, year))
+
+# time: two bytes that represent time in MS-DOS format
+# return: time as a string (format: HH:mm:ss)
+def dos_time_to_str(time):
+    hour_mask   = 0b1111100000000000
+    minute_mask = 0b0000011111100000
+    second_mask = 0b0000000000011111
+    hours   = ((time & hour_mask) >> 11) - 1
+    minutes = (time & minute_mask) >> 5
+    seconds = (time & second_mask) * 2
+    return("{:02d}:{:02d}:{:02d}".format(hours, minutes, seconds))
+
+# Returns signature as a string in following four bytes format: \x50\x4b\x03\x04
+# Note: all zip file signatures are 4 bytes long
+def get_signature_str(b):
+    b1, b2, b3, b4 = b.to_bytes(4, byteorder='little')
+    signature = [hex(b1), hex(b2), hex(b3), hex(b4)]
+    return(''.join(str('\\' + e) for e in signature))
+
+# Python uses b' to indicate that object is a byte object.
+# This method removes the precending b' from printed string.
+def remove_b(byte_object):
+    return str(byte_object).split("'")[1]
+
+# File names and comments are CP437 encoded, unless the general purpose
+# flag's bit 11 (language encoding flag) says that they are UTF-8.
+# @param byte_object: bytes-like object, e.g. a slice of a memoryview
+# @return: decoded string
+def decode_text(byte_object, general_flag):
+    encoding = 'utf-8' if general_flag & 0x800 else 'cp437'
+    return str(byte_object, encoding, 'replace')
+
+# Creates an 'bit'-array that represents two bytes of data
+# E.g. 'General purpose flags' and 'Internal attributes'
+# use this kind of datastructure
+def read_16_bit_flags(general_flag):
+    bits = [0] * 16
+    for i in range(0, 15):
+        if(general_flag & (1 << i)):
+            bits[i] = 1
+    return bits
+
 # Structure overview of a Zip file:
-#    ___________________
-#   |      Header 1     |
-#   |    File data 1    |
-#   | Data descriptor 1 |
-#   |       ...         |
-#   |     Header n      |
-#   |   File data n     |
-#   | Data descriptor n |
-#   | Central directory |
-#   |___________________|
+#    ______________________________
+#   |           Header 1           |
+#   |         File data 1          |
+#   |      Data descriptor 1       |
+#   |            ...               |
+#   |           Header n           |
+#   |         File data n          |
+#   |      Data descriptor n       |
+#   |      Central directory       |
+#   | Zip64 end of central dir (*) |
+#   | Zip64 end of c. d. loc.  (*) |
+#   |   End of central directory   |
+#   |______________________________|
+#   (*) only in Zip64 archives
 # Header files contain useful metadata. 
 # Find the headers and store the metadata.
+#
+# By default the file is memory mapped and only its tail and the central
+# directory are touched: the end of central directory record tells where the
+# central directory is. Local file headers are loaded lazily, when
+# they are asked for. Thus, the work depends on the number of entries and
+# not on the size of the archive. The signature scan through the
+# whole file can still be requested with full_scan=True and it is also used
+# as a fallback, if the end of central directory record can't be found.
+# Extra fields are copied from the archive only with extra_fields=True,
+# otherwise they can be read afterwards with read_extra_field.
+#
+# With central_directory=False only the end records are read. The central
+# directory can be then collected later with collect_central_directory.
+#
+# Instead of a file name, a byte source (see sources.py) can be given. Then
+# the tail and the central directory are read through it with two reads.
 class ZipInfo:
-    def __init__(self, filename):
-        self.local_file_headers = []
+    def __init__(self, filename, full_scan=False, extra_fields=False, central_directory=True):
+        self.source = filename if hasattr(filename, 'read') else None
+        self.filename = filename if self.source is None else self.source.name
+        self.extra_fields = extra_fields
+        self.central_directory_headers = []
         self.central_directory_header = None
+        # True when central_directory_headers holds the whole directory. It can
+        # be empty also after parsing, as an archive may have no entries.
+        self.central_directory_parsed = False
+        self.end_of_central_directory = None
+        self.end_of_central_directory_offset = None
+        self.zip64_end_of_central_directory = None
+        self.zip64_end_of_central_directory_locator = None
+        self.central_directory_start = None
+        self.central_directory_end = None
+        # Difference between the real and the recorded offsets. This is non-zero
+        # when something (e.g. self-extractor stub) has been prepended to the zip.
+        self.offset_shift = 0
+        self._local_file_headers = None
 
+        if self.source is not None:
+            self.collect_from_source(central_directory)
+            return
         with open(filename, 'rb') as data:
-            for four_bytes in self.read_bytes_to_buffer(data, 4):
-                bytelist = list(four_bytes)
-                if (bytelist == ['0x50','0x4b','0x3','0x4']):
-                    data.seek(data.tell() - 4) # go back to signature start
+            if not full_scan:
+                with self.map_file(data) as buffer:
+                    self.collect_end_of_central_directory(buffer)
+                    if self.end_of_central_directory is not None:
+                        self.locate_central_directory()
+                        if central_directory:
+                            self.collect_central_directory(buffer)
+            if self.end_of_central_directory is None:
+                self.scan_file(data)
+
+    # Maps the whole file to memory. The headers are unpacked straight from
+    # the mapping, so there is no read call or intermediate copy per header.
+    # Note: slices of the returned view must not outlive the with block.
+    @staticmethod
+    @contextmanager
+    def map_file(data):
+        if os.fstat(data.fileno()).st_size == 0:
+            yield memoryview(b'') # empty files can't be mapped
+            return
+        with mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            buffer = memoryview(mapping)
+            try:
+                yield buffer
+            finally:
+                buffer.release()
+
+    # Reads the end records and the central directory through the byte source
+    def collect_from_source(self, central_directory):
+        tail_start = max(0, self.source.size - TAIL_SIZE)
+        tail = self.source.read(tail_start, self.source.size - tail_start)
+        self.collect_end_of_central_directory(tail, tail_start)
+        if self.end_of_central_directory is None:
+            raise ValueError("End of central directory record not found in {}".format(self.filename))
+        self.locate_central_directory()
+        if central_directory:
+            directory = self.read_bytes(self.central_directory_start,
+                                        self.central_directory_end - self.central_directory_start)
+            self.collect_central_directory(directory, base=self.central_directory_start)
+
+    # Reads a byte range of the archive from the byte source or from the file
+    def read_bytes(self, offset, length):
+        if self.source is not None:
+            return self.source.read(offset, length)
+        with open(self.filename, 'rb') as data:
+            return os.pread(data.fileno(), length, offset)
+
+    # Local file headers duplicate most of the central directory information,
+    # so they are read from the file only when somebody actually needs them.
+    @property
+    def local_file_headers(self):
+        if self._local_file_headers is None:
+            if self.source is not None:
+                self._local_file_headers = [self.read_local_file_header(central)
+                                            for central in self.central_directory_headers]
+                return self._local_file_headers
+            with open(self.filename, 'rb') as data, self.map_file(data) as buffer:
+                self._local_file_headers = [self.read_local_file_header(central, buffer)
+                                            for central in self.central_directory_headers]
+        return self._local_file_headers
+
+    # Reads the local file header that the given central directory header points to.
+    # If the header is followed by a data descriptor, it is read too and the
+    # CRC and sizes of the header are taken from it (see LocalFileHeader).
+    # @param central: CentralDirectoryHeader of the wanted file
+    # @param buffer: mapped archive, only the header is read if it is not given
+    # @return: LocalFileHeader
+    def read_local_file_header(self, central, buffer=None):
+        position = central.local_header_offset + self.offset_shift
+        header = LocalFileHeader()
+        if buffer is not None:
+            data_start = header.collect_header_from(buffer, position, self.extra_fields)
+        else:
+            header_data = bytes(self.read_bytes(position, LOCAL_FILE_HEADER_SIZE))
+            if len(header_data) < LOCAL_FILE_HEADER_SIZE:
+                raise ValueError("Truncated local file header for {}".format(central.file_name))
+            file_name_length, extra_field_length = unpack_from('<HH', header_data, 26)
+            header_data += self.read_bytes(position + LOCAL_FILE_HEADER_SIZE,
+                                           file_name_length + extra_field_length)
+            data_start = position + header.collect_header_from(header_data, 0, self.extra_fields)
+            header.extra_field_offset += position
+
+        if header.general_flag & 0x8:
+            descriptor_position = data_start + central.compressed_size
+            zip64 = (central.compressed_size >= 0xFFFFFFFF or central.uncompressed_size >= 0xFFFFFFFF or
+                     find_extra_block(self.read_extra_field(header), ZIP64_EXTRA_ID) is not None)
+            if buffer is not None:
+                header.collect_data_descriptor_from(buffer, descriptor_position, zip64)
+            else:
+                descriptor_data = self.read_bytes(descriptor_position, 24)
+                header.collect_data_descriptor_from(descriptor_data, descriptor_position, zip64,
+                                                    base=descriptor_position)
+        return header
+
+    # Extra fields are not copied from the archive unless they are asked for.
+    # @param header: LocalFileHeader or CentralDirectoryHeader
+    # @return: the extra field bytes of the header
+    def read_extra_field(self, header):
+        if header.extra_field is not None:
+            return header.extra_field
+        return bytes(self.read_bytes(header.extra_field_offset, header.extra_field_length))
+
+    # Parses the known extra field blocks of the header (Zip64, NTFS,
+    # extended timestamp and Unix UID/GID), see parse_extra_field.
+    # @return: dict of block name -> parsed block
+    def read_extra_records(self, header):
+        return parse_extra_field(self.read_extra_field(header))
+
+    # Finds the end of central directory record by searching backwards from the
+    # end of the file. The record is 22 bytes long plus an optional comment,
+    # so it must be located within the last 22 + 65535 bytes of the file.
+    # Zip64 archives also have a locator right before the record, which tells
+    # where the Zip64 end of central directory record is.
+    # @param buffer: bytes from 'base' to the end of the file, e.g. the mapped file
+    def collect_end_of_central_directory(self, buffer, base=0):
+        file_size = base + len(buffer)
+        tail_start = max(base, file_size - END_OF_CENTRAL_DIRECTORY_SIZE - MAX_COMMENT_LENGTH)
+        tail = bytes(buffer[tail_start - base:]) # memoryview has no rfind
+
+        position = tail.rfind(END_OF_CENTRAL_DIRECTORY_SIGNATURE)
+        while position >= 0:
+            if position + END_OF_CENTRAL_DIRECTORY_SIZE <= len(tail):
+                comment_length = unpack_from('<H', tail, position + 20)[0]
+                if position + END_OF_CENTRAL_DIRECTORY_SIZE + comment_length <= len(tail):
+                    break # comment fits to the file, so this is a real record
+            position = tail.rfind(END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, position)
+        if position < 0:
+            return
+
+        record = EndOfCentralDirectoryRecord()
+        record.collect_end_of_central_directory_record(tail, position)
+        self.end_of_central_directory = record
+        self.end_of_central_directory_offset = tail_start + position
+
+        locator_position = self.end_of_central_directory_offset - ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIZE
+        if locator_position < base:
+            return
+        locator_data = buffer[locator_position - base:locator_position - base + ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIZE]
+        if locator_data[:4] != ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE:
+            return
+        locator = Zip64EndOfCentralDirectoryLocator()
+        locator.collect_zip64_end_of_central_directory_locator(locator_data, 0)
+        self.zip64_end_of_central_directory_locator = locator
+
+        # Recorded offset is wrong if data has been prepended to the archive.
+        # In that case, assume that the record is right before the locator.
+        for record_position in (locator.zip64_end_of_central_directory_offset,
+                                locator_position - ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE):
+            if not 0 <= record_position <= locator_position - ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE:
+                continue
+            if record_position >= base:
+                record_data = buffer[record_position - base:record_position - base + ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE]
+            else:
+                record_data = self.read_bytes(record_position, ZIP64_END_OF_CENTRAL_DIRECTORY_SIZE)
+            if record_data[:4] == ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE:
+                zip64_record = Zip64EndOfCentralDirectoryRecord()
+                zip64_record.collect_zip64_end_of_central_directory_record(record_data, 0)
+                zip64_record.offset = record_position
+                self.zip64_end_of_central_directory = zip64_record
+                break
+
+    # Real position of the central directory is computed backwards from the end
+    # records, because the recorded offset is wrong if data has been prepended.
+    def locate_central_directory(self):
+        if self.zip64_end_of_central_directory is not None:
+            record = self.zip64_end_of_central_directory
+            directory_end = record.offset
+        else:
+            record = self.end_of_central_directory
+            directory_end = self.end_of_central_directory_offset
+        directory_start = directory_end - record.central_directory_size
+        if directory_start < 0:
+            raise ValueError("Bad central directory size in {}".format(self.filename))
+        self.central_directory_start = directory_start
+        self.central_directory_end = directory_end
+        self.offset_shift = directory_start - record.central_directory_offset
+
+    # Parses all the central directory headers straight from the mapped file.
+    # @param buffer: bytes of the file starting from 'base', e.g. the mapped file
+    # @param skip: bytes to skip from the start of the directory, e.g. when
+    #              the headers in the beginning of the directory are known already
+    def collect_central_directory(self, buffer, skip=0, base=0):
+        self.central_directory_headers.extend(self.iter_central_directory(buffer, skip, base))
+        self.central_directory_parsed = skip == 0 # skipped headers are not stored
+        if self.central_directory_headers:
+            self.central_directory_header = self.central_directory_headers[-1]
+
+    # Yields the central directory headers one by one from the mapped file
+    def iter_central_directory(self, buffer, skip=0, base=0):
+        position = self.central_directory_start + skip - base
+        end = self.central_directory_end - base
+        if zipmeta_kernels is not None:
+            yield from zipmeta_kernels.iter_central_directory(buffer, position, end, base,
+                                                              self.extra_fields, CentralDirectoryHeader)
+            return
+        while position + CENTRAL_DIRECTORY_HEADER_SIZE <= end:
+            if buffer[position:position + 4] != CENTRAL_DIRECTORY_HEADER_SIGNATURE:
+                break
+            central = CentralDirectoryHeader()
+            position = central.collect_central_directory_file_header_from(
+                buffer, position, self.extra_fields)
+            central.extra_field_offset += base
+            yield central
+
+    # Yields the central directory headers one at a time. If the directory hasn't
+    # been collected (central_directory=False), the headers are parsed on the fly
+    # and nothing is stored, so the memory use doesn't grow with the entry count.
+    def iter_entries(self):
+        if self.central_directory_parsed or self.central_directory_start is None:
+            yield from self.central_directory_headers
+            return
+        if self.source is not None:
+            directory = self.read_bytes(self.central_directory_start,
+                                        self.central_directory_end - self.central_directory_start)
+            yield from self.iter_central_directory(directory, base=self.central_directory_start)
+            return
+        with open(self.filename, 'rb') as data, self.map_file(data) as buffer:
+            yield from self.iter_central_directory(buffer)
+
+    # Opens a streaming reader for the file data of an entry. The data is read
+    # and decompressed in chunks and its CRC-32 is checked against the central
+    # directory, when the entry has been read to the end. Thus, also huge
+    # entries can be verified or extracted without loading them to memory:
+    #   with zip_metadata.open_entry(name) as entry, open(target, 'wb') as output:
+    #       shutil.copyfileobj(entry, output)
+    # @param name: file name of the entry or its CentralDirectoryHeader
+    # @return: binary file object
+    def open_entry(self, name, buffer_size=io.DEFAULT_BUFFER_SIZE):
+        central = name
+        if not isinstance(central, CentralDirectoryHeader):
+            central = next((c for c in self.iter_entries() if c.file_name == name), None)
+            if central is None:
+                raise KeyError("There is no entry named {} in {}".format(name, self.filename))
+        if self.source is not None:
+            reader = ZipEntryReader(self.source, central, self.offset_shift)
+        else:
+            reader = ZipEntryReader(FileSource(self.filename), central, self.offset_shift,
+                                    close_source=True)
+        return io.BufferedReader(reader, buffer_size)
+
+    # Goes through the whole file and collects every header it finds.
+    # This is slow, but works also for damaged archives that lack
+    # the end of central directory record. The signatures are searched
+    # from the mapped file (see find_headers) and the headers are parsed
+    # in order. Signatures inside an already parsed header are skipped.
+    def scan_file(self, data):
+        self._local_file_headers = []
+        with self.map_file(data) as buffer:
+            end = 0
+            for position in find_headers(buffer):
+                if position < end:
+                    continue
+                if buffer[position:position + 4] == LOCAL_FILE_HEADER_SIGNATURE:
+                    if position + LOCAL_FILE_HEADER_SIZE > len(buffer):
+                        break # truncated header
                     header = LocalFileHeader()
-                    header.collect_header(data)
-                    self.local_file_headers.append(header)
-                elif (bytelist == ['0x50','0x4b','0x5','0x6']):
-                    pass # End of central directory record
-                         # TODO: collect this data
-                elif (bytelist == ['0x50','0x4b','0x1','0x2']):
-                    data.seek(data.tell() - 4)
+                    end = header.collect_header_from(buffer, position, self.extra_fields)
+                    self._local_file_headers.append(header)
+                else:
+                    if position + CENTRAL_DIRECTORY_HEADER_SIZE > len(buffer):
+                        break
                     central = CentralDirectoryHeader()
-                    central.collect_central_directory_file_header(data)
+                    end = central.collect_central_directory_file_header_from(
+                        buffer, position, self.extra_fields)
+                    self.central_directory_headers.append(central)
                     self.central_directory_header = central
 
+    # Helpers are module level functions, so that the records don't have
+    # to inherit ZipInfo. They are still available through ZipInfo too.
+    dos_date_to_str   = staticmethod(dos_date_to_str)
+    dos_time_to_str   = staticmethod(dos_time_to_str)
+    get_signature_str = staticmethod(get_signature_str)
+    remove_b          = staticmethod(remove_b)
+    decode_text       = staticmethod(decode_text)
+    read_16_bit_flags = staticmethod(read_16_bit_flags)
+
+# Base class for the zip records. Records are stored with __slots__ and the
+# raw integers read from the file are kept as they are. Human readable
+# versions (dates, times, CRC, signatures...) are formatted only when they
+# are accessed. This keeps the memory footprint small with huge archives.
+class Record:
+    __slots__ = ()
+    printed_fields = () # attributes listed by __str__ in this order
+
+    # Print all the records attribute and value pairs
+    def __str__(self):
+        header_string = ""
+        for attr in self.printed_fields:
+            header_string += attr + ': ' + str(getattr(self, attr)) + '\n'
+        return(header_string)
+
+    @property
+    def header_signature(self):
+        return get_signature_str(self.signature)
+
+# Local file headers and central directory headers share the file information fields
+class FileHeader(Record):
+    __slots__ = ('signature', 'minimum_version', 'general_flag', 'compression',
+                 'dos_time', 'dos_date', 'crc', 'compressed_size', 'uncompressed_size',
+                 'file_name_length', 'extra_field_length', 'file_name',
+                 'extra_field', 'extra_field_offset')
+
+    @property
+    def compression_method(self):
+        return compression_name(self.compression)
 
-    # The zip files can be large, so we don't want to read the whole file into memory at once
-    # While seeking certain byte pattern from the file's binary data, use a generator instead.
-    # This sovles the possible memory consuption problems, because only small chunks of data
-    # are read at time. Function yields twice because it returns multiple bytes at once. 
-    # (single yield returns only one value).
-    def read_bytes_to_buffer(self, file_object, bytes_n):
-        chunksize = bytes_n
-        def generator():
-            n = 0
-            for nbytes in chunk[n:n+bytes_n]:
-                n += bytes_n
-                yield hex(nbytes)      
-        while True:
-            chunk = file_object.read(chunksize)
-            if not chunk:
+    @property
+    def last_modification_time(self):
+        return dos_time_to_str(self.dos_time)
+
+    @property
+    def last_modification_date(self):
+        return dos_date_to_str(self.dos_date)
+
+    @property
+    def crc_32(self):
+        return hex(self.crc)
+
+    # Decodes the variable length file name and extra field, which start from 'name_start'
+    # @return: position right after the extra field
+    def collect_name_and_extra_field(self, buffer, name_start, extra_fields):
+        extra_start = name_start + self.file_name_length
+        end = extra_start + self.extra_field_length
+        self.file_name = decode_text(buffer[name_start:extra_start], self.general_flag)
+        self.extra_field_offset = extra_start
+        if(self.extra_field_length == 0):
+            self.extra_field = '-'
+            return end
+        elif(extra_fields):
+            self.extra_field = bytes(buffer[extra_start:end])
+        else:
+            self.extra_field = None # not copied, see ZipInfo.read_extra_field
+        if self.needs_zip64():
+            self.collect_zip64_extra(buffer[extra_start:end])
+        return end
+
+    # Values that don't fit to the header are 0xFFFFFFFF (0xFFFF for the disk number)
+    # and the real values are in the Zip64 extended information extra field.
+    def needs_zip64(self):
+        return self.compressed_size == 0xFFFFFFFF or self.uncompressed_size == 0xFFFFFFFF
+
+    # Zip64 extra field contains only the values that were replaced with
+    # 0xFFFFFFFF in the header and they are always in the order below.
+    zip64_fields = (('uncompressed_size', 0xFFFFFFFF, '<Q'), ('compressed_size', 0xFFFFFFFF, '<Q'))
+
+    def collect_zip64_extra(self, extra_field):
+        data = find_extra_block(extra_field, ZIP64_EXTRA_ID)
+        if data is None:
+            return
+        position = 0
+        for attr, marker, field_format in self.zip64_fields:
+            if getattr(self, attr) != marker:
+                continue
+            size = FIELD_SIZES[field_format]
+            if position + size > len(data):
                 break
-            yield generator()
-
-    # date: two bytes that represent date in MS-DOS format
-    # return: date as a string (format: MM/dd/yyyy).
-    def dos_date_to_str(self, date):
-        year_mask  = 0b1111111000000000
-        month_mask = 0b0000000111100000
-        day_mask   = 0b0000000000011111
-        year  = ((date & year_mask) >> 9) + 1980
-        month = (date & month_mask) >> 5
-        day   = (date & day_mask)
-        return("{:02d}/{:02d}/{:04d}".format(month, day, year))
-
-    # time: two bytes that represent time in MS-DOS format
-    # return: time as a string (format: HH:mm:ss)
-    def dos_time_to_str(self, time):
-        hour_mask   = 0b1111100000000000
-        minute_mask = 0b0000011111100000
-        second_mask = 0b0000000000011111
-        hours   = ((time & hour_mask) >> 11) - 1
-        minutes = (time & minute_mask) >> 5
-        seconds = (time & second_mask) * 2
-        return("{:02d}:{:02d}:{:02d}".format(hours, minutes, seconds))
-
-    # Returns signature as a string in following four bytes format: \x50\x4b\x03\x04
-    # Note: all zip file signatures are 4 bytes long
-    def get_signature_str(self, b):
-        b1, b2, b3, b4 = b.to_bytes(4, byteorder='little')
-        signature = [hex(b1), hex(b2), hex(b3), hex(b4)]
-        return(''.join(str('\\' + e) for e in signature))
-
-    # Python uses b' to indicate that object is a byte object.
-    # This method removes the precending b' from printed string.
-    def remove_b(self, byte_object):
-        return str(byte_object).split("'")[1]
-
-    # Creates an 'bit'-array that represents two bytes of data
-    # E.g. 'General purpose flags' and 'Internal attributes'
-    # use this kind of datastructure
-    def read_16_bit_flags(self, general_flag):
-        bits = [0] * 16
-        for i in range(0, 15):
-            if(general_flag & (1 << i)):
-                bits[i] = 1
-        return bits
-
-class LocalFileHeader(ZipInfo):
-    def __init__(self):
-        self.header_signature       = None
-        self.minimum_version        = None
-        self.general_flag           = None
-        self.compression_method     = None
-        self.last_modification_time = None
-        self.last_modification_date = None
-        self.crc_32                 = None
-        self.compressed_size        = None
-        self.uncompressed_size      = None
-        self.file_name_length       = None
-        self.extra_field_length     = None
-        self.file_name              = None
-        self.extra_field            = None
+            setattr(self, attr, unpack_from(field_format, data, position)[0])
+            position += size
+
+class LocalFileHeader(FileHeader):
+    __slots__ = ('data_descriptor',) # DataDescriptor, if general purpose flag bit 3 is set
+    printed_fields = ('header_signature', 'minimum_version', 'general_flag',
+                      'compression_method', 'last_modification_time',
+                      'last_modification_date', 'crc_32', 'compressed_size',
+                      'uncompressed_size', 'file_name_length', 'extra_field_length',
+                      'file_name', 'extra_field', 'extra_field_offset')
 
     # Fixed size stuff is read to fields with binary unpack and then
     # the varying length contents are then filled by using array tricks
-    def collect_header(self, data):
-        # read the fixed data bytes
-        header_data = data.read(30)
-        fields = unpack('<LHHHHHLLLHH', header_data[0:30])
-        self.header_signature = self.get_signature_str(fields[0])
-        self.minimum_version = fields[1]
-        self.general_flag = fields[2]
-        self.compression_method = Compression(fields[3]).name
-        self.last_modification_time = self.dos_time_to_str(fields[4])
-        self.last_modification_date = self.dos_date_to_str(fields[5])
-        self.crc_32 = hex(fields[6])
-        self.compressed_size = fields[7]
-        self.uncompressed_size = fields[8]
-        self.file_name_length = fields[9]
-        self.extra_field_length = fields[10]
-
+    def collect_header(self, data, extra_fields=True):
+        start = data.tell()
+        header_data = data.read(30) # read the fixed data bytes
+        file_name_length, extra_field_length = unpack_from('<HH', header_data, 26)
         # read the remaining variable amount of header bytes
-        header_data = data.read(self.file_name_length + self.extra_field_length)
-        self.file_name = self.remove_b(header_data[0:self.file_name_length])
-        if(self.extra_field_length > 0):
-            self.extra_field = header_data[self.file_name_length:
-            self.file_name_length+self.extra_field_length]
-        else:
-            self.extra_field = '-'
+        header_data += data.read(file_name_length + extra_field_length)
+        self.collect_header_from(header_data, 0, extra_fields)
+        self.extra_field_offset += start
 
-    # Print all the classes attribute and value pairs
-    def __str__(self):
-        header_string = ""
-        for attr, value in self.__dict__.items():
-            header_string += attr + ': ' + str(value) + '\n'
+    # Same as above, but the header is unpacked straight from a buffer
+    # @param buffer: bytes-like object, e.g. memoryview of a mapped file
+    # @param offset: position of the header in the buffer
+    # @param extra_fields: copy the extra field, otherwise only its offset is stored
+    # @return: position right after the header
+    def collect_header_from(self, buffer, offset, extra_fields=False):
+        (self.signature, self.minimum_version, self.general_flag, self.compression,
+         self.dos_time, self.dos_date, self.crc, self.compressed_size,
+         self.uncompressed_size, self.file_name_length,
+         self.extra_field_length) = unpack_from('<LHHHHHLLLHH', buffer, offset)
+        self.data_descriptor = None
+        return self.collect_name_and_extra_field(buffer, offset + 30, extra_fields)
 
-        return(header_string)
+    # In local headers, the Zip64 extra field has always both of the sizes
+    def collect_zip64_extra(self, extra_field):
+        data = find_extra_block(extra_field, ZIP64_EXTRA_ID)
+        if data is not None and len(data) >= 16:
+            self.uncompressed_size, self.compressed_size = unpack_from('<QQ', data)
 
-class CentralDirectoryHeader(ZipInfo):
-    def __init__(self):
-        self.header_signature       = None
-        self.version                = None
-        self.minimum_version        = None
-        self.general_flag           = None
-        self.compression_method     = None
-        self.last_modification_time = None
-        self.last_modification_date = None
-        self.crc_32                 = None
-        self.compressed_size        = None
-        self.uncompressed_size      = None
-        self.file_name_length       = None
-        self.extra_field_length     = None
-        self.file_comment_length    = None
-        self.disk_number            = None
-        self.internal_attributes    = None
-        self.external_attributes    = None
-        self.local_header_offset    = None      
-        self.file_name              = None
-        self.extra_field            = None
-        self.file_comment           = None
-
-    def collect_central_directory_file_header(self, data):       
-        header_data = data.read(46) # read fixed data fields
-        fields = unpack('<LHHHHHHLLLHHHHHLL', header_data[0:46])
-        self.header_signature       = self.get_signature_str(fields[0])
-        self.version                = Version(fields[1])
-        self.minimum_version        = fields[2]
-        self.general_flag           = fields[3]
-        self.compression_method     = Compression(fields[4]).name
-        self.last_modification_time = self.dos_time_to_str(fields[5])
-        self.last_modification_date = self.dos_date_to_str(fields[6])
-        self.crc_32                 = hex(fields[7])
-        self.compressed_size        = fields[8]
-        self.uncompressed_size      = fields[9]
-        self.file_name_length       = fields[10]
-        self.extra_field_length     = fields[11]
-        self.file_comment_length    = fields[12]
-        self.disk_number            = fields[13]
-        self.internal_attributes    = fields[14]
-        self.external_attributes    = fields[15]
-        self.local_header_offset    = fields[16]     
+    # With general purpose flag bit 3, the CRC and sizes are zeros in the local
+    # header and the real values are in a data descriptor after the file data.
+    # @param buffer: bytes of the file starting from 'base'
+    # @param offset: position of the data descriptor
+    # @param zip64: sizes in the descriptor are 8 bytes long
+    def collect_data_descriptor_from(self, buffer, offset, zip64, base=0):
+        descriptor = DataDescriptor()
+        descriptor.collect_data_descriptor_from(buffer, offset - base, zip64)
+        self.data_descriptor = descriptor
+        self.crc = descriptor.crc
+        self.compressed_size = descriptor.compressed_size
+        self.uncompressed_size = descriptor.uncompressed_size
+
+class CentralDirectoryHeader(FileHeader):
+    __slots__ = ('version_made_by', 'file_comment_length', 'disk_number',
+                 'internal_attributes', 'external_attributes',
+                 'local_header_offset', 'file_comment')
+    printed_fields = ('header_signature', 'version', 'minimum_version', 'general_flag',
+                      'compression_method', 'last_modification_time',
+                      'last_modification_date', 'crc_32', 'compressed_size',
+                      'uncompressed_size', 'file_name_length', 'extra_field_length',
+                      'file_comment_length', 'disk_number', 'internal_attributes',
+                      'external_attributes', 'local_header_offset', 'file_name',
+                      'extra_field', 'extra_field_offset', 'file_comment')
+
+    zip64_fields = FileHeader.zip64_fields + (('local_header_offset', 0xFFFFFFFF, '<Q'),
+                                              ('disk_number', 0xFFFF, '<L'))
 
+    @property
+    def version(self):
+        return Version(self.version_made_by)
+
+    def needs_zip64(self):
+        return (self.compressed_size == 0xFFFFFFFF or self.uncompressed_size == 0xFFFFFFFF or
+                self.local_header_offset == 0xFFFFFFFF or self.disk_number == 0xFFFF)
+
+    def collect_central_directory_file_header(self, data, extra_fields=True):
+        start = data.tell()
+        header_data = data.read(46) # read fixed data fields
+        lengths = unpack_from('<HHH', header_data, 28)
         # read the remaining variable amount of header bytes
-        header_data = data.read(self.file_name_length + self.extra_field_length + self.file_comment_length)
-        self.file_name = self.remove_b(header_data[0:self.file_name_length])
-        if (self.extra_field_length > 0):
-            self.extra_field = header_data[self.file_name_length:
-            self.file_name_length+self.extra_field_length]
-        else:
-            self.extra_field = '-'    
+        header_data += data.read(sum(lengths))
+        self.collect_central_directory_file_header_from(header_data, 0, extra_fields)
+        self.extra_field_offset += start
+
+    # Same as above, but the header is unpacked straight from a buffer
+    # @param buffer: bytes-like object, e.g. memoryview of a mapped file
+    # @param offset: position of the header in the buffer
+    # @param extra_fields: copy the extra field, otherwise only its offset is stored
+    # @return: position right after the header
+    def collect_central_directory_file_header_from(self, buffer, offset, extra_fields=False):
+        (self.signature, self.version_made_by, self.minimum_version, self.general_flag,
+         self.compression, self.dos_time, self.dos_date, self.crc, self.compressed_size,
+         self.uncompressed_size, self.file_name_length, self.extra_field_length,
+         self.file_comment_length, self.disk_number, self.internal_attributes,
+         self.external_attributes,
+         self.local_header_offset) = unpack_from('<LHHHHHHLLLHHHHHLL', buffer, offset)
+
+        comment_start = self.collect_name_and_extra_field(buffer, offset + 46, extra_fields)
+        end = comment_start + self.file_comment_length
         if (self.file_comment_length > 0):
-            self.file_comment = header_data[self.file_name_length + self.extra_field_length:
-            self.file_name_length + self.extra_field_length + self.file_comment_length]
+            self.file_comment = decode_text(buffer[comment_start:end], self.general_flag)
         else:
-            self.file_comment = '-'             
-        
-    def __str__(self):
-        header_string = ""
-        for attr, value in self.__dict__.items():
-            header_string += attr + ': ' + str(value) + '\n'
-        return(header_string)
+            self.file_comment = '-'
+        return end
+
+class EndOfCentralDirectoryRecord(Record):
+    __slots__ = ('signature', 'disk_number', 'central_directory_disk', 'disk_entries',
+                 'total_entries', 'central_directory_size', 'central_directory_offset',
+                 'comment_length', 'comment')
+    printed_fields = ('header_signature',) + __slots__[1:]
+
+    # @param buffer: bytes-like object, e.g. memoryview of a mapped file
+    # @param offset: position of the record in the buffer
+    def collect_end_of_central_directory_record(self, buffer, offset):
+        (self.signature, self.disk_number, self.central_directory_disk,
+         self.disk_entries, self.total_entries, self.central_directory_size,
+         self.central_directory_offset,
+         self.comment_length) = unpack_from('<LHHHHLLH', buffer, offset)
+
+        if (self.comment_length > 0):
+            comment_start = offset + 22
+            self.comment = bytes(buffer[comment_start:comment_start + self.comment_length])
+        else:
+            self.comment = '-'
+
+class Zip64EndOfCentralDirectoryLocator(Record):
+    __slots__ = ('signature', 'zip64_end_of_central_directory_disk',
+                 'zip64_end_of_central_directory_offset', 'total_disks')
+    printed_fields = ('header_signature',) + __slots__[1:]
+
+    def collect_zip64_end_of_central_directory_locator(self, buffer, offset):
+        (self.signature, self.zip64_end_of_central_directory_disk,
+         self.zip64_end_of_central_directory_offset,
+         self.total_disks) = unpack_from('<LLQL', buffer, offset)
+
+class Zip64EndOfCentralDirectoryRecord(Record):
+    __slots__ = ('signature', 'record_size', 'version_made_by', 'minimum_version',
+                 'disk_number', 'central_directory_disk', 'disk_entries', 'total_entries',
+                 'central_directory_size', 'central_directory_offset',
+                 'offset') # offset: position of this record in the file
+    printed_fields = ('header_signature', 'record_size', 'version') + __slots__[3:]
+
+    @property
+    def version(self):
+        return Version(self.version_made_by)
+
+    def collect_zip64_end_of_central_directory_record(self, buffer, offset):
+        (self.signature, self.record_size, self.version_made_by, self.minimum_version,
+         self.disk_number, self.central_directory_disk, self.disk_entries,
+         self.total_entries, self.central_directory_size,
+         self.central_directory_offset) = unpack_from('<LQHHLLQQQQ', buffer, offset)
+        self.offset = offset
+
+# Data descriptor follows the file data, when general purpose flag bit 3 is set.
+# The signature is optional and the sizes are 8 bytes long in Zip64 archives.
+class DataDescriptor(Record):
+    __slots__ = ('signature', 'crc', 'compressed_size', 'uncompressed_size')
+    printed_fields = ('header_signature', 'crc_32', 'compressed_size', 'uncompressed_size')
+
+    @property
+    def header_signature(self):
+        return '-' if self.signature is None else get_signature_str(self.signature)
+
+    @property
+    def crc_32(self):
+        return hex(self.crc)
+
+    def collect_data_descriptor_from(self, buffer, offset, zip64=False):
+        self.signature = None
+        if buffer[offset:offset + 4] == DATA_DESCRIPTOR_SIGNATURE:
+            self.signature = unpack_from('<L', buffer, offset)[0]
+            offset += 4
+        field_format = '<LQQ' if zip64 else '<LLL'
+        self.crc, self.compressed_size, self.uncompressed_size = unpack_from(field_format, buffer, offset)
+        return offset + FIELD_SIZES[field_format]
+
+# Extra field is a sequence of blocks: header id (2 bytes), data size (2 bytes) and data.
+# Known blocks are parsed with the functions in the EXTRA_FIELDS table.
+ZIP64_EXTRA_ID              = 0x0001
+NTFS_EXTRA_ID               = 0x000a
+EXTENDED_TIMESTAMP_EXTRA_ID = 0x5455
+UNIX_EXTRA_ID               = 0x7875
+
+FIELD_SIZES = {'<Q': 8, '<L': 4, '<LQQ': 20, '<LLL': 12}
+
+# Yields (header id, data) pairs of the extra field blocks
+def iter_extra_blocks(extra_field):
+    position = 0
+    while position + 4 <= len(extra_field):
+        header_id, size = unpack_from('<HH', extra_field, position)
+        yield header_id, extra_field[position + 4:position + 4 + size]
+        position += 4 + size
+
+# @return: data of the first block with the given header id, or None
+def find_extra_block(extra_field, header_id):
+    for block_id, data in iter_extra_blocks(extra_field):
+        if block_id == header_id:
+            return data
+    return None
+
+class Zip64ExtendedInformation(Record):
+    __slots__ = ('values',)
+    printed_fields = __slots__
+
+    # The meaning of the values depends on which header fields were 0xFFFFFFFF,
+    # so here they are just listed. The headers pick up their own values.
+    def collect(self, data):
+        count = len(data) // 8
+        self.values = unpack_from('<{}Q'.format(count), data) if count else ()
+        return self
+
+# Unix times (seconds since 1970). Central directory has only the modification time.
+class ExtendedTimestamp(Record):
+    __slots__ = ('modification_time', 'access_time', 'creation_time')
+    printed_fields = __slots__
+
+    def collect(self, data):
+        flags = data[0] if len(data) else 0
+        position = 1
+        for bit, attr in enumerate(self.__slots__):
+            value = None
+            if flags & (1 << bit) and position + 4 <= len(data):
+                value = unpack_from('<l', data, position)[0]
+                position += 4
+            setattr(self, attr, value)
+        return self
+
+class UnixOwner(Record):
+    __slots__ = ('uid', 'gid')
+    printed_fields = __slots__
+
+    # version (1 byte), uid size, uid, gid size, gid (little endian, variable sizes)
+    def collect(self, data):
+        uid_size = data[1]
+        gid_size = data[2 + uid_size]
+        self.uid = int.from_bytes(data[2:2 + uid_size], 'little')
+        self.gid = int.from_bytes(data[3 + uid_size:3 + uid_size + gid_size], 'little')
+        return self
+
+# NTFS file times are 100 ns intervals since 1601. Converted to Unix times here.
+class NtfsTimestamps(Record):
+    __slots__ = ('modification_time', 'access_time', 'creation_time')
+    printed_fields = __slots__
+
+    def collect(self, data):
+        self.modification_time = self.access_time = self.creation_time = None
+        position = 4 # reserved
+        while position + 4 <= len(data):
+            tag, size = unpack_from('<HH', data, position)
+            if tag == 1 and size >= 24:
+                times = unpack_from('<QQQ', data, position + 4)
+                (self.modification_time, self.access_time,
+                 self.creation_time) = [t / 1e7 - 11644473600 for t in times]
+            position += 4 + size
+        return self
+
+EXTRA_FIELDS = {
+    ZIP64_EXTRA_ID:              ('zip64', Zip64ExtendedInformation),
+    NTFS_EXTRA_ID:               ('ntfs', NtfsTimestamps),
+    EXTENDED_TIMESTAMP_EXTRA_ID: ('extended_timestamp', ExtendedTimestamp),
+    UNIX_EXTRA_ID:               ('unix', UnixOwner),
+}
+
+# Parses the known extra field blocks. Unknown blocks are returned as bytes.
+# @return: dict of block name -> parsed block
+def parse_extra_field(extra_field):
+    blocks = {}
+    if not isinstance(extra_field, (bytes, bytearray, memoryview)):
+        return blocks # '-' (no extra field)
+    for header_id, data in iter_extra_blocks(extra_field):
+        name, record_class = EXTRA_FIELDS.get(header_id, (None, None))
+        if record_class is None:
+            blocks['0x{:04x}'.format(header_id)] = bytes(data)
+            continue
+        try:
+            blocks[name] = record_class().collect(data)
+        except (IndexError, StructError):
+            blocks[name] = bytes(data) # malformed block
+    return blocks
+
+# Decompressors share the interface of bz2.BZ2Decompressor: decompress(data, max_length)
+# returns at most max_length bytes and keeps the rest of the input for the next call.
+# needs_input tells when the next call should get more data.
+class StoredDecompressor:
+    def __init__(self):
+        self.tail = b''
+        self.eof = False
+
+    @property
+    def needs_input(self):
+        return not self.tail
+
+    def decompress(self, data, max_length):
+        data = self.tail + data
+        self.tail = data[max_length:]
+        return data[:max_length]
+
+class DeflateDecompressor:
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS) # raw deflate stream
+
+    @property
+    def needs_input(self):
+        return not self.decompressor.unconsumed_tail
+
+    @property
+    def eof(self):
+        return self.decompressor.eof
+
+    def decompress(self, data, max_length):
+        return self.decompressor.decompress(self.decompressor.unconsumed_tail + data, max_length)
+
+# Zip's LZMA data starts with a small header: version (2 bytes),
+# properties size (2 bytes) and the LZMA properties. Raw LZMA1 data follows.
+class LzmaDecompressor:
+    def __init__(self):
+        self.header = b''
+        self.decompressor = None
+
+    @property
+    def needs_input(self):
+        return self.decompressor is None or self.decompressor.needs_input
+
+    @property
+    def eof(self):
+        return self.decompressor is not None and self.decompressor.eof
+
+    def decompress(self, data, max_length):
+        if self.decompressor is None:
+            self.header += data
+            if len(self.header) < 4:
+                return b''
+            properties_size = unpack_from('<H', self.header, 2)[0]
+            if len(self.header) < 4 + properties_size:
+                return b''
+            properties = self.header[4:4 + properties_size]
+            data = self.header[4 + properties_size:]
+            filters = lzma._decode_filter_properties(lzma.FILTER_LZMA1, properties)
+            self.decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[filters])
+        return self.decompressor.decompress(data, max_length)
+
+DECOMPRESSORS = {
+    Compression.STORE.value:   StoredDecompressor,
+    Compression.DEFLATE.value: DeflateDecompressor,
+    Compression.BZIP2.value:   bz2.BZ2Decompressor,
+    Compression.LZMA.value:    LzmaDecompressor,
+}
+
+# Raw reader for the file data of one entry (see ZipInfo.open_entry).
+# Compressed data is read 'chunk_size' bytes at a time from the byte source
+# and decompressed at most as much as the caller asks for. The CRC-32 and the
+# size are updated incrementally and checked, when the end of the entry is reached.
+class ZipEntryReader(io.RawIOBase):
+    def __init__(self, source, central, offset_shift=0, chunk_size=64 * 1024, close_source=False):
+        if central.general_flag & 0x1:
+            raise NotImplementedError("{} is encrypted".format(central.file_name))
+        if central.compression not in DECOMPRESSORS:
+            raise NotImplementedError("Compression method {} of {} is not supported".format(
+                central.compression, central.file_name))
+        self.source = source
+        self.close_source = close_source
+        self.name = central.file_name
+        self.expected_crc = central.crc
+        self.expected_size = central.uncompressed_size
+        self.remaining = central.compressed_size # sizes in local header can be zeros
+        self.chunk_size = chunk_size
+        self.decompressor = DECOMPRESSORS[central.compression]()
+        self.crc = 0
+        self.size = 0
+        self.verified = False
+
+        # skip the local file header to get to the data
+        header_position = central.local_header_offset + offset_shift
+        header_data = source.read(header_position, LOCAL_FILE_HEADER_SIZE)
+        if header_data[:4] != LOCAL_FILE_HEADER_SIGNATURE:
+            if close_source:
+                source.close()
+            raise ValueError("Bad local file header for {}".format(self.name))
+        file_name_length, extra_field_length = unpack_from('<HH', header_data, 26)
+        self.position = header_position + LOCAL_FILE_HEADER_SIZE + file_name_length + extra_field_length
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.decompressor.eof:
+            if self.decompressor.needs_input:
+                if self.remaining == 0:
+                    break
+                data = bytes(self.source.read(self.position, min(self.chunk_size, self.remaining)))
+                if not data:
+                    raise EOFError("{} is truncated".format(self.name))
+                self.remaining -= len(data)
+                self.position += len(data)
+            else:
+                data = b''
+            output = self.decompressor.decompress(data, len(b))
+            if output:
+                self.crc = zlib.crc32(output, self.crc)
+                self.size += len(output)
+                b[:len(output)] = output
+                return len(output)
+        self.verify()
+        return 0
+
+    def verify(self):
+        if self.verified:
+            return
+        if self.size != self.expected_size:
+            raise ValueError("Bad size for {}: expected {}, got {}".format(
+                self.name, self.expected_size, self.size))
+        if self.crc != self.expected_crc:
+            raise ValueError("Bad CRC-32 for {}: expected {}, got {}".format(
+                self.name, hex(self.expected_crc), hex(self.crc)))
+        self.verified = True
+
+    def close(self):
+        if not self.closed and self.close_source:
+            self.source.close()
+        super().close()
+
+# Yields the central directory headers of an archive without storing them
+def iter_entries(filename):
+    return ZipInfo(filename, central_directory=False).iter_entries()
 
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1: # e.g. python zipmeta.py scan DIR --workers N
+        import batch
+        batch.main(sys.argv[1:])
+        sys.exit()
+
     file = input("Give path to Zip\n")
     zip_metadata = ZipInfo(file)
     
     # Print collected data fields:
     for local_header in zip_metadata.local_file_headers:
         print("[Local header]\n{}".format(local_header))
-    print("[Central header]\n{}".format(zip_metadata.central_directory_header))
\ No newline at end of file
+    for central_header in zip_metadata.central_directory_headers:
+        print("[Central header]\n{}".format(central_header))
+    print("[End of central directory]\n{}".format(zip_metadata.end_of_central_directory))
\ No newline at end of file